@@ -0,0 +1,59 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.utils.choices import BaseChoiceIterator
+
+from . import registry
+
+
+class CachedChoiceIterator(BaseChoiceIterator):
+    """Reads the choice list when the select is rendered, not when the form is built"""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        yield from self.field.choice_list.choices(self.field.grouped)
+
+    def __len__(self):
+        return len(self.field.choice_list.choices(self.field.grouped)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(len(self))
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField whose options and validation come from a cached
+    ChoiceList instead of the queryset. The cleaned value is an instance
+    with only its primary key loaded; other fields load on first access.
+    """
+
+    def __init__(self, choice_list, queryset, *, grouped=True, **kwargs):
+        self.choice_list = registry.get(choice_list)
+        self.grouped = grouped
+        super().__init__(queryset, **kwargs)
+
+    def _get_choices(self):
+        return CachedChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            pk = None
+        if pk not in self.choice_list.ids():
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        model = self.queryset.model
+        return model.from_db(self.queryset.db, [model._meta.pk.attname], [pk])
@@ -0,0 +1,165 @@
+"""
+Cached choice lists for form selects.
+
+Forms across the site offer the same few lookups (services grouped by
+service category, template categories, staff members) and used to build
+each one from a fresh queryset on every GET and again on every POST to
+validate the submitted id. A ChoiceList loads its rows once per process
+into precomputed (id, label) choices, optgroups included, plus the set of
+valid ids. Saving or deleting one of the models it depends on bumps a
+version key in the Django cache once the change commits, and every
+process reloads on next use (the cache must be shared by all of them;
+see CACHES in settings).
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+VERSION_KEY = 'categories:choices:{}:version'
+
+_lists = {}
+
+
+class Snapshot:
+    """One loaded version of a choice list"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.labels = {pk: label for group, pk, label in rows}
+        self.ids = frozenset(self.labels)
+        self.flat = [(pk, label) for group, pk, label in rows]
+        grouped, groups = [], {}
+        for group, pk, label in rows:
+            if group is None:
+                grouped.append((pk, label))
+            else:
+                if group not in groups:
+                    groups[group] = []
+                    grouped.append((group, groups[group]))
+                groups[group].append((pk, label))
+        self.grouped = grouped
+
+
+class ChoiceList:
+    """
+    A named lookup. loader() returns (group, id, label) rows in display
+    order; group is None for options outside any optgroup.
+    """
+
+    def __init__(self, name, loader, models, ignore_fields=()):
+        self.name = name
+        self.loader = loader
+        self.models = models
+        self.ignore_fields = frozenset(ignore_fields)
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def version_key(self):
+        return VERSION_KEY.format(self.name)
+
+    def current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add() so concurrent first requests agree on one version
+            cache.add(self.version_key, version, None)
+            version = cache.get(self.version_key, version)
+        return version
+
+    def snapshot(self):
+        version = self.current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = Snapshot(list(self.loader()), version)
+            return self._snapshot
+
+    def choices(self, grouped=True):
+        snapshot = self.snapshot()
+        return snapshot.grouped if grouped else snapshot.flat
+
+    def ids(self):
+        return self.snapshot().ids
+
+    def label(self, pk):
+        return self.snapshot().labels.get(pk)
+
+    def bump_version(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def invalidate(self):
+        """Make every process reload this list on next use, once the current transaction commits"""
+        # Bumped earlier, a request could reload the old rows under the new version and keep them
+        transaction.on_commit(self.bump_version)
+
+    def _changed(self, sender, update_fields=None, **kwargs):
+        if update_fields and self.ignore_fields.issuperset(update_fields):
+            return
+        self.invalidate()
+
+    def connect(self):
+        for model in self.models:
+            uid = f'categories.{self.name}.{model}'
+            post_save.connect(self._changed, sender=model, dispatch_uid=uid, weak=False)
+            post_delete.connect(self._changed, sender=model, dispatch_uid=uid, weak=False)
+
+
+def register(name, models, ignore_fields=()):
+    """Decorator registering a loader as the ChoiceList called name"""
+    def decorator(loader):
+        _lists[name] = ChoiceList(name, loader, models, ignore_fields)
+        return loader
+    return decorator
+
+
+def get(name):
+    return _lists[name]
+
+
+def invalidate(name):
+    get(name).invalidate()
+
+
+def connect_signals():
+    for choice_list in _lists.values():
+        choice_list.connect()
+
+
+@register('services', models=['task_manager.ServiceCategory', 'task_manager.TaskCategory'])
+def services():
+    """Active services grouped under their active service category"""
+    from task_manager.models import TaskCategory
+    rows = TaskCategory.objects.filter(
+        is_active=True, service_category__is_active=True,
+    ).order_by('service_category__order', 'service_category__name', 'name').values_list(
+        'service_category__name', 'id', 'name',
+    )
+    return rows
+
+
+@register('template_categories', models=['template_manager.Category'])
+def template_categories():
+    """Active template categories"""
+    from template_manager.models import Category
+    for pk, name in Category.objects.filter(is_active=True).order_by('name').values_list('id', 'name'):
+        yield None, pk, name
+
+
+# Logins save last_login only; that doesn't change the list
+@register('staff', models=['staff.StaffProfile'], ignore_fields=['last_login'])
+def staff():
+    """Staff members grouped by department, labelled with their rank"""
+    from staff.models import StaffProfile
+    ranks = dict(StaffProfile.RANK_CHOICES)
+    rows = StaffProfile.objects.filter(is_staff=True).order_by('department', 'first_name', 'username').values_list(
+        'id', 'username', 'first_name', 'last_name', 'rank', 'department',
+    )
+    for pk, username, first_name, last_name, rank, department in rows:
+        name = f'{first_name} {last_name}'.strip() or username
+        yield department or 'Other staff', pk, f'{name} ({ranks.get(rank, rank)})'
@@ -0,0 +1,56 @@
+"""
+In-process background work.
+
+Slow follow-up work (preview rendering, file processing) is handed to a
+small thread pool so the request that triggered it can return straight
+away. defer() schedules a job for after the current transaction commits,
+so workers never see rows that are later rolled back. Set
+BACKGROUND_TASKS_EAGER to run jobs inline instead, e.g. in management
+commands that should finish their work before exiting.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Process-wide worker pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                thread_name_prefix='background',
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(func, '__name__', func))
+    finally:
+        # Worker threads hold their own connections; don't leak them
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on a worker thread now"""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        func(*args, **kwargs)
+        return
+    executor().submit(_run, func, args, kwargs)
+
+
+def defer(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background once the current transaction commits"""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
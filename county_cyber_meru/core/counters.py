@@ -0,0 +1,88 @@
+"""
+Helpers for denormalized count columns.
+
+Parent rows (service categories, template categories) carry counts of
+their children so listings never issue a COUNT per row. Signal handlers
+in the owning app's models.py work out how a child's save or delete
+changes those counts and apply it with increment(); refresh() recomputes
+counts set-based after bulk queryset.update() calls and from
+`manage.py reconcile_counts`.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+class CountColumnsMixin:
+    """
+    Model mixin for rows carrying count columns. A plain save() leaves the
+    count_fields alone, so saving a form never writes back counts that were
+    read before a concurrent increment.
+    """
+    count_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.count_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+def previous_values(instance, fields):
+    """Database values of fields for an instance about to be saved, or None when adding"""
+    if instance._state.adding:
+        return None
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded and all(field in loaded for field in fields):
+        return {field: loaded[field] for field in fields}
+    return type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def contribution_delta(old, new):
+    """Per-counter change going from contribution old to contribution new"""
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+def increment(queryset, deltas):
+    """Add {field: n} to every row of queryset in one UPDATE"""
+    deltas = {field: n for field, n in deltas.items() if n}
+    if deltas:
+        queryset.update(**{field: F(field) + n for field, n in deltas.items()})
+
+
+def count_of(model, link, **filters):
+    """Correlated COUNT of model rows whose `link` points at the outer row"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{link: OuterRef('pk')}, **filters).order_by()
+            .values(link).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def refresh(queryset, **counts):
+    """
+    Recompute count columns for queryset in one UPDATE, e.g.
+    refresh(Category.objects.all(), template_count=count_of(...)).
+    Returns the number of rows whose counts were wrong.
+    """
+    drifted = queryset.annotate(
+        **{f'actual_{field}': expression for field, expression in counts.items()}
+    ).exclude(
+        **{field: F(f'actual_{field}') for field in counts}
+    )
+    # exclude() with several fields negates the AND, matching rows where any count differs
+    stale = list(drifted.values_list('pk', flat=True))
+    if stale:
+        queryset.model.objects.filter(pk__in=stale).update(**counts)
+    return len(stale)
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that stopped receiving data more than CHUNKED_UPLOAD_EXPIRY ago'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+        stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        # One at a time so post_delete removes each partial file
+        for upload in stale.iterator():
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} stale chunked uploads'))
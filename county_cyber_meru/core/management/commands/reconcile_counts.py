@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from task_manager.models import ServiceCategory, TaskCategory
+from template_manager.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized category counts from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep reconciling at a fixed interval')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between runs in loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            for model in (ServiceCategory, TaskCategory, Category):
+                drifted = model.refresh_counts()
+                label = model._meta.verbose_name_plural
+                if drifted:
+                    self.stdout.write(self.style.WARNING(f'Corrected counts on {drifted} {label}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{label.capitalize()} counts are up to date'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='received_sha256',
+            field=models.CharField(blank=True, editable=False, help_text='Checksum of the bytes received, set by the last chunk', max_length=64),
+        ),
+    ]
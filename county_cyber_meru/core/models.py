@@ -1,4 +1,10 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 
 # Create your models here.
 
@@ -15,3 +21,42 @@ class SliderImage(models.Model):
     def __str__(self):
         return self.title if self.title else f"Slider Image {self.id}"
 
+
+
+class ChunkedUpload(models.Model):
+    """A large file arriving in pieces; see core.uploads"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received and acknowledged")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Expected checksum of the whole file, if given")
+    received_sha256 = models.CharField(
+        max_length=64, blank=True, editable=False, help_text="Checksum of the bytes received, set by the last chunk"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes)"
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.pk}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+@receiver(post_delete, sender=ChunkedUpload)
+def delete_chunked_upload_file(sender, instance, **kwargs):
+    """Remove the partial file unless it was already moved into storage"""
+    try:
+        os.remove(instance.path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,273 @@
+"""
+A small PDF writer for generated documents (receipts, print sheets).
+
+Only what the shop's documents need: pages of text in the standard
+Helvetica fonts (which every PDF reader has, so nothing is embedded),
+lines, filled rectangles and raster images. Content streams are
+deflated. Text is encoded as WinAnsi; characters outside it print as
+'?'.
+
+    document = Document()
+    page = document.add_page()
+    page.text(72, 770, 'Hello', font='Helvetica-Bold', size=18)
+    data = document.to_bytes()
+
+Drawing that repeats across pages or documents (a letterhead, a table
+header) can be built once as a Fragment and added with page.draw().
+An image is embedded once by document.add_image() and can then be
+placed any number of times, on any page, with page.image().
+"""
+import hashlib
+import io
+import zlib
+
+A4 = (595.28, 841.89)
+
+# Advance widths (1/1000 em) of the printable ASCII characters, from the standard AFM files
+_HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+WIDTHS = {
+    'Helvetica': _HELVETICA,
+    'Helvetica-Bold': _HELVETICA_BOLD,
+    'Helvetica-Oblique': _HELVETICA,
+    'Helvetica-BoldOblique': _HELVETICA_BOLD,
+}
+DEFAULT_WIDTH = 556
+# Fixed resource names, so prebuilt content works in any document
+FONT_RESOURCES = {name: f'F{index}' for index, name in enumerate(WIDTHS, start=1)}
+
+
+def text_width(text, font='Helvetica', size=10):
+    """Width of text in points when set in font at size"""
+    widths = WIDTHS[font]
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if 32 <= code <= 126 else DEFAULT_WIDTH
+    return total * size / 1000
+
+
+def fit_text(text, width, font='Helvetica', size=10):
+    """text, shortened with an ellipsis if needed to fit in width points"""
+    if text_width(text, font, size) <= width:
+        return text
+    while text and text_width(text + '...', font, size) > width:
+        text = text[:-1]
+    return text.rstrip() + '...'
+
+
+def encode_text(text):
+    """A PDF string literal for text in WinAnsi encoding"""
+    data = text.encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def number(value):
+    """Compact PDF number"""
+    if isinstance(value, int):
+        return str(value)
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def rgb(color):
+    """PDF colour operands for '#rrggbb'"""
+    color = color.lstrip('#')
+    return ' '.join(number(int(color[i:i + 2], 16) / 255) for i in (0, 2, 4))
+
+
+class Image:
+    """
+    A raster image embedded once in a document. JPEGs are embedded as
+    they are; anything else Pillow reads is stored deflated, with its
+    alpha channel as a soft mask.
+    """
+
+    def __init__(self, data, name):
+        from PIL import Image as PILImage
+
+        self.name = name
+        self.mask = None
+        with PILImage.open(io.BytesIO(data)) as image:
+            self.width, self.height = image.size
+            if image.format == 'JPEG' and image.mode in ('RGB', 'L'):
+                self.color_space = 'DeviceRGB' if image.mode == 'RGB' else 'DeviceGray'
+                self.filter, self.data = 'DCTDecode', data
+                return
+            if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+                image = image.convert('RGBA')
+                self.mask = zlib.compress(image.getchannel('A').tobytes(), 6)
+            image = image.convert('L' if image.mode in ('1', 'L', 'LA') else 'RGB')
+            self.color_space = 'DeviceGray' if image.mode == 'L' else 'DeviceRGB'
+            self.filter, self.data = 'FlateDecode', zlib.compress(image.tobytes(), 6)
+
+
+class Canvas:
+    """Collects drawing operations and the fonts and images they use"""
+
+    def __init__(self):
+        self.operations = []
+        self.fonts = set()
+        self.images = {}
+
+    def draw(self, fragment):
+        """Add everything drawn on fragment"""
+        self.operations.append(fragment.content())
+        self.fonts |= fragment.fonts
+        self.images.update(fragment.images)
+
+    def image(self, image, x, y, width, height, clip=None):
+        """Place image scaled to width x height at (x, y), optionally clipped to an (x, y, w, h) box"""
+        self.images[image.name] = image
+        clip_path = f'{" ".join(number(value) for value in clip)} re W n ' if clip else ''
+        self.operations.append(
+            f'q {clip_path}{number(width)} 0 0 {number(height)} {number(x)} {number(y)} cm /{image.name} Do Q'.encode()
+        )
+
+    def text(self, x, y, text, font='Helvetica', size=10, align='left', color=None):
+        if font not in WIDTHS:
+            raise ValueError(f'Unsupported font {font}')
+        if align != 'left':
+            offset = text_width(text, font, size)
+            x -= offset if align == 'right' else offset / 2
+        self.fonts.add(font)
+        resource = FONT_RESOURCES[font]
+        operation = (
+            f'BT /{resource} {number(size)} Tf {number(x)} {number(y)} Td '.encode()
+            + encode_text(text) + b' Tj ET'
+        )
+        if color:
+            operation = f'q {rgb(color)} rg '.encode() + operation + b' Q'
+        self.operations.append(operation)
+
+    def line(self, x1, y1, x2, y2, width=0.5, color=None):
+        stroke = f'{rgb(color)} RG ' if color else ''
+        self.operations.append(
+            f'q {stroke}{number(width)} w {number(x1)} {number(y1)} m {number(x2)} {number(y2)} l S Q'.encode()
+        )
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=0.5):
+        operations = ['q']
+        if fill:
+            operations.append(f'{rgb(fill)} rg')
+        if stroke:
+            operations.append(f'{rgb(stroke)} RG {number(line_width)} w')
+        operations.append(f'{number(x)} {number(y)} {number(width)} {number(height)} re')
+        operations.append('B' if fill and stroke else 'f' if fill else 'S')
+        operations.append('Q')
+        self.operations.append(' '.join(operations).encode())
+
+    def content(self):
+        return b'\n'.join(self.operations)
+
+
+class Fragment(Canvas):
+    """Drawing kept for reuse on several pages"""
+
+
+class Page(Canvas):
+    def __init__(self, width, height):
+        super().__init__()
+        self.width = width
+        self.height = height
+
+
+class Document:
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        self._images = {}
+
+    def add_page(self, size=A4):
+        page = Page(*size)
+        self.pages.append(page)
+        return page
+
+    def add_image(self, data):
+        """Embed image file data, once however often it is added or placed"""
+        digest = hashlib.sha1(data).digest()
+        if digest not in self._images:
+            self._images[digest] = Image(data, f'Im{len(self._images) + 1}')
+        return self._images[digest]
+
+    def to_bytes(self):
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        def stream(data):
+            compressed = zlib.compress(data, 6)
+            return b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(compressed) + compressed + b'\nendstream'
+
+        catalog = add(None)
+        pages = add(None)
+        used = set().union(*(page.fonts for page in self.pages))
+        font_objects = {
+            FONT_RESOURCES[name]: add(
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % name.encode()
+            )
+            for name in WIDTHS if name in used
+        }
+        fonts = b' '.join(b'/%s %d 0 R' % (resource.encode(), ref) for resource, ref in font_objects.items())
+        image_objects = {}
+        for image in {name: image for page in self.pages for name, image in page.images.items()}.values():
+            mask = b''
+            if image.mask is not None:
+                mask = b' /SMask %d 0 R' % add(
+                    b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+                    b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n'
+                    % (image.width, image.height, len(image.mask)) + image.mask + b'\nendstream'
+                )
+            image_objects[image.name] = add(
+                b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s '
+                b'/BitsPerComponent 8 /Filter /%s%s /Length %d >>\nstream\n'
+                % (image.width, image.height, image.color_space.encode(), image.filter.encode(), mask, len(image.data))
+                + image.data + b'\nendstream'
+            )
+        page_numbers = []
+        for page in self.pages:
+            content = add(stream(page.content()))
+            xobjects = b''
+            if page.images:
+                xobjects = b' /XObject << %s >>' % b' '.join(
+                    b'/%s %d 0 R' % (name.encode(), image_objects[name]) for name in sorted(page.images)
+                )
+            page_numbers.append(add(
+                b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Contents %d 0 R '
+                b'/Resources << /Font << %s >>%s >> >>'
+                % (pages, number(page.width).encode(), number(page.height).encode(), content, fonts, xobjects)
+            ))
+        objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages
+        objects[pages - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % ref for ref in page_numbers), len(page_numbers)
+        )
+        info = add(b'<< /Title %s /Producer (County Cyber Meru) >>' % encode_text(self.title))
+
+        output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for ref, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n' % ref + body + b'\nendobj\n'
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            output += b'%010d 00000 n \n' % offset
+        output += b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(objects) + 1, catalog, info, xref
+        )
+        return bytes(output)
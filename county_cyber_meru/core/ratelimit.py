@@ -0,0 +1,71 @@
+"""
+In-process sliding-window rate limiting for public endpoints.
+
+Each limiter keeps, per key (client IP, email address, ...), the times of
+the requests it allowed during the last `window` seconds and refuses a
+request once `limit` of them are still inside the window. Everything
+lives in memory, so a check costs a dictionary lookup and never touches
+the database; limits are per process, which is enough to stop
+double-submits and floods before they reach the SQLite write lock.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAX_KEYS = 10000  # least recently seen keys are forgotten beyond this
+
+
+class SlidingWindowLimiter:
+    def __init__(self, limit, window, max_keys=MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def allow(self, key):
+        """Record a request for key; False if it is over the limit"""
+        if not key:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                if len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            self._expire(hits, now)
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            return True
+
+    def retry_after(self, key):
+        """Seconds until key may make another request"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._expire(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return max(0, int(hits[0] + self.window - now) + 1)
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._hits.clear()
+            else:
+                self._hits.pop(key, None)
+
+
+def client_ip(request):
+    """The address the request came from"""
+    return request.META.get('REMOTE_ADDR', '')
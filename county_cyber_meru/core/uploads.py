@@ -0,0 +1,403 @@
+"""
+Upload handler that inspects files while they stream in.
+
+Django normally buffers an upload to memory or a temp file and leaves
+every check to later code that reads the file again. InspectingUploadHandler
+does the checks in the same pass that stores the chunks:
+
+- the extension must be in ALLOWED_FILE_TYPES and the first bytes must
+  match that type's signature
+- the size may not exceed UPLOAD_SIZE_LIMITS for the type
+- the SHA-256 of the content is computed as the chunks arrive
+
+A rejected file is skipped mid-stream: nothing more of it is stored and
+the reason is kept for the form (see report_rejections). Accepted files
+carry .sha256, .extension and .head (the first HEAD_BYTES) so later code
+can use them without reading the file again.
+
+Files too large to send in one request use the chunked upload API
+instead (core.views): the browser starts a ChunkedUpload, appends
+checksummed chunks that are written append-only to
+CHUNKED_UPLOAD_DIR, resumes from the last acknowledged offset after a
+dropped connection, and finally submits the form with the upload id.
+The whole file's SHA-256 is kept running as the chunks arrive (see
+running_digest) and stored when the last one lands, so submitting the
+form only compares checksums and sniffs the first bytes.
+files_with_chunked_upload() then hands the assembled file to the form
+as if it had been uploaded normally.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, MemoryFileUploadHandler, SkipFile, StopFutureHandlers,
+    TemporaryFileUploadHandler,
+)
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+HEAD_BYTES = 64 * 1024
+
+OLE2 = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # legacy Office and Publisher files
+ZIP = b'PK\x03\x04'  # Office Open XML
+SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'ai': (b'%PDF-', b'%!PS'),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'psd': (b'8BPS',),
+    'doc': (OLE2,),
+    'xls': (OLE2,),
+    'ppt': (OLE2,),
+    'pub': (OLE2,),
+    'docx': (ZIP,),
+    'xlsx': (ZIP,),
+    'pptx': (ZIP,),
+}
+SNIFF_BYTES = max(len(magic) for signatures in SIGNATURES.values() for magic in signatures)
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+READ_SIZE = 64 * 1024
+# Running digests of unfinished chunked uploads kept per process
+MAX_RUNNING_DIGESTS = 64
+
+_running_digests = OrderedDict()
+_running_digests_lock = threading.Lock()
+
+
+def file_extension(name):
+    return os.path.splitext(name)[1].lower().lstrip('.')
+
+
+def matches_signature(extension, head):
+    """Whether head starts like a file of this type (types without a signature always match)"""
+    signatures = SIGNATURES.get(extension)
+    return not signatures or head.startswith(signatures)
+
+
+class InspectingUploadHandler(FileUploadHandler):
+    """
+    Stores uploads like Django's default handlers (small ones in memory,
+    large ones in a temp file) while validating and hashing them.
+    """
+
+    def __init__(self, request=None, allowed_types=None, size_limits=None, max_size=None):
+        super().__init__(request)
+        self.allowed_types = set(allowed_types or settings.ALLOWED_FILE_TYPES)
+        self.size_limits = {**settings.UPLOAD_SIZE_LIMITS, **(size_limits or {})}
+        if max_size:
+            self.size_limits = {
+                extension: min(limit or max_size, max_size) for extension, limit in self.size_limits.items()
+            }
+        self.memory = MemoryFileUploadHandler(request)
+        self.temporary = TemporaryFileUploadHandler(request)
+        self.storage = None
+        self.rejections = {}
+        if request is not None:
+            request.upload_rejections = self.rejections
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Lets the memory handler decide whether this request fits in memory
+        self.memory.handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.extension = file_extension(file_name)
+        self.limit = self.size_limits.get(self.extension, self.size_limits.get('default'))
+        self.digest = hashlib.sha256()
+        self.head = bytearray()
+        self.size = 0
+        self.sniffed = False
+        self.storage = None
+        if self.extension not in self.allowed_types:
+            self.reject(f'.{self.extension or "?"} files are not accepted.')
+
+        self.storage = self.memory if self.memory.activated else self.temporary
+        try:
+            self.storage.new_file(field_name, file_name, *args, **kwargs)
+        except StopFutureHandlers:
+            pass
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.limit and self.size > self.limit:
+            self.reject(f'{self.file_name} is larger than {filesizeformat(self.limit)}.')
+        if len(self.head) < HEAD_BYTES:
+            self.head += raw_data[:HEAD_BYTES - len(self.head)]
+        if not self.sniffed and len(self.head) >= SNIFF_BYTES:
+            self.sniff()
+        self.digest.update(raw_data)
+        self.storage.receive_data_chunk(raw_data, start)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.sniffed:
+            self.sniff()
+        uploaded = self.storage.file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.digest.hexdigest()
+            uploaded.extension = self.extension
+            uploaded.head = bytes(self.head)
+        return uploaded
+
+    def sniff(self):
+        self.sniffed = True
+        if not matches_signature(self.extension, bytes(self.head)):
+            self.reject(f'{self.file_name} is not a valid .{self.extension} file.')
+
+    def reject(self, message):
+        self.rejections[self.field_name] = message
+        # Throw away what was stored so far
+        stored = getattr(self.storage, 'file', None)
+        if stored is not None:
+            stored.close()
+        raise SkipFile(message)
+
+
+def inspect_uploads(view=None, **options):
+    """
+    View decorator installing InspectingUploadHandler for the request.
+    Takes the same options as the handler (allowed_types, size_limits,
+    max_size).
+    """
+    def decorator(view):
+        protected = csrf_protect(view)
+
+        # Upload handlers can't change once CSRF checking has read POST
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.upload_handlers = [InspectingUploadHandler(request, **options)]
+            return protected(request, *args, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+def report_rejections(request, form):
+    """Show why the upload handler refused files as errors on their form fields"""
+    for field_name, message in getattr(request, 'upload_rejections', {}).items():
+        field = field_name if field_name in form.fields else None
+        if field in form.errors:
+            # Replace "This field is required" for the skipped file
+            del form.errors[field]
+        form.add_error(field, message)
+
+
+class ChunkError(Exception):
+    """A chunked upload request that can't be applied; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def start_chunked_upload(user, filename, size, sha256=''):
+    """Validate what the client is about to send and create its ChunkedUpload"""
+    from .models import ChunkedUpload
+
+    extension = file_extension(filename)
+    if extension not in settings.ALLOWED_FILE_TYPES:
+        raise ChunkError(f'.{extension or "?"} files are not accepted.')
+    limit = settings.UPLOAD_SIZE_LIMITS.get(extension, settings.UPLOAD_SIZE_LIMITS.get('default'))
+    if size <= 0 or (limit and size > limit):
+        raise ChunkError(f'{filename} is larger than {filesizeformat(limit)}.', 413)
+
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload = ChunkedUpload.objects.create(
+        user=user, filename=os.path.basename(filename), size=size, sha256=sha256.lower(),
+    )
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def running_digest(upload, f, offset):
+    """
+    SHA-256 of the first offset bytes of the upload's file f. Continues
+    from what this process hashed of the earlier chunks; chunks appended
+    by other processes are read back from disk, so each process only
+    hashes the bytes it hasn't seen.
+    """
+    with _running_digests_lock:
+        covered, digest = _running_digests.pop(upload.pk, (0, None))
+    if digest is None or covered > offset:
+        covered, digest = 0, hashlib.sha256()
+    f.seek(covered)
+    while covered < offset:
+        data = f.read(min(READ_SIZE, offset - covered))
+        if not data:
+            raise ChunkError('The upload is missing data; please start it again.', 409)
+        digest.update(data)
+        covered += len(data)
+    return digest
+
+
+def keep_running_digest(upload, offset, digest):
+    with _running_digests_lock:
+        _running_digests[upload.pk] = (offset, digest)
+        while len(_running_digests) > MAX_RUNNING_DIGESTS:
+            _running_digests.popitem(last=False)
+
+
+def append_chunk(upload, offset, stream, length, checksum=''):
+    """
+    Append length bytes from stream at offset. The chunk is only
+    acknowledged (upload.offset advanced) once it is on disk and matches
+    checksum; anything else is cut off again so a retry starts clean.
+    """
+    from .models import ChunkedUpload
+
+    if length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise ChunkError('Chunk too large.', 413)
+    if length <= 0 or offset + length > upload.size:
+        raise ChunkError('Chunk goes past the end of the file.')
+
+    with open(upload.path, 'r+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        # Re-read under the lock: another request may have just appended
+        upload.refresh_from_db(fields=['offset'])
+        if offset != upload.offset:
+            raise ChunkError('Offset does not match the upload.', 409)
+
+        # Drop bytes of any earlier attempt that was never acknowledged
+        f.truncate(offset)
+        file_digest = running_digest(upload, f, offset)
+        acknowledged = file_digest.copy()
+        f.seek(offset)
+        digest = hashlib.sha256()
+        received = 0
+        while received < length:
+            data = stream.read(min(READ_SIZE, length - received))
+            if not data:
+                break
+            digest.update(data)
+            file_digest.update(data)
+            f.write(data)
+            received += len(data)
+        if received != length or (checksum and digest.hexdigest() != checksum.lower()):
+            f.truncate(offset)
+            keep_running_digest(upload, offset, acknowledged)
+            raise ChunkError('Chunk was incomplete or did not match its checksum.')
+        f.flush()
+        os.fsync(f.fileno())
+
+        values = {'offset': offset + length, 'updated_at': timezone.now()}
+        if offset + length == upload.size:
+            values['received_sha256'] = upload.received_sha256 = file_digest.hexdigest()
+        else:
+            keep_running_digest(upload, offset + length, file_digest)
+        ChunkedUpload.objects.filter(pk=upload.pk, offset=offset).update(**values)
+    upload.offset = offset + length
+    return upload
+
+
+class AssembledUpload(UploadedFile):
+    """
+    A finished chunked upload. Like Django's TemporaryUploadedFile it
+    exposes temporary_file_path(), so FileSystemStorage moves it into
+    place instead of copying it.
+    """
+
+    def __init__(self, path, name, size, sha256, head):
+        # Opened on first read: storage moves the file by path, and a
+        # rejected form never touches it, so usually it isn't opened at all
+        self._file = None
+        super().__init__(None, name, None, size, None, None)
+        self.path = path
+        self.sha256 = sha256
+        self.extension = file_extension(name)
+        self.head = head
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def assembled_upload(upload):
+    """
+    Check a complete ChunkedUpload the way InspectingUploadHandler checks a
+    normal upload and wrap it as an UploadedFile.
+    """
+    if not upload.is_complete:
+        raise ChunkError(f'{upload.filename} has not finished uploading.', 409)
+    with open(upload.path, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+        sha256 = upload.received_sha256
+        if not sha256:
+            # Finished before checksums were kept while receiving
+            digest = hashlib.sha256(head)
+            for data in iter(lambda: f.read(READ_SIZE), b''):
+                digest.update(data)
+            sha256 = digest.hexdigest()
+    if upload.sha256 and sha256 != upload.sha256:
+        raise ChunkError(f'{upload.filename} does not match its checksum.')
+    extension = file_extension(upload.filename)
+    if not matches_signature(extension, head):
+        raise ChunkError(f'{upload.filename} is not a valid .{extension} file.')
+    return AssembledUpload(upload.path, upload.filename, upload.size, sha256, head)
+
+
+def record_rejection(request, field_name, message):
+    if not hasattr(request, 'upload_rejections'):
+        request.upload_rejections = {}
+    request.upload_rejections[field_name] = message
+
+
+def files_with_chunked_upload(request, field_name, param='chunked_upload'):
+    """
+    request.FILES, plus the chunked upload named by POST[param] as
+    field_name. Returns (files, upload); upload is None if none was used.
+    Problems are reported like rejected uploads (see report_rejections).
+    """
+    from .models import ChunkedUpload
+
+    upload_id = request.POST.get(param)
+    if not upload_id or field_name in request.FILES:
+        return request.FILES, None
+    try:
+        upload = ChunkedUpload.objects.get(pk=uuid.UUID(upload_id), user=request.user)
+        uploaded = assembled_upload(upload)
+    except (ValueError, ChunkedUpload.DoesNotExist):
+        record_rejection(request, field_name, 'The uploaded file has expired. Please upload it again.')
+        return request.FILES, None
+    except ChunkError as error:
+        record_rejection(request, field_name, str(error))
+        return request.FILES, None
+    files = request.FILES.copy()
+    files[field_name] = uploaded
+    return files, upload
@@ -5,5 +5,6 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
-    
+    path('uploads/', views.chunked_upload_start, name='chunked-upload-start'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload_detail, name='chunked-upload-detail'),
 ]
\ No newline at end of file
@@ -1,6 +1,11 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_http_methods, require_POST
 from task_manager.models import TaskCategory
-from .models import SliderImage
+from .models import ChunkedUpload, SliderImage
+from . import uploads
 
 # Create your views here.
 def home(request):
@@ -12,3 +17,53 @@ def about(request):
 
 def contact(request):
     return render(request, 'public/contact.html')
+
+
+# Chunked upload API (see core.uploads)
+def chunked_upload_state(upload, status=200, error=None):
+    state = {
+        'id': str(upload.pk),
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        'complete': upload.is_complete,
+    }
+    if error:
+        state['error'] = error
+    return JsonResponse(state, status=status)
+
+@login_required
+@require_POST
+def chunked_upload_start(request):
+    """Begin a chunked upload: POST filename, size and optionally sha256"""
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size is required.'}, status=400)
+    try:
+        upload = uploads.start_chunked_upload(
+            request.user, request.POST.get('filename', ''), size, request.POST.get('sha256', ''),
+        )
+    except uploads.ChunkError as error:
+        return JsonResponse({'error': str(error)}, status=error.status)
+    return chunked_upload_state(upload, status=201)
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def chunked_upload_detail(request, upload_id):
+    """GET the acknowledged offset to resume from; PUT the next chunk as the request body"""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('X-Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return JsonResponse({'error': 'X-Upload-Offset and Content-Length are required.'}, status=400)
+        try:
+            # Read from the stream: request.body would buffer the chunk in memory
+            uploads.append_chunk(upload, offset, request, length, request.headers.get('X-Chunk-SHA256', ''))
+        except uploads.ChunkError as error:
+            upload.refresh_from_db(fields=['offset'])
+            return chunked_upload_state(upload, status=error.status, error=str(error))
+    return chunked_upload_state(upload)
+
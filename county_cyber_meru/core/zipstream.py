@@ -0,0 +1,197 @@
+"""
+ZIP archives streamed while they are being built.
+
+ZipStream writes each member's local header, then its data as it is
+read from storage, then a data descriptor with the CRC; the central
+directory goes at the end. Nothing is buffered beyond one read chunk
+and nothing touches the disk, so a bundle of a whole template category
+costs the same memory as a single file.
+
+Formats that are already compressed (JPG, PNG, PDF, Office Open XML)
+are stored as-is; everything else is deflated. When every member is
+stored, the archive length is known before the first byte is sent and
+content_length() returns it. A member's size may also be left unknown
+(None) when it is produced on the fly, such as a rendered document; it
+is then recorded from what was read, and the archive has no known
+length. ZIP64 records are written where sizes or
+offsets need them.
+"""
+import struct
+import time
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+STORED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'pdf', 'ai',
+    'docx', 'xlsx', 'pptx', 'zip', 'gz', 'mp4', 'mp3',
+}
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP16_LIMIT = 0xFFFF
+FLAGS = 0x0808  # sizes in a data descriptor, UTF-8 names
+STORED, DEFLATED = 0, 8
+
+
+class Member:
+    """One file in the archive; open() returns a binary file object; size is None if not known yet"""
+
+    def __init__(self, name, size, open, modified=None, compress=None):
+        self.name = name
+        self.size = size
+        self.open = open
+        self.modified = modified
+        if compress is None:
+            compress = name.rsplit('.', 1)[-1].lower() not in STORED_EXTENSIONS
+        self.method = DEFLATED if compress else STORED
+        if size is None:
+            # Only small generated files are added without a size
+            self.zip64 = False
+        else:
+            # Deflate can grow incompressible data a little
+            worst_case = size + size // 100 + 1024 if compress else size
+            self.zip64 = worst_case >= ZIP32_LIMIT
+        self.encoded_name = name.encode('utf-8')
+
+    def dos_time(self):
+        modified = self.modified.timetuple() if self.modified else time.localtime()
+        year = max(modified.tm_year, 1980)
+        return (
+            (modified.tm_hour << 11) | (modified.tm_min << 5) | (modified.tm_sec // 2),
+            ((year - 1980) << 9) | (modified.tm_mon << 5) | modified.tm_mday,
+        )
+
+
+def local_header(member):
+    dos_time, dos_date = member.dos_time()
+    extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0) if member.zip64 else b''
+    return struct.pack(
+        '<IHHHHHIIIHH', 0x04034b50, 45 if member.zip64 else 20, FLAGS, member.method,
+        dos_time, dos_date, 0, 0xFFFFFFFF if member.zip64 else 0, 0xFFFFFFFF if member.zip64 else 0,
+        len(member.encoded_name), len(extra),
+    ) + member.encoded_name + extra
+
+
+def data_descriptor(member, crc, compressed_size):
+    if member.zip64:
+        return struct.pack('<IIQQ', 0x08074b50, crc, compressed_size, member.size)
+    return struct.pack('<IIII', 0x08074b50, crc, compressed_size, member.size)
+
+
+def central_header(member, crc, compressed_size, offset):
+    dos_time, dos_date = member.dos_time()
+    zip64_fields = []
+    sizes = (member.size, compressed_size)
+    if member.zip64:
+        zip64_fields.extend(sizes)
+        sizes = (ZIP32_LIMIT, ZIP32_LIMIT)
+    if offset >= ZIP32_LIMIT:
+        zip64_fields.append(offset)
+        offset = ZIP32_LIMIT
+    extra = b''
+    if zip64_fields:
+        extra = struct.pack(f'<HH{len(zip64_fields)}Q', 0x0001, 8 * len(zip64_fields), *zip64_fields)
+    needs = 45 if zip64_fields else 20
+    return struct.pack(
+        '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | needs, needs, FLAGS, member.method,
+        dos_time, dos_date, crc, sizes[1], sizes[0],
+        len(member.encoded_name), len(extra), 0, 0, 0, 0o100644 << 16, offset,
+    ) + member.encoded_name + extra
+
+
+def end_records(count, directory_offset, directory_size):
+    records = b''
+    if count >= ZIP16_LIMIT or directory_offset >= ZIP32_LIMIT or directory_size >= ZIP32_LIMIT:
+        zip64_end_offset = directory_offset + directory_size
+        records += struct.pack(
+            '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset,
+        )
+        records += struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+        count = min(count, ZIP16_LIMIT)
+        directory_offset = min(directory_offset, ZIP32_LIMIT)
+        directory_size = min(directory_size, ZIP32_LIMIT)
+    return records + struct.pack(
+        '<IHHHHIIH', 0x06054b50, 0, 0, count, count, directory_size, directory_offset, 0,
+    )
+
+
+class ZipStream:
+    def __init__(self):
+        self.members = []
+        self._names = set()
+
+    def add(self, name, size, open, modified=None, compress=None):
+        """Queue a file; repeated names get a (2), (3), ... suffix"""
+        unique, n = name, 1
+        while unique in self._names:
+            n += 1
+            stem, dot, extension = name.rpartition('.')
+            unique = f'{stem} ({n}).{extension}' if dot else f'{name} ({n})'
+        self._names.add(unique)
+        self.members.append(Member(unique, size, open, modified, compress))
+
+    def add_file(self, name, field_file, modified=None):
+        """Queue a FieldFile from storage; False if its file is missing"""
+        storage, path = field_file.storage, field_file.name
+        try:
+            size = storage.size(path)
+        except OSError:
+            return False
+        self.add(name, size, lambda: storage.open(path, 'rb'), modified)
+        return True
+
+    def content_length(self):
+        """Exact archive size, or None if any member is deflated or of unknown size"""
+        if any(member.method != STORED or member.size is None for member in self.members):
+            return None
+        offset = directory_size = 0
+        offsets = []
+        for member in self.members:
+            offsets.append(offset)
+            offset += len(local_header(member)) + member.size + len(data_descriptor(member, 0, member.size))
+        for member, member_offset in zip(self.members, offsets):
+            directory_size += len(central_header(member, 0, member.size, member_offset))
+        return offset + directory_size + len(end_records(len(self.members), offset, directory_size))
+
+    def __iter__(self):
+        offset = 0
+        directory = []
+        for member in self.members:
+            header = local_header(member)
+            yield header
+            crc, size, compressed_size = 0, 0, 0
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if member.method == DEFLATED else None
+            with member.open() as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    if compressor:
+                        chunk = compressor.compress(chunk)
+                    compressed_size += len(chunk)
+                    if chunk:
+                        yield chunk
+            if compressor:
+                chunk = compressor.flush()
+                compressed_size += len(chunk)
+                yield chunk
+            # Record what was actually read, should the file have changed
+            member.size = size
+            descriptor = data_descriptor(member, crc, compressed_size)
+            yield descriptor
+            directory.append(central_header(member, crc, compressed_size, offset))
+            offset += len(header) + compressed_size + len(descriptor)
+
+        directory_size = sum(len(entry) for entry in directory)
+        yield b''.join(directory)
+        yield end_records(len(directory), offset, directory_size)
+
+
+def streaming_response(archive, filename):
+    """StreamingHttpResponse sending archive as a download called filename"""
+    from django.http import StreamingHttpResponse
+
+    response = StreamingHttpResponse(iter(archive), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    length = archive.content_length()
+    if length is not None:
+        response['Content-Length'] = str(length)
+    return response
@@ -135,6 +135,19 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Must be shared by every worker process: the service catalog, choice lists
+# and duplicate index reload when another process bumps their version key,
+# and dashboard widgets lock their refreshes here. Files are shared on one
+# host, though add() isn't atomic across processes, so those locks are
+# best-effort; a deployment across several hosts needs Redis or Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # Custom user model
@@ -142,7 +155,22 @@ AUTH_USER_MODEL = 'staff.StaffProfile'
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
-ALLOWED_FILE_TYPES = ['pdf', 'docx', 'xlsx', 'pub', 'jpg', 'jpeg', 'png']
+ALLOWED_FILE_TYPES = [
+    'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'pub',
+    'jpg', 'jpeg', 'png', 'gif', 'psd', 'ai',
+]
+# Largest accepted upload per file type, enforced by core.uploads
+UPLOAD_SIZE_LIMITS = {
+    'default': 25 * 1024 * 1024,
+    'pdf': 200 * 1024 * 1024,
+    'ai': 200 * 1024 * 1024,
+    'psd': 500 * 1024 * 1024,
+}
+# Resumable uploads: files above the threshold are sent in chunks by the browser
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'chunked_uploads')
+CHUNKED_UPLOAD_THRESHOLD = 10 * 1024 * 1024
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = 24 * 3600  # seconds an unfinished upload is kept
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -154,6 +182,40 @@ LOGIN_URL = '/staff/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Automatic task assignment
+# Set TASK_AUTO_ASSIGN to assign tasks as they are submitted; otherwise run
+# `manage.py assign_tasks --loop`.
+TASK_AUTO_ASSIGN = False
+TASK_ASSIGNMENT_STRATEGY = 'least_loaded'  # or a dotted path to an AssignmentStrategy
+TASK_ASSIGNMENT_REFRESH = 60  # seconds between reloads of the staff pool
+
+# Background work (previews, file processing), see core.background
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False  # run jobs inline instead of on worker threads
+
+# Public task submission
+TASK_SUBMISSION_DUPLICATE_WINDOW = 600  # seconds in which a repeated submission is the same task
+TASK_ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024  # customer uploads, whatever the file type
+TASK_SUBMISSION_RATE_LIMITS = {
+    # key: (submissions, per seconds)
+    'ip': (30, 3600),
+    'email': (10, 3600),
+}
+
+# Receipts and invoices for completed tasks, see task_manager.receipts
+BUSINESS_DETAILS = {
+    'name': 'County Cyber Meru',
+    'address': 'Meru Town, Kenya',
+    'phone': '+254 700 000 000',
+    'email': '',
+}
+RECEIPT_CURRENCY = 'KSh'
+RECEIPT_WORKERS = None  # rendering processes; None uses one per CPU
+MERGE_WORKERS = None  # merge_template command processes; None uses one per CPU
+TEMPLATE_SPRITES = True  # grid pages show previews from one sprite sheet instead of an image each
+PAGE_PREVIEW_DIR = os.path.join(BASE_DIR, 'page_previews')  # disk cache of rendered template pages
+PAGE_PREVIEW_CACHE_BYTES = 256 * 1024 * 1024  # least recently used pages are evicted beyond this
+
 # Only allow staff members to login
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -7,6 +7,7 @@ from dashboard.views import dashboard
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('dashboard/', dashboard, name='dashboard'),
+    path('dashboard/', include('dashboard.urls')),
     path('templates/', include('template_manager.urls')),
     path('categories/', include('categories.urls')),
     path('', include('core.urls')),
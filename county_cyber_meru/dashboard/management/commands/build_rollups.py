@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from dashboard import rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold new downloads and tasks into the daily rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compact-days', type=int, metavar='N',
+            help='Afterwards delete raw download records older than N days (their counts stay in the rollups)'
+        )
+
+    def handle(self, *args, **options):
+        downloads = rollups.roll_up_downloads()
+        tasks = rollups.roll_up_tasks()
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {downloads} download(s) and {tasks} task event(s)'))
+
+        if options['compact_days'] is not None:
+            deleted = rollups.compact_downloads(options['compact_days'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Compacted {deleted} download record(s) older than {options['compact_days']} day(s)"
+            ))
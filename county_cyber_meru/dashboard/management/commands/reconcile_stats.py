@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from dashboard import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute dashboard counters from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep reconciling at a fixed interval')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between runs in loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            drifted = stats.reconcile()
+            if drifted:
+                self.stdout.write(self.style.WARNING(f'Corrected {drifted} counter(s)'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All counters are up to date'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
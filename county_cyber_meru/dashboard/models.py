@@ -1,3 +1,107 @@
 from django.db import models
+from django.conf import settings
+from django.db.models import Q
 
 # Create your models here.
+
+class StatCounter(models.Model):
+    """
+    Dashboard counter maintained incrementally by signals (see dashboard.stats).
+    Global counters have no user; per-user counters are keyed by user.
+    """
+    name = models.CharField(max_length=50)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stat_counters'
+    )
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name'],
+                condition=Q(user__isnull=True),
+                name='unique_global_stat_counter'
+            ),
+            models.UniqueConstraint(
+                fields=['name', 'user'],
+                condition=Q(user__isnull=False),
+                name='unique_user_stat_counter'
+            ),
+        ]
+
+    def __str__(self):
+        scope = self.user_id or 'global'
+        return f"{self.name} ({scope}): {self.value}"
+
+
+class RollupWatermark(models.Model):
+    """How far build_rollups has processed a source table"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: id {self.last_id}"
+
+
+class DailyDownloadRollup(models.Model):
+    """Template downloads per day, template and user"""
+    day = models.DateField()
+    template = models.ForeignKey(
+        'template_manager.TemplateDocument',
+        on_delete=models.CASCADE,
+        related_name='daily_downloads'
+    )
+    category = models.ForeignKey(
+        'template_manager.Category',
+        on_delete=models.CASCADE,
+        related_name='daily_downloads'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_downloads'
+    )
+    downloads = models.PositiveIntegerField(default=0)
+    # Raw TemplateDownload rows already folded in and deleted
+    compacted = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'template', 'user'], name='unique_daily_download_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.template_id}: {self.downloads}"
+
+
+class DailyTaskRollup(models.Model):
+    """Tasks created and completed per day and service"""
+    day = models.DateField()
+    category = models.ForeignKey(
+        'task_manager.TaskCategory',
+        on_delete=models.CASCADE,
+        related_name='daily_rollups'
+    )
+    created = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_daily_task_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}: +{self.created} / {self.completed} done"
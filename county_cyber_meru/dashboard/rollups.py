@@ -0,0 +1,186 @@
+"""
+Daily rollups of downloads and task throughput.
+
+`manage.py build_rollups` folds only the source rows added since the last run into
+the rollup tables, tracked by a RollupWatermark per source. Trend charts
+then read a few hundred rollup rows instead of scanning the full history.
+compact_downloads() deletes raw TemplateDownload rows older than N days
+once they have been rolled up, keeping their count in the rollup. It
+works through them in id batches, each in its own short transaction, and
+deletes with a raw DELETE: no instances are loaded and no post_delete
+signals fire, so the dashboard's download counters keep counting them.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from task_manager.models import Task
+from template_manager.models import TemplateDownload
+
+from .models import DailyDownloadRollup, DailyTaskRollup, RollupWatermark
+
+DOWNLOADS = 'downloads'
+TASKS_CREATED = 'tasks_created'
+TASKS_COMPLETED = 'tasks_completed'
+# Raw download rows deleted per compact_downloads() transaction
+COMPACT_BATCH_SIZE = 5000
+
+
+def watermark(name):
+    return RollupWatermark.objects.select_for_update().get_or_create(name=name)[0]
+
+
+def merge(model, key_fields, totals, extra=None):
+    """
+    Add totals {key tuple: {field: n}} into model rows identified by key_fields,
+    with one SELECT, one bulk_update and one bulk_create. extra maps a key to
+    additional field values used only when its row is created.
+    """
+    if not totals:
+        return
+    existing = {
+        tuple(getattr(row, field) for field in key_fields): row
+        for row in model.objects.filter(day__in={key[0] for key in totals})
+    }
+    changed, created = [], []
+    fields = set()
+    for key, values in totals.items():
+        fields.update(values)
+        row = existing.get(key)
+        if row is None:
+            created.append(model(**dict(zip(key_fields, key)), **(extra or {}).get(key, {}), **values))
+            continue
+        for field, n in values.items():
+            setattr(row, field, getattr(row, field) + n)
+        changed.append(row)
+    model.objects.bulk_update(changed, sorted(fields), batch_size=500)
+    model.objects.bulk_create(created, batch_size=500)
+
+
+def roll_up_downloads():
+    """Fold new TemplateDownload rows into DailyDownloadRollup"""
+    with transaction.atomic():
+        mark = watermark(DOWNLOADS)
+        new_rows = TemplateDownload.objects.filter(id__gt=mark.last_id)
+        upper = new_rows.aggregate(upper=Max('id'))['upper']
+        if upper is None:
+            return 0
+        totals, extra = {}, {}
+        for day, template_id, category_id, user_id, count in (
+            new_rows.filter(id__lte=upper)
+            .annotate(day=TruncDate('downloaded_at'))
+            .values_list('day', 'template_id', 'template__category_id', 'downloaded_by_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        ):
+            totals[(day, template_id, user_id)] = {'downloads': count}
+            extra[(day, template_id, user_id)] = {'category_id': category_id}
+        merge(DailyDownloadRollup, ('day', 'template_id', 'user_id'), totals, extra)
+        mark.last_id = upper
+        mark.save()
+    return sum(values['downloads'] for values in totals.values())
+
+
+def roll_up_tasks(now=None):
+    """Fold tasks created and completed since the last run into DailyTaskRollup"""
+    now = now or timezone.now()
+    processed = 0
+    with transaction.atomic():
+        created_mark = watermark(TASKS_CREATED)
+        completed_mark = watermark(TASKS_COMPLETED)
+        totals = {}
+
+        new_tasks = Task.objects.filter(id__gt=created_mark.last_id)
+        upper = new_tasks.aggregate(upper=Max('id'))['upper']
+        if upper is not None:
+            for day, category_id, count in (
+                new_tasks.filter(id__lte=upper)
+                .annotate(day=TruncDate('created_at'))
+                .values_list('day', 'category_id')
+                .annotate(count=Count('id'))
+                .order_by()
+            ):
+                totals.setdefault((day, category_id), Counter())['created'] += count
+                processed += count
+            created_mark.last_id = upper
+            created_mark.save()
+
+        completed = Task.objects.filter(status='completed', completed_at__lte=now)
+        if completed_mark.last_timestamp:
+            completed = completed.filter(completed_at__gt=completed_mark.last_timestamp)
+        for day, category_id, count in (
+            completed.annotate(day=TruncDate('completed_at'))
+            .values_list('day', 'category_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        ):
+            totals.setdefault((day, category_id), Counter())['completed'] += count
+            processed += count
+        completed_mark.last_timestamp = now
+        completed_mark.save()
+
+        merge(DailyTaskRollup, ('day', 'category_id'), totals)
+    return processed
+
+
+def compact_downloads(days, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Delete raw TemplateDownload rows older than `days` days that are already
+    rolled up, recording them in DailyDownloadRollup.compacted.
+    Returns the number of rows deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            mark = watermark(DOWNLOADS)
+            ids = list(
+                TemplateDownload.objects.filter(id__lte=mark.last_id, downloaded_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            batch = TemplateDownload.objects.filter(pk__in=ids)
+            counts = {
+                (day, template_id, user_id): count
+                for day, template_id, user_id, count in (
+                    batch.annotate(day=TruncDate('downloaded_at'))
+                    .values_list('day', 'template_id', 'downloaded_by_id')
+                    .annotate(count=Count('id'))
+                    .order_by()
+                )
+            }
+            rows = list(DailyDownloadRollup.objects.filter(day__in={key[0] for key in counts}))
+            for row in rows:
+                row.compacted += counts.get((row.day, row.template_id, row.user_id), 0)
+            DailyDownloadRollup.objects.bulk_update(rows, ['compacted'], batch_size=500)
+            # Nothing references a download, so no cascade is skipped; without
+            # post_delete, compacted downloads still count towards the dashboard totals
+            deleted += batch._raw_delete(batch.db)
+
+
+def download_series(start, end, category=None, template=None):
+    """{day: downloads} between start and end (inclusive) from the rollups"""
+    rollups = DailyDownloadRollup.objects.filter(day__gte=start, day__lte=end)
+    if category:
+        rollups = rollups.filter(category=category)
+    if template:
+        rollups = rollups.filter(template=template)
+    return dict(rollups.values_list('day').annotate(total=Sum('downloads')).order_by())
+
+
+def task_series(start, end, category=None):
+    """{day: (created, completed)} between start and end (inclusive) from the rollups"""
+    rollups = DailyTaskRollup.objects.filter(day__gte=start, day__lte=end)
+    if category:
+        rollups = rollups.filter(category=category)
+    return {
+        day: (created, completed)
+        for day, created, completed in rollups.values('day').annotate(
+            created_total=Sum('created'), completed_total=Sum('completed')
+        ).values_list('day', 'created_total', 'completed_total').order_by()
+    }
@@ -0,0 +1,74 @@
+"""
+Signal handlers keeping dashboard.stats counters in step with the source tables.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from task_manager.models import Task
+from template_manager.models import TemplateDocument, TemplateDownload
+
+from . import stats
+
+TRACKED = {
+    TemplateDocument: (stats.TEMPLATE_FIELDS, stats.template_contribution),
+    Task: (stats.TASK_FIELDS, stats.task_contribution),
+}
+
+
+def current_values(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+
+def loaded_values(instance, fields):
+    """Values the instance had in the database, or None if unknown"""
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded and all(field in loaded for field in fields):
+        return {field: loaded[field] for field in fields}
+    return None
+
+
+@receiver(pre_save, sender=TemplateDocument)
+@receiver(pre_save, sender=Task)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fields = TRACKED[sender][0]
+    old = loaded_values(instance, fields)
+    if old is None:
+        old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._stats_previous = old
+
+
+@receiver(post_save, sender=TemplateDocument)
+@receiver(post_save, sender=Task)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    fields, contribution = TRACKED[sender]
+    old = None if created else getattr(instance, '_stats_previous', None)
+    new = current_values(instance, fields)
+    stats.apply_deltas(stats.difference(contribution(old), contribution(new)))
+    # The saved state is the baseline for the next save of this instance
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **new}
+    instance._stats_previous = None
+
+
+@receiver(post_delete, sender=TemplateDocument)
+@receiver(post_delete, sender=Task)
+def update_counters_on_delete(sender, instance, **kwargs):
+    fields, contribution = TRACKED[sender]
+    old = loaded_values(instance, fields) or current_values(instance, fields)
+    stats.apply_deltas(stats.difference(contribution(old), {}))
+
+
+@receiver(post_save, sender=TemplateDownload)
+def count_download(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.apply_deltas(stats.download_contribution({'downloaded_by_id': instance.downloaded_by_id}))
+
+
+@receiver(post_delete, sender=TemplateDownload)
+def uncount_download(sender, instance, **kwargs):
+    stats.apply_deltas(stats.difference(
+        stats.download_contribution({'downloaded_by_id': instance.downloaded_by_id}), {}
+    ))
@@ -0,0 +1,193 @@
+"""
+Materialized dashboard statistics.
+
+Counters live in StatCounter rows and are kept up to date by the signal
+handlers in dashboard.signals, so the dashboards read one small row set
+instead of running a COUNT per statistic. Each tracked model maps a row
+state to the counters it contributes to; a save applies the difference
+between the old and new contribution, a delete removes the old one.
+reconcile() recomputes everything from the source tables and is run
+periodically by `manage.py reconcile_stats` to repair any drift (for
+example after raw queryset.update() calls).
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import DailyDownloadRollup, StatCounter
+
+# Global counters
+TEMPLATES_ACTIVE = 'templates_active'
+TEMPLATES_PENDING = 'templates_pending'
+DOWNLOADS = 'downloads'
+TASKS_TOTAL = 'tasks_total'
+TASKS_OVERDUE = 'tasks_overdue'
+
+# Per-user counters (DOWNLOADS is also kept per user)
+UPLOADS = 'uploads'
+OPEN_TASKS = 'open_tasks'
+
+TASK_STATUSES = ['pending', 'in_progress', 'completed', 'cancelled']
+TASK_PRIORITIES = ['low', 'medium', 'high', 'urgent']
+OPEN_STATUSES = ['pending', 'in_progress']
+
+
+def task_status_counter(status):
+    return f'tasks_{status}'
+
+
+def task_priority_counter(priority):
+    return f'tasks_priority_{priority}'
+
+
+# Fields each model contributes through, used to snapshot loaded values
+TEMPLATE_FIELDS = ('is_active', 'is_verified', 'uploaded_by_id')
+TASK_FIELDS = ('status', 'priority', 'is_overdue', 'assigned_to_id')
+
+
+def template_contribution(values):
+    """Counters a TemplateDocument row with these values adds to"""
+    contribution = Counter()
+    if values and values['is_active']:
+        contribution[(TEMPLATES_ACTIVE, None)] += 1
+        contribution[(UPLOADS, values['uploaded_by_id'])] += 1
+        if not values['is_verified']:
+            contribution[(TEMPLATES_PENDING, None)] += 1
+    return contribution
+
+
+def task_contribution(values):
+    """Counters a Task row with these values adds to"""
+    contribution = Counter()
+    if values:
+        contribution[(TASKS_TOTAL, None)] += 1
+        contribution[(task_status_counter(values['status']), None)] += 1
+        contribution[(task_priority_counter(values['priority']), None)] += 1
+        if values['is_overdue']:
+            contribution[(TASKS_OVERDUE, None)] += 1
+        if values['assigned_to_id'] and values['status'] in OPEN_STATUSES:
+            contribution[(OPEN_TASKS, values['assigned_to_id'])] += 1
+    return contribution
+
+
+def download_contribution(values):
+    """Counters a TemplateDownload row adds to"""
+    contribution = Counter()
+    if values:
+        contribution[(DOWNLOADS, None)] += 1
+        contribution[(DOWNLOADS, values['downloaded_by_id'])] += 1
+    return contribution
+
+
+def difference(old, new):
+    """Per-counter delta going from contribution old to contribution new"""
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add each (name, user_id) -> delta to its counter, creating rows as needed"""
+    for (name, user_id), delta in deltas.items():
+        if not delta:
+            continue
+        updated = StatCounter.objects.filter(name=name, user_id=user_id).update(value=F('value') + delta)
+        if updated:
+            continue
+        if not StatCounter.objects.exists():
+            # Counters were never built; the recount already includes this change
+            reconcile()
+            return
+        try:
+            with transaction.atomic():
+                StatCounter.objects.create(name=name, user_id=user_id, value=delta)
+        except IntegrityError:
+            # Another request created the row first
+            StatCounter.objects.filter(name=name, user_id=user_id).update(value=F('value') + delta)
+
+
+def read(user=None):
+    """
+    Return (global_counters, user_counters) as dicts in a single query.
+    Missing counters read as 0.
+    """
+    lookup = Q(user__isnull=True)
+    if user is not None and user.is_authenticated:
+        lookup |= Q(user=user)
+    rows = list(StatCounter.objects.filter(lookup).values_list('name', 'user_id', 'value'))
+    if not rows:
+        # First use: build the counters from the source tables
+        reconcile()
+        rows = list(StatCounter.objects.filter(lookup).values_list('name', 'user_id', 'value'))
+
+    global_counters = Counter()
+    user_counters = Counter()
+    for name, user_id, value in rows:
+        if user_id is None:
+            global_counters[name] = value
+        else:
+            user_counters[name] = value
+    return global_counters, user_counters
+
+
+def compute():
+    """Recompute every counter from the source tables"""
+    from template_manager.models import TemplateDocument, TemplateDownload
+    from task_manager.models import Task
+
+    expected = Counter()
+    # Always materialize the status and priority counters, even at zero
+    for status in TASK_STATUSES:
+        expected[(task_status_counter(status), None)] = 0
+    for priority in TASK_PRIORITIES:
+        expected[(task_priority_counter(priority), None)] = 0
+
+    templates = TemplateDocument.objects.filter(is_active=True)
+    expected[(TEMPLATES_ACTIVE, None)] = templates.count()
+    expected[(TEMPLATES_PENDING, None)] = templates.filter(is_verified=False).count()
+    for user_id, count in templates.values_list('uploaded_by').annotate(count=Count('id')).order_by():
+        expected[(UPLOADS, user_id)] = count
+
+    # Downloads compacted into the daily rollups still count
+    expected[(DOWNLOADS, None)] = TemplateDownload.objects.count()
+    for user_id, count in TemplateDownload.objects.values_list('downloaded_by').annotate(
+        count=Count('id')
+    ).order_by():
+        expected[(DOWNLOADS, user_id)] = count
+    for user_id, compacted in DailyDownloadRollup.objects.filter(compacted__gt=0).values_list(
+        'user'
+    ).annotate(total=Sum('compacted')).order_by():
+        expected[(DOWNLOADS, None)] += compacted
+        expected[(DOWNLOADS, user_id)] += compacted
+
+    expected[(TASKS_TOTAL, None)] = Task.objects.count()
+    expected[(TASKS_OVERDUE, None)] = Task.objects.filter(is_overdue=True).count()
+    for status, count in Task.objects.values_list('status').annotate(count=Count('id')).order_by():
+        expected[(task_status_counter(status), None)] = count
+    for priority, count in Task.objects.values_list('priority').annotate(count=Count('id')).order_by():
+        expected[(task_priority_counter(priority), None)] = count
+    for user_id, count in Task.objects.filter(
+        status__in=OPEN_STATUSES, assigned_to__isnull=False
+    ).values_list('assigned_to').annotate(count=Count('id')).order_by():
+        expected[(OPEN_TASKS, user_id)] = count
+
+    return expected
+
+
+def reconcile():
+    """Rewrite the counter table from the source tables. Returns the number of counters fixed."""
+    with transaction.atomic():
+        expected = compute()
+        current = {
+            (name, user_id): value
+            for name, user_id, value in StatCounter.objects.values_list('name', 'user_id', 'value')
+        }
+        drifted = sum(1 for key in set(expected) | set(current) if expected.get(key, 0) != current.get(key, 0))
+        if drifted or not current:
+            StatCounter.objects.all().delete()
+            StatCounter.objects.bulk_create(
+                StatCounter(name=name, user_id=user_id, value=value)
+                for (name, user_id), value in expected.items()
+            )
+    return drifted
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'dashboard'
+
+urlpatterns = [
+    path('widgets/<slug:name>/', views.dashboard_widget, name='widget'),
+    path('charts/downloads/', views.download_chart, name='download-chart'),
+    path('charts/tasks/', views.task_chart, name='task-chart'),
+]
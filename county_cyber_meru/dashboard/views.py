@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect
 
 # Create your views here.
-from django.contrib.auth.decorators import login_required
-from template_manager.models import Category, TemplateDocument, TemplateDownload, TemplateRating
+from datetime import timedelta
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Count, Sum
-from task_manager.models import Task
+from . import rollups, stats
+from .widgets import WIDGETS
 
 @login_required
 def dashboard(request):
@@ -13,41 +15,22 @@ def dashboard(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('home')
     
-    # Calculate statistics
-    total_templates = TemplateDocument.objects.filter(is_active=True).count()
-    user_uploads = TemplateDocument.objects.filter(uploaded_by=request.user, is_active=True).count()
-    pending_verification = TemplateDocument.objects.filter(is_verified=False, is_active=True).count()
-    total_downloads = TemplateDownload.objects.count()
+    # Counters are maintained by dashboard.stats; one query for all of them
+    counters, user_counters = stats.read(request.user)
+    total_templates = counters[stats.TEMPLATES_ACTIVE]
+    user_uploads = user_counters[stats.UPLOADS]
+    pending_verification = counters[stats.TEMPLATES_PENDING]
+    total_downloads = counters[stats.DOWNLOADS]
     task_stats = {
-        'total_tasks': Task.objects.count(),
-        'pending_tasks': Task.objects.filter(status='pending').count(),
-        'in_progress_tasks': Task.objects.filter(status='in_progress').count(),
-        'my_tasks': Task.objects.filter(assigned_to=request.user).exclude(
-            status__in=['completed', 'cancelled']
-        ).count(),
-        'recent_tasks': Task.objects.all().order_by('-created_at')[:5],
+        'total_tasks': counters[stats.TASKS_TOTAL],
+        'pending_tasks': counters[stats.task_status_counter('pending')],
+        'in_progress_tasks': counters[stats.task_status_counter('in_progress')],
+        'my_tasks': user_counters[stats.OPEN_TASKS],
     }
     # User-specific downloads
-    user_downloads = TemplateDownload.objects.filter(downloaded_by=request.user).count()
-    
-    # Recent templates (last 5)
-    recent_templates = TemplateDocument.objects.filter(is_active=True).order_by('-uploaded_at')[:5]
-    
-    # Top categories
-    top_categories = Category.objects.annotate(
-        template_count=Count('templates')
-    ).filter(template_count__gt=0, is_active=True).order_by('-template_count')[:5]
-    
-    # User's recent activity
-    user_recent_uploads = TemplateDocument.objects.filter(
-        uploaded_by=request.user, 
-        is_active=True
-    ).order_by('-uploaded_at')[:3]
-    
-    user_recent_downloads = TemplateDownload.objects.filter(
-        downloaded_by=request.user
-    ).select_related('template').order_by('-downloaded_at')[:3]
+    user_downloads = user_counters[stats.DOWNLOADS]
 
+    # The lists on the page are widgets fetched separately, see dashboard.widgets
     context = {
         'user': request.user,
         'total_templates': total_templates,
@@ -55,10 +38,64 @@ def dashboard(request):
         'pending_verification': pending_verification,
         'total_downloads': total_downloads,
         'user_downloads': user_downloads,
-        'recent_templates': recent_templates,
-        'top_categories': top_categories,
-        'user_recent_uploads': user_recent_uploads,
-        'user_recent_downloads': user_recent_downloads,
         'task_stats': task_stats,
     }
-    return render(request, 'staff/dashboard.html', context)
\ No newline at end of file
+    return render(request, 'staff/dashboard.html', context)
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def dashboard_widget(request, name):
+    """Render one dashboard widget, served from its own cache"""
+    widget = WIDGETS.get(name)
+    if widget is None:
+        raise Http404("Unknown widget")
+    return HttpResponse(widget.render(request))
+
+
+def id_param(request, name):
+    """An id from the query string, or None if missing or not a number"""
+    value = request.GET.get(name, '')
+    return value if value.isdigit() else None
+
+
+def chart_range(request):
+    """First and last day for a chart from the ?days= parameter"""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    end = timezone.localdate()
+    return [end - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def download_chart(request):
+    """Downloads per day, optionally for one category or template, from the rollups"""
+    days = chart_range(request)
+    series = rollups.download_series(
+        days[0], days[-1],
+        category=id_param(request, 'category'),
+        template=id_param(request, 'template'),
+    )
+    return JsonResponse({
+        'labels': [day.isoformat() for day in days],
+        'datasets': [
+            {'label': 'Downloads', 'data': [series.get(day, 0) for day in days]},
+        ],
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def task_chart(request):
+    """Tasks created and completed per day, optionally for one service, from the rollups"""
+    days = chart_range(request)
+    series = rollups.task_series(days[0], days[-1], category=id_param(request, 'category'))
+    return JsonResponse({
+        'labels': [day.isoformat() for day in days],
+        'datasets': [
+            {'label': 'Created', 'data': [series.get(day, (0, 0))[0] for day in days]},
+            {'label': 'Completed', 'data': [series.get(day, (0, 0))[1] for day in days]},
+        ],
+    })
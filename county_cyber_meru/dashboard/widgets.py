@@ -0,0 +1,122 @@
+"""
+Lazily loaded dashboard widgets.
+
+The dashboard page only renders the counters; every list on it is a
+widget fetched from its own endpoint after the first paint. Each widget
+has its own TTL cache. A cached render stays usable for one extra TTL
+after it goes stale: the first request to notice takes a short lock and
+re-renders while everyone else keeps getting the stale copy, so an
+expired widget doesn't trigger a burst of identical queries.
+
+The lock is best-effort. It is a cache.add(), which is atomic within a
+process, but the file-based cache in settings checks and writes in two
+steps. So two processes can now and then both take the lock and render
+the same widget; the result is only a duplicate render, never a wrong
+one. A cache with an atomic add (Redis, Memcached) closes the gap.
+"""
+import time
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from task_manager.models import Task
+from template_manager.models import Category, TemplateDocument, TemplateDownload
+
+LOCK_TIMEOUT = 30  # seconds a render may hold the refresh lock
+WAIT_FOR_FIRST_RENDER = 2  # seconds to wait for another request's first render
+
+
+class Widget:
+    def __init__(self, name, template, loader, ttl=60, per_user=False):
+        self.name = name
+        self.template = template
+        self.loader = loader
+        self.ttl = ttl
+        self.per_user = per_user
+
+    def cache_key(self, request):
+        if self.per_user:
+            return f'dashboard:widget:{self.name}:{request.user.pk}'
+        return f'dashboard:widget:{self.name}'
+
+    def render_fresh(self, request):
+        return render_to_string(self.template, self.loader(request), request=request)
+
+    def render(self, request):
+        key = self.cache_key(request)
+        lock_key = f'{key}:lock'
+        cached = cache.get(key)
+        if cached is not None:
+            html, fresh_until = cached
+            if time.time() < fresh_until or not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                return html
+        elif not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Another request is rendering this widget for the first time
+            deadline = time.time() + WAIT_FOR_FIRST_RENDER
+            while time.time() < deadline:
+                time.sleep(0.1)
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached[0]
+            return self.render_fresh(request)
+
+        try:
+            html = self.render_fresh(request)
+            cache.set(key, (html, time.time() + self.ttl), self.ttl * 2)
+            return html
+        finally:
+            cache.delete(lock_key)
+
+
+WIDGETS = {}
+
+
+def widget(name, template, ttl=60, per_user=False):
+    """Register a context loader as a dashboard widget"""
+    def register(loader):
+        WIDGETS[name] = Widget(name, template, loader, ttl=ttl, per_user=per_user)
+        return loader
+    return register
+
+
+@widget('recent-templates', 'staff/widgets/recent_templates.html', ttl=60)
+def recent_templates(request):
+    return {
+        'recent_templates': TemplateDocument.objects.filter(is_active=True)
+        .select_related('uploaded_by').order_by('-uploaded_at')[:5],
+    }
+
+
+@widget('user-uploads', 'staff/widgets/user_uploads.html', ttl=120, per_user=True)
+def user_uploads(request):
+    return {
+        'user_recent_uploads': TemplateDocument.objects.filter(
+            uploaded_by=request.user,
+            is_active=True
+        ).order_by('-uploaded_at')[:3],
+    }
+
+
+@widget('user-downloads', 'staff/widgets/user_downloads.html', ttl=120, per_user=True)
+def user_downloads(request):
+    return {
+        'user_recent_downloads': TemplateDownload.objects.filter(
+            downloaded_by=request.user
+        ).select_related('template').order_by('-downloaded_at')[:3],
+    }
+
+
+@widget('top-categories', 'staff/widgets/top_categories.html', ttl=600)
+def top_categories(request):
+    return {
+        'top_categories': Category.objects.filter(
+            template_count__gt=0, is_active=True
+        ).order_by('-template_count')[:5],
+    }
+
+
+@widget('recent-tasks', 'staff/widgets/recent_tasks.html', ttl=30)
+def recent_tasks(request):
+    return {
+        'recent_tasks': Task.objects.select_related('category').order_by('-created_at')[:5],
+    }
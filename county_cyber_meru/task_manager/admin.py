@@ -1,8 +1,28 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
+from django.db.models import (
+    BooleanField, Case, Count, DurationField, ExpressionWrapper, F, IntegerField,
+    OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce, Now
 from .models import ServiceCategory, TaskCategory, Task, TaskUpdate, TaskAttachment
+from . import bulk, catalog, receipts
+from .exports import export_tasks_csv, export_tasks_xlsx
+from categories import registry
+from core.admin_tools import HighVolumeAdminMixin, recent_date_filter
+
+# queryset.update() bypasses the count signal handlers, so bulk actions
+# recount the affected categories afterwards
+def update_task_categories(queryset, **values):
+    """Bulk update task categories and refresh their service category counts"""
+    service_category_ids = set(queryset.values_list('service_category_id', flat=True))
+    updated = queryset.update(**values)
+    ServiceCategory.refresh_counts(service_category_ids)
+    catalog.invalidate()
+    registry.invalidate('services')
+    return updated
 
 # Custom Admin Filters
 class StatusFilter(admin.SimpleListFilter):
@@ -27,6 +47,15 @@ class PriorityFilter(admin.SimpleListFilter):
         if self.value():
             return queryset.filter(priority=self.value())
 
+def overdue_now():
+    """
+    Open and past due at this moment. The stored is_overdue flag, which
+    the filter uses for its index, can lag by up to one sweep_tasks run;
+    the column shows this instead.
+    """
+    return Q(status__in=Task.OPEN_STATUSES, due_date__lt=Now())
+
+
 class OverdueFilter(admin.SimpleListFilter):
     title = 'overdue'
     parameter_name = 'overdue'
@@ -39,15 +68,9 @@ class OverdueFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'yes':
-            return queryset.filter(
-                due_date__lt=timezone.now(),
-                status__in=['pending', 'in_progress']
-            )
+            return queryset.filter(is_overdue=True)
         if self.value() == 'no':
-            return queryset.exclude(
-                due_date__lt=timezone.now(),
-                status__in=['pending', 'in_progress']
-            )
+            return queryset.filter(is_overdue=False)
 
 class ServiceCategoryFilter(admin.SimpleListFilter):
     title = 'service category'
@@ -87,8 +110,8 @@ class TaskAttachmentInline(admin.TabularInline):
 @admin.register(ServiceCategory)
 class ServiceCategoryAdmin(admin.ModelAdmin):
     list_display = [
-        'name', 'icon_display', 'is_active', 'subcategory_count', 
-        'task_count', 'order', 'created_at'
+        'name', 'icon_display', 'is_active', 'active_subcategory_count', 
+        'task_count', 'open_task_count', 'order', 'created_at'
     ]
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
@@ -104,15 +127,6 @@ class ServiceCategoryAdmin(admin.ModelAdmin):
         return "No icon"
     icon_display.short_description = 'Icon'
 
-    def subcategory_count(self, obj):
-        return obj.subcategories.count()
-    subcategory_count.short_description = 'Sub-Services'
-
-    def task_count(self, obj):
-        # Count tasks through subcategories
-        return Task.objects.filter(category__service_category=obj).count()
-    task_count.short_description = 'Total Tasks'
-
     def image_preview(self, obj):
         if obj.image:
             return format_html('<img src="{}" style="max-height: 50px; max-width: 50px;" />', obj.image.url)
@@ -121,17 +135,21 @@ class ServiceCategoryAdmin(admin.ModelAdmin):
 
     def activate_categories(self, request, queryset):
         updated = queryset.update(is_active=True)
+        catalog.invalidate()
+        registry.invalidate('services')
         self.message_user(request, f'{updated} service categories activated.')
     activate_categories.short_description = "Activate selected service categories"
 
     def deactivate_categories(self, request, queryset):
         updated = queryset.update(is_active=False)
+        catalog.invalidate()
+        registry.invalidate('services')
         self.message_user(request, f'{updated} service categories deactivated.')
     deactivate_categories.short_description = "Deactivate selected service categories"
 
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description', 'is_active', 'order')
+            'fields': ('name', 'description', 'is_active', 'order', 'department')
         }),
         ('Visual Design', {
             'fields': ('icon', 'color', 'image', 'cover_image', 'image_preview'),
@@ -145,12 +163,13 @@ class ServiceCategoryAdmin(admin.ModelAdmin):
 class TaskCategoryAdmin(admin.ModelAdmin):
     list_display = [
         'name', 'service_category', 'icon_display', 'is_active', 
-        'price_display', 'estimated_duration', 'task_count', 'created_at'
+        'price_display', 'estimated_duration', 'task_count', 'open_task_count', 'created_at'
     ]
     list_filter = ['is_active', 'service_category', 'created_at']
     search_fields = ['name', 'description', 'service_category__name']
     list_editable = ['is_active', 'estimated_duration']
     list_select_related = ['service_category']
+    filter_horizontal = ['skilled_staff']
     
     actions = ['activate_categories', 'deactivate_categories']
 
@@ -165,10 +184,6 @@ class TaskCategoryAdmin(admin.ModelAdmin):
         return "-"
     price_display.short_description = 'Price'
 
-    def task_count(self, obj):
-        return obj.tasks.count()
-    task_count.short_description = 'Tasks'
-
     def image_preview(self, obj):
         if obj.image:
             return format_html('<img src="{}" style="max-height: 50px; max-width: 50px;" />', obj.image.url)
@@ -181,12 +196,12 @@ class TaskCategoryAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Image Preview'
 
     def activate_categories(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = update_task_categories(queryset, is_active=True)
         self.message_user(request, f'{updated} service categories activated.')
     activate_categories.short_description = "Activate selected categories"
 
     def deactivate_categories(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = update_task_categories(queryset, is_active=False)
         self.message_user(request, f'{updated} service categories deactivated.')
     deactivate_categories.short_description = "Deactivate selected categories"
 
@@ -197,6 +212,10 @@ class TaskCategoryAdmin(admin.ModelAdmin):
         ('Service Details', {
             'fields': ('price', 'estimated_duration', 'template_link')
         }),
+        ('Assignment', {
+            'fields': ('skilled_staff',),
+            'classes': ('collapse',)
+        }),
         ('Visual Design', {
             'fields': ('icon', 'image', 'image_preview'),
             'classes': ('collapse',)
@@ -211,7 +230,7 @@ class TaskAdmin(admin.ModelAdmin):
         'id', 'title', 'customer_name', 'service_category', 'category', 
         'status', 'priority', 'assigned_to',
         'price_display', 'due_date_display', 'is_overdue_display',
-        'created_at', 'days_open'
+        'created_at', 'days_open', 'update_count', 'attachment_count'
     ]
     list_filter = [
         StatusFilter, PriorityFilter, OverdueFilter, ServiceCategoryFilter,
@@ -231,7 +250,9 @@ class TaskAdmin(admin.ModelAdmin):
     inlines = [TaskUpdateInline, TaskAttachmentInline]
     actions = [
         'mark_as_completed', 'mark_as_in_progress', 
-        'assign_to_me', 'calculate_prices'
+        'assign_to_me', 'calculate_prices',
+        export_tasks_csv, export_tasks_xlsx,
+        'download_receipts', 'download_invoices',
     ]
 
     def service_category(self, obj):
@@ -292,74 +313,153 @@ class TaskAdmin(admin.ModelAdmin):
     due_date_display.short_description = 'Due Date'
 
     def is_overdue_display(self, obj):
-        if obj.is_overdue:
+        if getattr(obj, 'overdue_now', obj.is_overdue):
             return format_html(
                 '<span style="color: red; font-weight: bold;">⚠ OVERDUE</span>'
             )
         return "-"
     is_overdue_display.short_description = 'Overdue'
+    is_overdue_display.admin_order_field = 'overdue_now'
 
     def days_open(self, obj):
+        days = obj.open_for.days
         if obj.completed_at:
-            days = (obj.completed_at - obj.created_at).days
             return f"{days}d"
-        else:
-            days = (timezone.now() - obj.created_at).days
-            return f"{days}d (open)"
+        return f"{days}d (open)"
     days_open.short_description = 'Days'
+    days_open.admin_order_field = 'open_for'
 
     def duration_display(self, obj):
-        if obj.duration:
-            total_seconds = int(obj.duration.total_seconds())
+        duration = getattr(obj, 'duration_value', obj.duration)
+        if duration:
+            total_seconds = int(duration.total_seconds())
             days, remainder = divmod(total_seconds, 86400)
             hours, remainder = divmod(remainder, 3600)
             minutes, seconds = divmod(remainder, 60)
             return f"{days}d {hours}h {minutes}m"
         return "Not completed"
     duration_display.short_description = 'Duration'
+    duration_display.admin_order_field = 'duration_value'
+
+    def update_count(self, obj):
+        return obj.num_updates
+    update_count.short_description = 'Updates'
+    update_count.admin_order_field = 'num_updates'
+
+    def attachment_count(self, obj):
+        return obj.num_attachments
+    attachment_count.short_description = 'Files'
+    attachment_count.admin_order_field = 'num_attachments'
 
     def task_updates_link(self, obj):
-        count = obj.updates.count()
         url = reverse('admin:task_manager_taskupdate_changelist') + f'?task__id__exact={obj.id}'
-        return format_html('<a href="{}">{} Updates</a>', url, count)
+        return format_html('<a href="{}">{} Updates</a>', url, obj.num_updates)
     task_updates_link.short_description = 'Updates'
 
     # Admin Actions
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status='completed', completed_at=timezone.now())
+        updated = bulk.transition(
+            queryset.exclude(status='completed'), request.user, "Task marked as completed",
+            status='completed', completed_at=timezone.now()
+        )
         self.message_user(request, f'{updated} tasks marked as completed.')
     mark_as_completed.short_description = "Mark selected tasks as completed"
 
     def mark_as_in_progress(self, request, queryset):
-        updated = queryset.update(status='in_progress')
+        updated = bulk.transition(
+            queryset.exclude(status='in_progress'), request.user, "Task marked as in progress",
+            status='in_progress', completed_at=None
+        )
         self.message_user(request, f'{updated} tasks marked as in progress.')
     mark_as_in_progress.short_description = "Mark selected tasks as in progress"
 
     def assign_to_me(self, request, queryset):
-        updated = queryset.update(assigned_to=request.user, status='in_progress')
+        name = request.user.get_full_name() or request.user.username
+        updated = bulk.transition(
+            queryset, request.user, f"Task assigned to {name} ({request.user.get_rank_display()})",
+            assigned_to=request.user, status='in_progress', completed_at=None
+        )
         self.message_user(request, f'{updated} tasks assigned to you.')
     assign_to_me.short_description = "Assign selected tasks to me"
 
     def calculate_prices(self, request, queryset):
-        # Use category price if available, otherwise calculate
-        for task in queryset.filter(price__isnull=True):
-            if task.category.price:
-                task.price = task.category.price
-            else:
-                # Fallback pricing logic
-                base_price = 500  # Base price in KSh
-                if task.priority == 'high':
-                    base_price *= 1.5
-                elif task.priority == 'urgent':
-                    base_price *= 2
-                task.price = base_price
-            task.save()
-        self.message_user(request, f'Prices calculated for {queryset.count()} tasks.')
+        # Category price if available, otherwise priced by priority
+        updated = bulk.calculate_prices(queryset)
+        self.message_user(request, f'Prices calculated for {updated} tasks.')
     calculate_prices.short_description = "Calculate prices for selected tasks"
 
+    def download_documents(self, request, queryset, kind):
+        documents = receipts.build_documents(receipts.completed_tasks(queryset.values('pk')), kind)
+        if not documents:
+            self.message_user(request, 'None of the selected tasks are completed.', level=messages.WARNING)
+            return None
+        return receipts.receipts_zip_response(documents, filename=f'{kind}s-{timezone.localdate():%Y%m%d}.zip')
+
+    def download_receipts(self, request, queryset):
+        return self.download_documents(request, queryset, 'receipt')
+    download_receipts.short_description = "Download receipts for selected completed tasks"
+
+    def download_invoices(self, request, queryset):
+        return self.download_documents(request, queryset, 'invoice')
+    download_invoices.short_description = "Download invoices for selected completed tasks"
+
+    def save_model(self, request, obj, form, change):
+        if change and request.resolver_match.url_name == 'task_manager_task_changelist':
+            # list_editable rows: write only the edited columns and the ones save() derives
+            obj.save(update_fields=[*form.changed_data, 'completed_at', 'is_overdue', 'price', 'updated_at'])
+            values = {
+                'status': obj.get_status_display(),
+                'priority': obj.get_priority_display(),
+                'assigned_to': obj.assigned_staff_name,
+            }
+            message = "; ".join(
+                f"{Task._meta.get_field(name).verbose_name.capitalize()} set to {values[name]}"
+                for name in form.changed_data if name in values
+            )
+            if message:
+                TaskUpdate.objects.create(task=obj, user=request.user, message=message)
+            return
+        super().save_model(request, obj, form, change)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'assigned_to' and field is not None:
+            # list_editable builds one form per row; share the staff choices
+            # instead of querying them again for every row
+            if not hasattr(request, '_assigned_to_choices'):
+                request._assigned_to_choices = list(field.choices)
+            field.choices = request._assigned_to_choices
+        return field
+
     def get_queryset(self, request):
+        # Computed columns are annotated so the changelist can sort on them
+        # and renders a page in a single query
+        def related_count(model):
+            return Coalesce(
+                Subquery(
+                    model.objects.filter(task=OuterRef('pk')).order_by()
+                    .values('task').annotate(count=Count('pk')).values('count'),
+                    output_field=IntegerField(),
+                ),
+                0,
+            )
+
         return super().get_queryset(request).select_related(
             'category', 'category__service_category', 'assigned_to'
+        ).annotate(
+            duration_value=ExpressionWrapper(
+                F('completed_at') - F('created_at'), output_field=DurationField()
+            ),
+            open_for=ExpressionWrapper(
+                Coalesce(F('completed_at'), Now()) - F('created_at'), output_field=DurationField()
+            ),
+            overdue_now=Case(
+                When(overdue_now(), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            num_updates=related_count(TaskUpdate),
+            num_attachments=related_count(TaskAttachment),
         )
 
     fieldsets = (
@@ -385,15 +485,16 @@ class TaskAdmin(admin.ModelAdmin):
 
 # ... (TaskUpdateAdmin and TaskAttachmentAdmin remain the same)
 @admin.register(TaskUpdate)
-class TaskUpdateAdmin(admin.ModelAdmin):
+class TaskUpdateAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
     list_display = ['task_link', 'user', 'message_preview', 'created_at']
-    list_filter = ['created_at', 'user']
+    list_filter = [recent_date_filter('created_at'), 'user']
     search_fields = ['task__title', 'message', 'user__username']
     readonly_fields = ['created_at']
-    date_hierarchy = 'created_at'
+    list_select_related = ['task', 'user']
+    raw_id_fields = ['task', 'user']
 
     def task_link(self, obj):
-        url = reverse('admin:task_manager_task_change', args=[obj.task.id])
+        url = reverse('admin:task_manager_task_change', args=[obj.task_id])
         return format_html('<a href="{}">{}</a>', url, obj.task.title)
     task_link.short_description = 'Task'
 
@@ -0,0 +1,192 @@
+"""
+Post-upload processing of task attachments.
+
+Customers attach phone photos and scans that are often far larger than
+anything the shop prints. Saving an attachment only stores the upload;
+once the row is committed a background worker (core.background) hashes
+it unless core.uploads already did, re-encodes images that are bigger
+than an A4 page at print resolution, and renders the thumbnail shown on
+the staff task detail page. Results are written with queryset.update(), so they
+don't re-trigger the save signals.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from core import background
+from .models import Task, TaskAttachment
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_SIDE = 3508  # long side of A4 at 300 dpi; more adds nothing to a print
+REENCODE_MIN_BYTES = 2 * 1024 * 1024  # smaller images are kept as uploaded
+REENCODE_FORMATS = {'JPEG', 'MPO', 'PNG', 'WEBP', 'BMP', 'TIFF'}  # not GIF: keep animations
+JPEG_QUALITY = 90
+THUMBNAIL_SIZE = (320, 320)
+
+
+@contextmanager
+def local_file(field_file, sha256=''):
+    """
+    (path, sha256) of field_file on local disk, reading it at most once.
+    A known sha256 (hashed during upload by core.uploads) is trusted.
+    """
+    digest = hashlib.sha256()
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path and sha256:
+        yield path, sha256
+        return
+    if path:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        yield path, digest.hexdigest()
+        return
+    # Remote storage: stream to a temp file while hashing
+    suffix = os.path.splitext(field_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with field_file.open('rb'):
+            for chunk in field_file.chunks(CHUNK_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+        tmp.flush()
+        yield tmp.name, digest.hexdigest()
+
+
+def open_image(path):
+    """PIL image for path, or None if it isn't one Pillow can read"""
+    try:
+        return Image.open(path)
+    except Exception:
+        return None
+
+
+def shrink_image(image, size):
+    """
+    Re-encoded (bytes, extension) for an oversized image, or None when the
+    original should be kept.
+    """
+    if image.format not in REENCODE_FORMATS:
+        return None
+    if size < REENCODE_MIN_BYTES and max(image.size) <= MAX_IMAGE_SIDE:
+        return None
+    # Let the JPEG decoder scale down while decoding
+    image.draft('RGB', (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    resized = ImageOps.exif_transpose(image)
+    resized.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    if image.format == 'PNG' and resized.mode in ('RGBA', 'LA', 'P'):
+        resized.save(buffer, 'PNG', optimize=True)
+        extension = '.png'
+    else:
+        resized.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        extension = '.jpg'
+    if buffer.tell() >= size:
+        return None
+    return buffer.getvalue(), extension
+
+
+def make_thumbnail(image):
+    """JPEG thumbnail bytes for image"""
+    image.draft('RGB', THUMBNAIL_SIZE)
+    thumbnail = ImageOps.exif_transpose(image)
+    thumbnail.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    thumbnail.convert('RGB').save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def process(model, pk, file_field, sha256_field, thumbnail_field):
+    """Hash, shrink and thumbnail the file in model(pk).file_field"""
+    instance = model.objects.filter(pk=pk).only('pk', file_field, sha256_field, thumbnail_field).first()
+    if instance is None or not getattr(instance, file_field):
+        return
+    field_file = getattr(instance, file_field)
+    thumbnail_file = getattr(instance, thumbnail_field)
+    original_name = field_file.name
+    old_thumbnail = thumbnail_file.name
+    stem = os.path.splitext(os.path.basename(original_name))[0]
+    written = []
+
+    with local_file(field_file, getattr(instance, sha256_field)) as (path, sha256):
+        values = {sha256_field: sha256}
+        image = open_image(path)
+        if image is not None:
+            try:
+                shrunk = shrink_image(image, os.path.getsize(path))
+                if shrunk:
+                    data, extension = shrunk
+                    field_file.save(stem + extension, ContentFile(data), save=False)
+                    written.append(field_file.name)
+                    values[file_field] = field_file.name
+                    # The stored file is now the re-encoded one
+                    values[sha256_field] = hashlib.sha256(data).hexdigest()
+                    image.close()
+                    image = Image.open(BytesIO(data))
+                thumbnail_file.save(f'{stem}.jpg', ContentFile(make_thumbnail(image)), save=False)
+                written.append(thumbnail_file.name)
+                values[thumbnail_field] = thumbnail_file.name
+            except Exception:
+                logger.exception('Could not process image %s', original_name)
+            finally:
+                image.close()
+
+    # Only if the file wasn't replaced while we were working on it
+    updated = model.objects.filter(pk=pk, **{file_field: original_name}).update(**values)
+    storage = field_file.storage
+    if not updated:
+        for name in written:
+            storage.delete(name)
+        return
+    if file_field in values:
+        storage.delete(original_name)
+    if old_thumbnail and thumbnail_field in values and old_thumbnail != values[thumbnail_field]:
+        storage.delete(old_thumbnail)
+
+
+def process_task_attachment(task_id):
+    process(Task, task_id, 'attachment', 'attachment_sha256', 'attachment_thumbnail')
+
+
+def process_extra_attachment(attachment_id):
+    process(TaskAttachment, attachment_id, 'file', 'sha256', 'thumbnail')
+
+
+def file_changed(instance, field_name, created, update_fields):
+    if update_fields is not None and field_name not in update_fields:
+        return False
+    if not getattr(instance, field_name):
+        return False
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        instance._loaded_values = loaded = {}
+    previous = loaded.get(field_name)
+    current = getattr(instance, field_name).name
+    # The saved file is the baseline for the next save of this instance
+    loaded[field_name] = current
+    return created or previous != current
+
+
+@receiver(post_save, sender=Task)
+def process_task_attachment_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw and file_changed(instance, 'attachment', created, update_fields):
+        background.defer(process_task_attachment, instance.pk)
+
+
+@receiver(post_save, sender=TaskAttachment)
+def process_extra_attachment_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw and file_changed(instance, 'file', created, update_fields):
+        background.defer(process_extra_attachment, instance.pk)
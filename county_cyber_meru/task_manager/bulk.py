@@ -0,0 +1,98 @@
+"""
+Set-based bulk operations on tasks, used by the admin actions.
+
+Each operation costs a fixed handful of statements however many tasks are
+selected: one UPDATE, one bulk_create of TaskUpdate history, and the
+counter maintenance that queryset.update() would otherwise skip (dashboard
+statistics and the denormalized category counts).
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Now, NullIf
+from django.utils import timezone
+
+from dashboard import stats
+from .models import ServiceCategory, Task, TaskCategory, TaskUpdate
+
+# Fallback pricing for tasks whose service has no standard price (KSh)
+BASE_PRICE = Decimal('500')
+PRIORITY_PRICE_FACTORS = {
+    'high': Decimal('1.5'),
+    'urgent': Decimal('2'),
+}
+
+
+def refresh_category_counts(category_ids):
+    """Recount the task categories and their service categories"""
+    TaskCategory.refresh_counts(category_ids)
+    ServiceCategory.refresh_counts(
+        TaskCategory.objects.filter(pk__in=category_ids).values('service_category_id')
+    )
+
+
+def transition(queryset, user, message, **values):
+    """
+    Update every task in queryset to values, recording message as a
+    TaskUpdate by user on each. Returns the number of tasks updated.
+    """
+    if 'status' in values:
+        # As Task.save() would: only open tasks past their due date are overdue
+        values.setdefault('is_overdue', Case(
+            When(due_date__lt=Now(), then=Value(True)), default=Value(False), output_field=BooleanField(),
+        ) if values['status'] in Task.OPEN_STATUSES else False)
+    fields = ('id', 'category_id') + stats.TASK_FIELDS
+
+    with transaction.atomic():
+        before = {
+            row['id']: row
+            for row in Task.objects.select_for_update().filter(pk__in=queryset.values('pk')).values(*fields)
+        }
+        if not before:
+            return 0
+        tasks = Task.objects.filter(pk__in=before)
+        tasks.update(updated_at=timezone.now(), **values)
+
+        deltas = Counter()
+        for row in tasks.values(*fields):
+            deltas.update(stats.difference(
+                stats.task_contribution(before[row['id']]), stats.task_contribution(row)
+            ))
+        # queryset.update() bypasses the signal handlers
+        stats.apply_deltas(deltas)
+        refresh_category_counts({row['category_id'] for row in before.values()})
+
+        TaskUpdate.objects.bulk_create(
+            TaskUpdate(task_id=task_id, user=user, message=message) for task_id in before
+        )
+    return len(before)
+
+
+def fallback_price_expression():
+    """SQL equivalent of the fallback pricing: BASE_PRICE scaled by priority"""
+    return Case(
+        *[
+            When(priority=priority, then=Value(BASE_PRICE * factor))
+            for priority, factor in PRIORITY_PRICE_FACTORS.items()
+        ],
+        default=Value(BASE_PRICE),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def calculate_prices(queryset):
+    """Price unpriced tasks from their service, else by priority, in one UPDATE"""
+    category_price = Subquery(
+        TaskCategory.objects.filter(pk=OuterRef('category_id')).values('price')[:1]
+    )
+    return queryset.filter(price__isnull=True).update(
+        # A service priced at 0 counts as unpriced, as in the per-task fallback
+        price=Coalesce(
+            NullIf(category_price, Value(0)),
+            fallback_price_expression(),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        updated_at=timezone.now(),
+    )
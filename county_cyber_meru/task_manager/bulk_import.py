@@ -0,0 +1,367 @@
+"""
+Bulk import of walk-in tasks from CSV or XLSX sheets.
+
+Rows are read one at a time (csv.reader, or lxml iterparse over the
+worksheet XML for XLSX, clearing each row once read) and validated
+against lookups loaded once up front: service names to id and price,
+staff usernames to id. Valid rows become unsaved Task objects, written
+with bulk_create in batches inside one transaction. Task.save() is
+bypassed, so the fields it derives (price from the service, completed_at,
+is_overdue) are filled in here and the counters its signals maintain are
+adjusted per batch.
+
+By default a sheet with any invalid row imports nothing; with
+skip_invalid=True the valid rows are kept.
+"""
+import csv
+import io
+import posixpath
+import zipfile
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from lxml import etree
+
+from dashboard import stats
+from .models import ServiceCategory, Task, TaskCategory, priority_for_deadline
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 500
+
+# Accepted column headings for each Task field
+COLUMNS = {
+    'title': ('title', 'job', 'task'),
+    'description': ('description', 'details'),
+    'category': ('category', 'service'),
+    'customer_name': ('customer_name', 'customer', 'name'),
+    'customer_email': ('customer_email', 'email'),
+    'customer_phone': ('customer_phone', 'phone'),
+    'status': ('status',),
+    'priority': ('priority',),
+    'due_date': ('due_date', 'deadline', 'due'),
+    'price': ('price', 'amount'),
+    'assigned_to': ('assigned_to', 'staff'),
+    'staff_notes': ('staff_notes', 'notes'),
+}
+REQUIRED = ('title', 'category', 'customer_name', 'customer_email')
+DATE_FORMATS = ('%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+class SheetError(Exception):
+    """The file can't be read as a task sheet at all"""
+
+
+def csv_rows(file):
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    yield from reader
+
+
+def column_index(reference):
+    """0-based column of a cell reference like 'AB12'"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def first_sheet_path(archive):
+    try:
+        workbook = etree.fromstring(archive.read('xl/workbook.xml'))
+        relationship_id = workbook.find(f'{NS}sheets/{NS}sheet').get(f'{REL_NS}id')
+        relationships = etree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        for relationship in relationships:
+            if relationship.get('Id') == relationship_id:
+                target = relationship.get('Target')
+                if target.startswith('/'):
+                    return target.lstrip('/')
+                return posixpath.normpath(posixpath.join('xl', target))
+    except (KeyError, AttributeError, etree.XMLSyntaxError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def shared_strings(archive):
+    try:
+        source = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with source:
+        for _, item in etree.iterparse(source, tag=f'{NS}si'):
+            strings.append(''.join(item.itertext(f'{NS}t')))
+            item.clear()
+    return strings
+
+
+def xlsx_rows(file):
+    """Rows of the first worksheet as lists of strings"""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise SheetError('Not a valid XLSX file.')
+    with archive:
+        strings = shared_strings(archive)
+        try:
+            sheet = archive.open(first_sheet_path(archive))
+        except KeyError:
+            raise SheetError('The workbook has no worksheet.')
+        with sheet:
+            for _, row in etree.iterparse(sheet, tag=f'{NS}row'):
+                values = []
+                for cell in row.iterchildren(f'{NS}c'):
+                    index = column_index(cell.get('r', '')) if cell.get('r') else len(values)
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(cell.itertext(f'{NS}t'))
+                    else:
+                        value = cell.findtext(f'{NS}v') or ''
+                        if kind == 's' and value:
+                            value = strings[int(value)]
+                    values.extend([''] * (index - len(values)))
+                    values.append(value)
+                yield values
+                # Free the parsed row and everything before it
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
+
+
+def checked(rows):
+    """rows, with the ways a damaged or mis-saved file fails raised as SheetError"""
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        raise SheetError('The file is not UTF-8 text. Save it from Excel as "CSV UTF-8" or as XLSX.')
+    except csv.Error as error:
+        raise SheetError(f'The CSV file is malformed: {error}.')
+    except (etree.XMLSyntaxError, zipfile.BadZipFile, zlib.error, IndexError, ValueError):
+        # Broken worksheet XML, a corrupt zip entry or a bad shared string index
+        raise SheetError('The workbook is damaged and could not be read.')
+
+
+def read_rows(file, name):
+    """(row number, {field: value}) for each data row of a CSV or XLSX file"""
+    rows = checked(xlsx_rows(file) if name.lower().endswith('.xlsx') else csv_rows(file))
+    header = next(rows, None)
+    if not header:
+        raise SheetError('The file is empty.')
+    aliases = {alias: field for field, names in COLUMNS.items() for alias in names}
+    positions = {}
+    for position, heading in enumerate(header):
+        field = aliases.get('_'.join(str(heading).strip().lower().split()))
+        if field and field not in positions:
+            positions[field] = position
+    missing = [field for field in REQUIRED if field not in positions]
+    if missing:
+        raise SheetError(f"Missing column(s): {', '.join(missing)}.")
+    for number, values in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in values):
+            continue
+        yield number, {
+            field: str(values[position]).strip() if position < len(values) else ''
+            for field, position in positions.items()
+        }
+
+
+def parse_due_date(value):
+    if not value:
+        return None
+    try:
+        # Excel stores dates as days since 1899-12-30
+        moment = EXCEL_EPOCH + timedelta(days=float(value))
+    except (ValueError, OverflowError):
+        moment = None
+        for parse in (parse_datetime, parse_date, *DATE_FORMATS):
+            try:
+                if isinstance(parse, str):
+                    moment = datetime.strptime(value, parse)
+                else:
+                    moment = parse(value)
+            except ValueError:
+                continue
+            if moment is not None:
+                break
+    if moment is None:
+        raise ValueError(f'"{value}" is not a date')
+    if not isinstance(moment, datetime):
+        moment = datetime(moment.year, moment.month, moment.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Lookups:
+    """Everything row validation needs from the database, loaded once"""
+
+    def __init__(self):
+        self.services = {}
+        ambiguous = set()
+        for service in TaskCategory.objects.filter(is_active=True).values(
+            'id', 'name', 'price', 'service_category__name'
+        ):
+            entry = (service['id'], service['price'])
+            full_name = f"{service['service_category__name']} - {service['name']}".casefold()
+            self.services[full_name] = entry
+            short_name = service['name'].casefold()
+            if short_name in self.services and short_name not in ambiguous:
+                ambiguous.add(short_name)
+            self.services.setdefault(short_name, entry)
+        # "Printing" under two service categories must be given in full
+        for name in ambiguous:
+            self.services[name] = None
+
+        self.staff = {}
+        for staff_id, username, email in get_user_model().objects.filter(
+            is_staff=True, is_active=True
+        ).values_list('id', 'username', 'email'):
+            self.staff[username.casefold()] = staff_id
+            if email:
+                self.staff.setdefault(email.casefold(), staff_id)
+
+
+def build_task(values, lookups, now):
+    """(Task, None) for a valid row, or (None, [error messages])"""
+    errors = []
+    for field in REQUIRED:
+        if not values.get(field):
+            errors.append(f'{field.replace("_", " ")} is required')
+    if errors:
+        return None, errors
+
+    service = lookups.services.get(values['category'].casefold(), False)
+    if service is None:
+        errors.append(f'service "{values["category"]}" is ambiguous; use "Category - Service"')
+    elif service is False:
+        errors.append(f'unknown service "{values["category"]}"')
+    try:
+        validate_email(values['customer_email'])
+    except ValidationError:
+        errors.append(f'"{values["customer_email"]}" is not a valid email address')
+    for field, limit in (('title', 200), ('customer_name', 100), ('customer_phone', 20)):
+        if len(values.get(field, '')) > limit:
+            errors.append(f'{field.replace("_", " ")} is longer than {limit} characters')
+
+    status = values.get('status', '').lower().replace(' ', '_') or 'pending'
+    if status not in dict(Task.STATUS_CHOICES):
+        errors.append(f'unknown status "{values["status"]}"')
+    priority = values.get('priority', '').lower()
+    if priority and priority not in dict(Task.PRIORITY_CHOICES):
+        errors.append(f'unknown priority "{values["priority"]}"')
+    try:
+        due_date = parse_due_date(values.get('due_date'))
+    except ValueError as error:
+        errors.append(str(error))
+        due_date = None
+    price = None
+    if values.get('price'):
+        try:
+            price = Decimal(values['price'].replace(',', '')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            errors.append(f'"{values["price"]}" is not a price')
+    assigned_to_id = None
+    if values.get('assigned_to'):
+        assigned_to_id = lookups.staff.get(values['assigned_to'].casefold())
+        if assigned_to_id is None:
+            errors.append(f'no staff member "{values["assigned_to"]}"')
+    if errors:
+        return None, errors
+
+    category_id, service_price = service
+    return Task(
+        title=values['title'],
+        description=values.get('description', ''),
+        category_id=category_id,
+        customer_name=values['customer_name'],
+        customer_email=values['customer_email'],
+        customer_phone=values.get('customer_phone', ''),
+        status=status,
+        priority=priority or priority_for_deadline(due_date, now),
+        assigned_to_id=assigned_to_id,
+        price=service_price if price is None else price,
+        due_date=due_date,
+        completed_at=now if status == 'completed' else None,
+        is_overdue=bool(due_date and status in Task.OPEN_STATUSES and now > due_date),
+        staff_notes=values.get('staff_notes', ''),
+    ), None
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.valid = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # (row number, message), at most MAX_REPORTED_ERRORS
+
+    def add_error(self, number, messages):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, '; '.join(messages)))
+
+
+def insert(tasks):
+    Task.objects.bulk_create(tasks)
+    # bulk_create bypasses the signal handlers keeping the counters
+    deltas = Counter()
+    for task in tasks:
+        deltas.update(stats.task_contribution({
+            'status': task.status, 'priority': task.priority,
+            'is_overdue': task.is_overdue, 'assigned_to_id': task.assigned_to_id,
+        }))
+    stats.apply_deltas(deltas)
+    return len(tasks)
+
+
+def import_tasks(file, name, skip_invalid=False, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Validate and import the rows of file; returns an ImportResult.
+    Raises SheetError if the file can't be read as a task sheet.
+    """
+    result = ImportResult()
+    lookups = Lookups()
+    now = timezone.now()
+    batch = []
+    categories = set()
+
+    with transaction.atomic():
+        for number, values in read_rows(file, name):
+            result.rows += 1
+            task, errors = build_task(values, lookups, now)
+            if errors:
+                result.add_error(number, errors)
+                continue
+            result.valid += 1
+            if dry_run or (result.error_count and not skip_invalid):
+                # Nothing will be kept; carry on only to report every error
+                continue
+            categories.add(task.category_id)
+            batch.append(task)
+            if len(batch) >= batch_size:
+                result.created += insert(batch)
+                batch = []
+
+        if dry_run or (result.error_count and not skip_invalid):
+            transaction.set_rollback(True)
+            result.created = 0
+            return result
+        if batch:
+            result.created += insert(batch)
+        TaskCategory.refresh_counts(categories)
+        ServiceCategory.refresh_counts(
+            TaskCategory.objects.filter(pk__in=categories).values('service_category_id')
+        )
+    return result
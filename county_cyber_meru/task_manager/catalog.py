@@ -0,0 +1,183 @@
+"""
+Read-only snapshot of the public service catalog.
+
+The public service pages only need the active service categories and
+their active services, with the icon, colour and image each one inherits
+already resolved. get_catalog() loads that once (two queries via
+Prefetch) into small immutable objects and keeps it for the whole
+process. Saving or deleting a ServiceCategory or TaskCategory bumps a
+version key in the Django cache once the change commits; every process
+reloads its snapshot when it sees a new version. That needs a cache all
+processes share (see CACHES in settings).
+
+The file-based cache there has no atomic add(), so processes racing to
+create the first version can briefly disagree on it. The loser then
+reloads once more. A bump is a plain set() of a new random value, so a
+racing bump can overwrite it but never hide the change: both leave a
+version no snapshot was loaded under.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ServiceCategory, TaskCategory
+
+VERSION_KEY = 'task_manager:catalog:version'
+DEFAULT_ICON = 'fas fa-cog'
+DEFAULT_COLOR = '#4e73df'
+
+
+class Frozen:
+    """Base for immutable slot-based records"""
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.id}: {self.name}>'
+
+
+class ServiceEntry(Frozen):
+    """An active TaskCategory with its inherited display values resolved"""
+    __slots__ = (
+        'id', 'name', 'description', 'icon', 'color', 'image_url', 'price',
+        'estimated_duration', 'template_link', 'service_category_id', 'service_category_name',
+    )
+
+
+class ServiceCategoryEntry(Frozen):
+    """An active ServiceCategory and its active services"""
+    __slots__ = (
+        'id', 'name', 'description', 'icon', 'color', 'image_url', 'cover_image_url',
+        'order', 'services',
+    )
+
+    @property
+    def active_subcategory_count(self):
+        return len(self.services)
+
+
+def file_url(field):
+    return field.url if field else None
+
+
+class Catalog:
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.categories = tuple(categories)
+        self._categories = {category.id: category for category in self.categories}
+        self._services = {
+            service.id: service for category in self.categories for service in category.services
+        }
+
+    @classmethod
+    def load(cls, version=None):
+        """Build a snapshot from the database"""
+        queryset = ServiceCategory.objects.filter(is_active=True).order_by('order', 'name').prefetch_related(
+            Prefetch(
+                'subcategories',
+                queryset=TaskCategory.objects.filter(is_active=True).order_by('name'),
+                to_attr='active_services',
+            )
+        )
+        categories = []
+        for category in queryset:
+            category_image = file_url(category.image)
+            services = tuple(
+                ServiceEntry(
+                    id=service.id,
+                    name=service.name,
+                    description=service.description,
+                    icon=service.icon or category.icon or DEFAULT_ICON,
+                    color=category.color or DEFAULT_COLOR,
+                    image_url=file_url(service.image) or category_image,
+                    price=service.price,
+                    estimated_duration=service.estimated_duration,
+                    template_link=service.template_link,
+                    service_category_id=category.id,
+                    service_category_name=category.name,
+                )
+                for service in category.active_services
+            )
+            categories.append(ServiceCategoryEntry(
+                id=category.id,
+                name=category.name,
+                description=category.description,
+                icon=category.icon,
+                color=category.color or DEFAULT_COLOR,
+                image_url=category_image,
+                cover_image_url=file_url(category.cover_image),
+                order=category.order,
+                services=services,
+            ))
+        return cls(categories, version)
+
+    def category(self, category_id):
+        """ServiceCategoryEntry by id, or None if unknown or inactive"""
+        return self._categories.get(_as_int(category_id))
+
+    def service(self, service_id):
+        """ServiceEntry by id, or None if unknown or inactive"""
+        return self._services.get(_as_int(service_id))
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() so concurrent first requests agree on one version
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def get_catalog():
+    """The process-wide catalog snapshot, reloaded when the version changes"""
+    global _catalog
+    version = current_version()
+    snapshot = _catalog
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = Catalog.load(version)
+        return _catalog
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate():
+    """Make every process reload its snapshot on next use, once the current transaction commits"""
+    # Bumped earlier, a request could reload the old rows under the new version and keep them
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+@receiver(post_save, sender=TaskCategory)
+@receiver(post_delete, sender=TaskCategory)
+def invalidate_on_change(sender, **kwargs):
+    invalidate()
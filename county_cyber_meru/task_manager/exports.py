@@ -0,0 +1,26 @@
+"""
+Columns of the task history export (see core.exports).
+"""
+from core.exports import Column, export_action
+from .models import Task
+
+TASK_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Created', 'created_at', width=17),
+    Column('Title', 'title', width=30),
+    Column('Service Category', 'category__service_category__name', width=20),
+    Column('Service', 'category__name', width=20),
+    Column('Customer', 'customer_name', width=20),
+    Column('Email', 'customer_email', width=25),
+    Column('Phone', 'customer_phone', width=14),
+    Column('Status', 'status', dict(Task.STATUS_CHOICES).get),
+    Column('Priority', 'priority', dict(Task.PRIORITY_CHOICES).get),
+    Column('Assigned To', 'assigned_to__username', width=15),
+    Column('Price', 'price'),
+    Column('Due', 'due_date', width=17),
+    Column('Completed', 'completed_at', width=17),
+    Column('Overdue', 'is_overdue', lambda overdue: 'Yes' if overdue else 'No'),
+]
+
+export_tasks_csv = export_action(TASK_COLUMNS, 'tasks', 'csv', 'Tasks')
+export_tasks_xlsx = export_action(TASK_COLUMNS, 'tasks', 'xlsx', 'Tasks')
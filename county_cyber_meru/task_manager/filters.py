@@ -0,0 +1,71 @@
+"""
+Task list filtering shared by the staff task list and its exports.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+
+DATE_RANGES = ('today', 'yesterday', 'this_week', 'last_week', 'this_month', 'last_month')
+
+
+def created_range(period, now=None):
+    """(start, end) of a named period in local time, or None if unknown"""
+    today = timezone.localdate(now)
+    if period == 'today':
+        start, end = today, today + timedelta(days=1)
+    elif period == 'yesterday':
+        start, end = today - timedelta(days=1), today
+    elif period == 'this_week':
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=7)
+    elif period == 'last_week':
+        end = today - timedelta(days=today.weekday())
+        start = end - timedelta(days=7)
+    elif period == 'this_month':
+        start = today.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    elif period == 'last_month':
+        end = today.replace(day=1)
+        start = (end - timedelta(days=1)).replace(day=1)
+    else:
+        return None
+    return tuple(timezone.make_aware(datetime.combine(day, time.min)) for day in (start, end))
+
+
+def filter_tasks(tasks, params, user=None):
+    """Apply the task list's GET parameters (status, priority, assigned, category, date, q)"""
+    status = params.get('status')
+    if status:
+        tasks = tasks.filter(status=status)
+
+    priority = params.get('priority')
+    if priority:
+        tasks = tasks.filter(priority=priority)
+
+    assigned = params.get('assigned')
+    if assigned == 'unassigned':
+        tasks = tasks.filter(assigned_to__isnull=True)
+    elif assigned == 'me' and user is not None:
+        tasks = tasks.filter(assigned_to=user)
+    elif assigned and assigned.isdigit():
+        tasks = tasks.filter(assigned_to_id=assigned)
+
+    category = params.get('category')
+    if category and category.isdigit():
+        tasks = tasks.filter(category_id=category)
+
+    period = created_range(params.get('date'))
+    if period:
+        tasks = tasks.filter(created_at__gte=period[0], created_at__lt=period[1])
+
+    query = params.get('q', '').strip()
+    if query:
+        tasks = tasks.filter(
+            Q(title__icontains=query) | Q(description__icontains=query)
+            | Q(customer_name__icontains=query) | Q(customer_email__icontains=query)
+            | Q(customer_phone__icontains=query) | Q(category__name__icontains=query)
+        )
+    return tasks
@@ -1,8 +1,11 @@
 from django import forms
 from django.contrib.auth import get_user_model
-from .models import Task, TaskCategory, TaskUpdate, TaskAttachment
+from django.conf import settings
+from .models import Task, TaskCategory, TaskUpdate, TaskAttachment, priority_for_deadline, submission_content_hash
+from categories.forms import CachedModelChoiceField
 from datetime import datetime, timedelta
 from django.utils import timezone
+import uuid
 
 # This will automatically get your StaffProfile model
 User = get_user_model()
@@ -19,6 +22,15 @@ class TaskSubmissionForm(forms.ModelForm):
         help_text="Optional: When do you need this completed? We'll adjust urgency based on your deadline."
     )
     
+    category = CachedModelChoiceField(
+        'services',
+        queryset=TaskCategory.objects.filter(is_active=True),
+        empty_label="Select a service",
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    # Idempotency key: resubmitting the same rendered form never creates a second task
+    submission_token = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Task
         fields = [
@@ -38,8 +50,25 @@ class TaskSubmissionForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['category'].queryset = TaskCategory.objects.filter(is_active=True)
-        self.fields['category'].empty_label = "Select a service"
+        if not self.is_bound:
+            self.fields['submission_token'].initial = uuid.uuid4().hex
+    
+    def content_hash(self):
+        return submission_content_hash(
+            self.cleaned_data['customer_email'],
+            self.cleaned_data['title'],
+            self.cleaned_data['description'],
+        )
+    
+    def find_duplicate(self):
+        """The task this submission repeats: same token, or same content within the window"""
+        token = self.cleaned_data.get('submission_token')
+        if token:
+            task = Task.objects.filter(submission_token=token).first()
+            if task:
+                return task
+        since = timezone.now() - timedelta(seconds=settings.TASK_SUBMISSION_DUPLICATE_WINDOW)
+        return Task.objects.filter(content_hash=self.content_hash(), created_at__gte=since).first()
     
     def clean_deadline(self):
         deadline = self.cleaned_data.get('deadline')
@@ -49,21 +78,7 @@ class TaskSubmissionForm(forms.ModelForm):
     
     def calculate_priority_from_deadline(self, deadline):
         """Calculate priority based on deadline"""
-        if not deadline:
-            return 'medium'
-            
-        now = timezone.now()
-        time_until_due = deadline - now
-        hours_until_due = time_until_due.total_seconds() / 3600
-        
-        if hours_until_due <= 24:
-            return 'urgent'
-        elif hours_until_due <= 72:
-            return 'high'
-        elif hours_until_due <= 168:
-            return 'medium'
-        else:
-            return 'low'
+        return priority_for_deadline(deadline)
     
     def save(self, commit=True):
         task = super().save(commit=False)
@@ -76,6 +91,9 @@ class TaskSubmissionForm(forms.ModelForm):
         else:
             task.priority = 'medium'  # Default priority
         
+        task.submission_token = self.cleaned_data.get('submission_token') or None
+        task.content_hash = self.content_hash()
+        
         if commit:
             task.save()
         return task
@@ -83,6 +101,11 @@ class TaskSubmissionForm(forms.ModelForm):
 
 class TaskStaffForm(forms.ModelForm):
     """Form for staff to manage tasks"""
+    # Limit assigned_to to staff users only - now using your StaffProfile
+    assigned_to = CachedModelChoiceField(
+        'staff', queryset=User.objects.filter(is_staff=True), required=False,
+    )
+
     class Meta:
         model = Task
         fields = [
@@ -97,15 +120,10 @@ class TaskStaffForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Limit assigned_to to staff users only - now using your StaffProfile
-        self.fields['assigned_to'].queryset = User.objects.filter(is_staff=True)
-        
         # Add Bootstrap classes
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
-        
-        # Make the assigned_to field display better names
-        self.fields['assigned_to'].label_from_instance = lambda obj: f"{obj.get_full_name() or obj.username} ({obj.get_rank_display()})"
+
 
 class TaskUpdateForm(forms.ModelForm):
     """Form for adding updates/comments to tasks"""
@@ -131,4 +149,17 @@ class TaskAttachmentForm(forms.ModelForm):
                 'class': 'form-control'
             }),
             'file': forms.FileInput(attrs={'class': 'form-control'})
-        }
\ No newline at end of file
+        }
+
+class TaskImportForm(forms.Form):
+    """Upload of a CSV/XLSX sheet of walk-in tasks"""
+    file = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+        help_text="CSV or Excel (.xlsx) with a header row: title, category, customer_name, customer_email, "
+                  "and optionally description, customer_phone, status, priority, due_date, price, assigned_to, staff_notes"
+    )
+    skip_invalid = forms.BooleanField(
+        required=False,
+        label="Import the valid rows even if some rows have errors",
+    )
+    dry_run = forms.BooleanField(required=False, label="Only check the file, don't import anything")
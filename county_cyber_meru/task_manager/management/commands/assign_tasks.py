@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from task_manager.scheduling import StaffSlot, TaskScheduler, TaskTicket, get_strategy
+
+
+class Command(BaseCommand):
+    help = 'Assign pending tasks to staff, once or in a loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', help='Strategy name or dotted path (default: TASK_ASSIGNMENT_STRATEGY)')
+        parser.add_argument('--limit', type=int, help='Maximum number of tasks to assign per run')
+        parser.add_argument('--loop', action='store_true', help='Keep running and assign new tasks as they arrive')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between runs in loop mode')
+        parser.add_argument(
+            '--benchmark', type=int, metavar='N',
+            help='Time the strategy on N synthetic tasks without touching the database'
+        )
+        parser.add_argument('--staff', type=int, default=25, help='Synthetic staff pool size for --benchmark')
+
+    def handle(self, *args, **options):
+        strategy = get_strategy(options['strategy'])
+
+        if options['benchmark']:
+            self.benchmark(strategy, options['benchmark'], options['staff'])
+            return
+
+        scheduler = TaskScheduler(strategy=strategy)
+        while True:
+            plan = scheduler.assign_pending(limit=options['limit'])
+            assigned = sum(len(task_ids) for task_ids in plan.values())
+            if assigned:
+                for staff_id, task_ids in plan.items():
+                    self.stdout.write(f'{scheduler.staff[staff_id].name}: {len(task_ids)} task(s)')
+                self.stdout.write(self.style.SUCCESS(f'Assigned {assigned} task(s)'))
+            elif not options['loop']:
+                self.stdout.write('No pending tasks to assign')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+            # Pick up completed work and staff changes once per cycle
+            scheduler.refresh()
+
+    def benchmark(self, strategy, task_count, staff_count):
+        rng = random.Random(0)
+        departments = ['printing', 'design', 'kra', 'ecitizen', '']
+        categories = list(range(1, 41))
+        staff = [
+            StaffSlot(
+                id=i,
+                name=f'staff-{i}',
+                rank=rng.choice(['STAFF', 'STAFF', 'STAFF', 'MANAGER', 'ADMIN']),
+                department=rng.choice(departments),
+                skills=rng.sample(categories, 3),
+                load=rng.randint(0, 10),
+            )
+            for i in range(1, staff_count + 1)
+        ]
+        category_departments = {c: rng.choice(departments) for c in categories}
+        scheduler = TaskScheduler(strategy=strategy, staff=staff, category_departments=category_departments)
+        tickets = [TaskTicket(i, rng.choice(categories)) for i in range(task_count)]
+
+        started = time.perf_counter()
+        for ticket in tickets:
+            scheduler.pick(ticket)
+        elapsed = time.perf_counter() - started
+
+        loads = sorted(slot.load for slot in staff)
+        self.stdout.write(f'Strategy: {type(strategy).__name__}')
+        self.stdout.write(f'Assigned {task_count} tasks across {staff_count} staff in {elapsed * 1000:.1f} ms')
+        self.stdout.write(f'Throughput: {task_count / elapsed:,.0f} tasks/s')
+        self.stdout.write(f'Load spread: min {loads[0]}, max {loads[-1]}')
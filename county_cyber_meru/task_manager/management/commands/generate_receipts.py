@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from task_manager.receipts import FORMATS, KINDS, build_documents, completed_tasks, save_receipts, write_receipts_zip
+
+
+class Command(BaseCommand):
+    help = 'Generate per-customer receipts or invoices for completed tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First completion date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last completion date (YYYY-MM-DD), inclusive')
+        parser.add_argument('--task', type=int, action='append', dest='task_ids', help='Task id; repeat for several')
+        parser.add_argument('--kind', choices=KINDS, default='receipt')
+        parser.add_argument('--format', default=','.join(FORMATS), help='Comma-separated: pdf, xlsx')
+        parser.add_argument('--zip', dest='zip_path', help='Write a ZIP archive here instead of saving to media')
+        parser.add_argument('--workers', type=int, help='Rendering processes (default RECEIPT_WORKERS)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ('start', 'end'):
+            value = options[option]
+            dates[option] = parse_date(value) if value else None
+            if value and dates[option] is None:
+                raise CommandError(f'Invalid date: {value}')
+        formats = [f.strip().lower() for f in options['format'].split(',') if f.strip()]
+        unknown = set(formats) - set(FORMATS)
+        if unknown or not formats:
+            raise CommandError(f"Unknown format: {', '.join(sorted(unknown)) or options['format']}")
+        if not (options['task_ids'] or dates['start'] or dates['end']):
+            raise CommandError('Give --task ids or a --from/--to date range')
+
+        tasks = completed_tasks(options['task_ids'], dates['start'], dates['end'])
+        documents = build_documents(tasks, options['kind'])
+        if not documents:
+            self.stdout.write('No completed tasks match.')
+            return
+
+        if options['zip_path']:
+            count = write_receipts_zip(documents, options['zip_path'], formats, options['workers'])
+            destination = os.path.abspath(options['zip_path'])
+        else:
+            count = len(save_receipts(documents, formats, workers=options['workers']))
+            destination = 'media/receipts/'
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {count} files for {len(documents)} customers in {destination}"
+        ))
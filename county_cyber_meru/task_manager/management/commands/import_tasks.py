@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from task_manager.bulk_import import BATCH_SIZE, SheetError, import_tasks
+
+
+class Command(BaseCommand):
+    help = 'Create tasks in bulk from a CSV or XLSX sheet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or .xlsx file with a header row')
+        parser.add_argument('--skip-invalid', action='store_true', help='Import the valid rows even if some rows have errors')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} does not exist')
+        with open(path, 'rb') as f:
+            try:
+                result = import_tasks(
+                    f, path,
+                    skip_invalid=options['skip_invalid'],
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                )
+            except SheetError as error:
+                raise CommandError(error)
+
+        for number, message in result.errors:
+            self.stderr.write(f'Row {number}: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... and {result.error_count - len(result.errors)} more')
+
+        if result.created:
+            self.stdout.write(self.style.SUCCESS(f'Imported {result.created} of {result.rows} tasks'))
+        elif result.error_count:
+            raise CommandError(f'{result.error_count} of {result.rows} rows have errors; nothing was imported')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {result.valid} rows are valid'))
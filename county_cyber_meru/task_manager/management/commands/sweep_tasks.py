@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from task_manager.sweeps import sweep_open_tasks
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Raise priorities of tasks nearing their deadline and refresh overdue flags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username recorded on updates for unassigned tasks (default: first superuser)')
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping at a fixed interval')
+        parser.add_argument('--interval', type=int, default=900, help='Seconds between sweeps in loop mode')
+
+    def handle(self, *args, **options):
+        actor = None
+        if options['user']:
+            try:
+                actor = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        while True:
+            result = sweep_open_tasks(actor=actor)
+            self.stdout.write(self.style.SUCCESS(
+                f"Escalated {result['escalated']}, flagged {result['flagged']} overdue, "
+                f"cleared {result['cleared']}"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0009_alter_servicecategory_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecategory',
+            name='department',
+            field=models.CharField(blank=True, help_text='Staff department that handles this category (matched against staff department)', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='taskcategory',
+            name='skilled_staff',
+            field=models.ManyToManyField(blank=True, help_text='Staff preferred for automatic assignment of this service', limit_choices_to={'is_staff': True}, related_name='task_skills', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def flag_overdue_tasks(apps, schema_editor):
+    Task = apps.get_model('task_manager', 'Task')
+    Task.objects.filter(
+        status__in=['pending', 'in_progress'],
+        due_date__lt=timezone.now()
+    ).update(is_overdue=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0010_servicecategory_department_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='is_overdue',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_overdue'], name='task_manage_is_over_47fc13_idx'),
+        ),
+        migrations.RunPython(flag_overdue_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:20
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+OPEN_STATUSES = ['pending', 'in_progress']
+
+
+def count_children(model, link, **filters):
+    return Coalesce(Subquery(
+        model.objects.filter(**{link: OuterRef('pk')}, **filters)
+        .order_by().values(link).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def count_tasks(apps, schema_editor):
+    ServiceCategory = apps.get_model('task_manager', 'ServiceCategory')
+    TaskCategory = apps.get_model('task_manager', 'TaskCategory')
+    Task = apps.get_model('task_manager', 'Task')
+
+    TaskCategory.objects.update(
+        task_count=count_children(Task, 'category'),
+        open_task_count=count_children(Task, 'category', status__in=OPEN_STATUSES),
+    )
+    ServiceCategory.objects.update(
+        active_subcategory_count=count_children(TaskCategory, 'service_category', is_active=True),
+        task_count=count_children(Task, 'category__service_category'),
+        open_task_count=count_children(Task, 'category__service_category', status__in=OPEN_STATUSES),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0011_task_is_overdue_task_task_manage_is_over_47fc13_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecategory',
+            name='active_subcategory_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Sub-Services'),
+        ),
+        migrations.AddField(
+            model_name='servicecategory',
+            name='open_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Open Tasks'),
+        ),
+        migrations.AddField(
+            model_name='servicecategory',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total Tasks'),
+        ),
+        migrations.AddField(
+            model_name='taskcategory',
+            name='open_task_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Open Tasks'),
+        ),
+        migrations.AddField(
+            model_name='taskcategory',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tasks'),
+        ),
+        migrations.RunPython(count_tasks, migrations.RunPython.noop),
+    ]
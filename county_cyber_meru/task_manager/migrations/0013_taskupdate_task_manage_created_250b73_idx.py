@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0012_servicecategory_active_subcategory_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskupdate',
+            index=models.Index(fields=['created_at'], name='task_manage_created_250b73_idx'),
+        ),
+    ]
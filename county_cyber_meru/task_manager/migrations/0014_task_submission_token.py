@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0013_taskupdate_task_manage_created_250b73_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='submission_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['content_hash', 'created_at'], name='task_manage_content_b7438f_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task_manager', '0014_task_submission_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='attachment_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='attachment_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='task_attachments/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='taskattachment',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='taskattachment',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='task_attachments/thumbnails/'),
+        ),
+    ]
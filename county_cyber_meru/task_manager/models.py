@@ -1,9 +1,14 @@
 from django.db import models
+from django.db.models import DEFERRED
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
 from django.core.files.storage import FileSystemStorage
+import hashlib
 import os
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_save
+from core import counters
 
 def service_category_image_path(instance, filename):
     """File path for service category images"""
@@ -13,8 +18,9 @@ def task_category_image_path(instance, filename):
     """File path for task category images"""
     return f'task_categories/{instance.service_category.name}/{instance.name}/{filename}'
 
-class ServiceCategory(models.Model):
+class ServiceCategory(counters.CountColumnsMixin, models.Model):
     """Main service categories (KRA, Printing, Design, etc.)"""
+    count_fields = ('active_subcategory_count', 'task_count', 'open_task_count')
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
@@ -46,6 +52,18 @@ class ServiceCategory(models.Model):
     
     order = models.IntegerField(default=0, help_text="Display order")
     
+    # Automatic assignment
+    department = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Staff department that handles this category (matched against staff department)"
+    )
+    
+    # Denormalized counts, maintained by the signal handlers below
+    active_subcategory_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Sub-Services')
+    task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Total Tasks')
+    open_task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Open Tasks')
+    
     class Meta:
         verbose_name_plural = "Service Categories"
         ordering = ['order', 'name']
@@ -61,7 +79,7 @@ class ServiceCategory(models.Model):
     @property
     def subcategory_count(self):
         """Count of active subcategories"""
-        return self.subcategories.filter(is_active=True).count()
+        return self.active_subcategory_count
     
     @property
     def active_subcategories(self):
@@ -81,9 +99,23 @@ class ServiceCategory(models.Model):
         if self.cover_image and hasattr(self.cover_image, 'url'):
             return self.cover_image.url
         return '/static/images/default-cover.png'
+    
+    @classmethod
+    def refresh_counts(cls, pks=None):
+        """Recompute the denormalized counts, for all rows or only pks"""
+        queryset = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return counters.refresh(
+            queryset,
+            active_subcategory_count=counters.count_of(TaskCategory, 'service_category', is_active=True),
+            task_count=counters.count_of(Task, 'category__service_category'),
+            open_task_count=counters.count_of(
+                Task, 'category__service_category', status__in=Task.OPEN_STATUSES
+            ),
+        )
 
-class TaskCategory(models.Model):
+class TaskCategory(counters.CountColumnsMixin, models.Model):
     """Sub-categories/services under main categories (File Returns, Zero Returns, ToT under KRA)"""
+    count_fields = ('task_count', 'open_task_count')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     service_category = models.ForeignKey(
@@ -124,6 +156,17 @@ class TaskCategory(models.Model):
         blank=True,
         help_text="e.g., 30 minutes, 2 hours, 1 day"
     )
+    skilled_staff = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        limit_choices_to={'is_staff': True},
+        related_name='task_skills',
+        help_text="Staff preferred for automatic assignment of this service"
+    )
+
+    # Denormalized counts, maintained by the signal handlers below
+    task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Tasks')
+    open_task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Open Tasks')
 
     service_category = models.ForeignKey(
         ServiceCategory, 
@@ -160,8 +203,44 @@ class TaskCategory(models.Model):
     def display_color(self):
         """Return color from service category"""
         return self.service_category.color
+    
+    @classmethod
+    def refresh_counts(cls, pks=None):
+        """Recompute the denormalized counts, for all rows or only pks"""
+        queryset = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return counters.refresh(
+            queryset,
+            task_count=counters.count_of(Task, 'category'),
+            open_task_count=counters.count_of(Task, 'category', status__in=Task.OPEN_STATUSES),
+        )
+
+# Hours left before the due date -> priority, checked in order
+PRIORITY_THRESHOLDS = [
+    (24, 'urgent'),
+    (72, 'high'),
+    (168, 'medium'),
+]
+DEFAULT_DEADLINE_PRIORITY = 'low'
+
+def priority_for_deadline(deadline, now=None):
+    """Priority a task should have given its deadline"""
+    if not deadline:
+        return 'medium'
+    now = now or timezone.now()
+    hours_until_due = (deadline - now).total_seconds() / 3600
+    for hours, priority in PRIORITY_THRESHOLDS:
+        if hours_until_due <= hours:
+            return priority
+    return DEFAULT_DEADLINE_PRIORITY
+
+def submission_content_hash(email, title, description):
+    """Fingerprint of a public submission, blind to case and spacing"""
+    parts = (' '.join(str(value).split()).casefold() for value in (email, title, description))
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
 
 class Task(models.Model):
+    OPEN_STATUSES = ['pending', 'in_progress']
+
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('in_progress', 'In Progress'),
@@ -210,6 +289,8 @@ class Task(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Maintained by save() and the sweep_tasks command
+    is_overdue = models.BooleanField(default=False, editable=False)
     
     # Cancellation and notes
     cancellation_reason = models.TextField(blank=True)
@@ -217,6 +298,13 @@ class Task(models.Model):
     
     # File attachments
     attachment = models.FileField(upload_to='task_attachments/', blank=True, null=True)
+    # Filled in after upload by task_manager.attachments
+    attachment_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    attachment_thumbnail = models.ImageField(upload_to='task_attachments/thumbnails/', blank=True, null=True, editable=False)
+
+    # Duplicate protection for public submissions
+    submission_token = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -226,6 +314,8 @@ class Task(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['assigned_to']),
             models.Index(fields=['category']),
+            models.Index(fields=['is_overdue']),
+            models.Index(fields=['content_hash', 'created_at']),
         ]
     
     def __str__(self):
@@ -233,14 +323,33 @@ class Task(models.Model):
     
     def get_absolute_url(self):
         return reverse('task_manager:task-detail', kwargs={'pk': self.pk})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so signal handlers can tell what changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
     
     def save(self, *args, **kwargs):
+        # Uploads inspected by core.uploads arrive already hashed
+        if self.attachment and not self.attachment._committed:
+            self.attachment_sha256 = getattr(self.attachment.file, 'sha256', '')
+        
         # Auto-set completed_at when status changes to completed
         if self.status == 'completed' and not self.completed_at:
             self.completed_at = timezone.now()
         elif self.status != 'completed' and self.completed_at:
             self.completed_at = None
         
+        self.is_overdue = bool(
+            self.due_date
+            and self.status in self.OPEN_STATUSES
+            and timezone.now() > self.due_date
+        )
+        
         # Auto-set price from category if not set
         if not self.price and self.category.price:
             self.price = self.category.price
@@ -267,12 +376,6 @@ class Task(models.Model):
         """Get the service color"""
         return self.category.display_color
     
-    @property
-    def is_overdue(self):
-        if self.due_date and self.status not in ['completed', 'cancelled']:
-            return timezone.now() > self.due_date
-        return False
-    
     @property
     def duration(self):
         if self.completed_at and self.created_at:
@@ -296,6 +399,9 @@ class TaskUpdate(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"Update for {self.task.title} by {self.user.username}"
@@ -307,6 +413,96 @@ class TaskAttachment(models.Model):
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     description = models.CharField(max_length=200, blank=True)
+    # Filled in after upload by task_manager.attachments
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    thumbnail = models.ImageField(upload_to='task_attachments/thumbnails/', blank=True, null=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so signal handlers can tell what changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
     
     def __str__(self):
-        return f"Attachment for {self.task.title}"
\ No newline at end of file
+        return f"Attachment for {self.task.title}"
+
+# Denormalized category counts
+def task_category_counts(values):
+    """Counts a Task row with these values adds to its TaskCategory"""
+    if not values:
+        return {}
+    return {
+        'task_count': 1,
+        'open_task_count': int(values['status'] in Task.OPEN_STATUSES),
+    }
+
+def add_task_counts(category_id, deltas):
+    """Apply task count changes to a TaskCategory and its ServiceCategory"""
+    counters.increment(TaskCategory.objects.filter(pk=category_id), deltas)
+    counters.increment(ServiceCategory.objects.filter(subcategories=category_id), deltas)
+
+@receiver(pre_save, sender=Task)
+def remember_task_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counts_previous = counters.previous_values(instance, ('category_id', 'status'))
+
+@receiver(post_save, sender=Task)
+def update_task_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counts_previous', None)
+    new = {'category_id': instance.category_id, 'status': instance.status}
+    if old and old['category_id'] != new['category_id']:
+        add_task_counts(old['category_id'], counters.contribution_delta(task_category_counts(old), {}))
+        old = None
+    add_task_counts(
+        new['category_id'],
+        counters.contribution_delta(task_category_counts(old), task_category_counts(new))
+    )
+    # The saved state is the baseline for the next save of this instance
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **new}
+
+@receiver(post_delete, sender=Task)
+def remove_task_counts(sender, instance, **kwargs):
+    old = {'category_id': instance.category_id, 'status': instance.status}
+    add_task_counts(old['category_id'], counters.contribution_delta(task_category_counts(old), {}))
+
+@receiver(pre_save, sender=TaskCategory)
+def remember_subcategory_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counts_previous = counters.previous_values(instance, ('service_category_id', 'is_active'))
+
+@receiver(post_save, sender=TaskCategory)
+def update_subcategory_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counts_previous', None)
+    if old and old['service_category_id'] != instance.service_category_id:
+        # Moving a service takes its tasks along to the new service category
+        tasks = TaskCategory.objects.filter(pk=instance.pk).values('task_count', 'open_task_count').get()
+        counters.increment(
+            ServiceCategory.objects.filter(pk=old['service_category_id']),
+            {'active_subcategory_count': -int(old['is_active']), **{k: -n for k, n in tasks.items()}}
+        )
+        counters.increment(
+            ServiceCategory.objects.filter(pk=instance.service_category_id),
+            {'active_subcategory_count': int(instance.is_active), **tasks}
+        )
+        return
+    was_active = bool(old and old['is_active'])
+    counters.increment(
+        ServiceCategory.objects.filter(pk=instance.service_category_id),
+        {'active_subcategory_count': int(instance.is_active) - int(was_active)}
+    )
+
+@receiver(post_delete, sender=TaskCategory)
+def remove_subcategory_counts(sender, instance, **kwargs):
+    # Tasks are cascade-deleted first and have already been uncounted
+    if instance.is_active:
+        counters.increment(
+            ServiceCategory.objects.filter(pk=instance.service_category_id),
+            {'active_subcategory_count': -1}
+        )
@@ -0,0 +1,202 @@
+"""
+Rendering of receipts and invoices to PDF and XLSX.
+
+Kept free of Django so worker processes only import this module and its
+two writers (core.pdf, xlsxwriter). Everything that is the same for
+every customer (page geometry, table columns, the letterhead and table
+header drawing, the XLSX cell formats) is computed once as a Layout,
+handed to each worker once when the pool starts, and reused for every
+document it renders. A document is a plain dict:
+
+    {'kind': 'receipt', 'number': 'RCT-20250131-000412', 'issued': '31 Jan 2025',
+     'customer': {'name': ..., 'email': ..., 'phone': ...},
+     'lines': [(date, task_id, service, title, amount), ...], 'total': Decimal}
+"""
+import io
+import re
+import unicodedata
+
+import xlsxwriter
+
+from core import pdf
+
+TITLES = {'receipt': 'RECEIPT', 'invoice': 'INVOICE'}
+NOTES = {
+    'receipt': 'Paid in full. Thank you for your business.',
+    'invoice': 'Payment is due on receipt. Thank you for your business.',
+}
+ACCENT = '#2563eb'
+GREY = '#64748b'
+ROW_FILL = '#eef2ff'
+
+
+class Layout:
+    """Everything about a receipt that doesn't depend on the customer"""
+
+    margin = 48
+    row_height = 16
+    # (header, x offset from the margin, width, align)
+    columns = (
+        ('Date', 0, 70, 'left'),
+        ('Task', 70, 45, 'left'),
+        ('Service', 115, 130, 'left'),
+        ('Description', 245, 170, 'left'),
+        ('Amount', 415, 84, 'right'),
+    )
+    xlsx_widths = (12, 8, 24, 40, 14)
+
+    def __init__(self, business, currency):
+        self.business = business
+        self.currency = currency
+        self.width, self.height = pdf.A4
+        self.right = self.width - self.margin
+        self.table_top = self.height - 250
+        self.bottom = self.margin + 60
+        self.letterhead = self.build_letterhead()
+        self.table_header = self.build_table_header()
+        self.xlsx_formats = {
+            'title': {'bold': True, 'font_size': 16, 'font_color': ACCENT},
+            'muted': {'font_color': GREY},
+            'heading': {'bold': True, 'font_size': 14},
+            'header': {'bold': True, 'bg_color': ROW_FILL, 'bottom': 1},
+            'money': {'num_format': '#,##0.00'},
+            'total_label': {'bold': True, 'top': 1},
+            'total': {'bold': True, 'top': 1, 'num_format': f'"{currency}" #,##0.00'},
+        }
+
+    def build_letterhead(self):
+        fragment = pdf.Fragment()
+        top = self.height - self.margin
+        fragment.text(self.margin, top - 18, self.business.get('name', ''), 'Helvetica-Bold', 18, color=ACCENT)
+        y = top - 36
+        for key in ('address', 'phone', 'email'):
+            if self.business.get(key):
+                fragment.text(self.margin, y, self.business[key], size=9, color=GREY)
+                y -= 12
+        fragment.line(self.margin, top - 80, self.right, top - 80, 1, ACCENT)
+        footer_y = self.margin - 10
+        fragment.line(self.margin, footer_y + 14, self.right, footer_y + 14, 0.5, GREY)
+        fragment.text(self.width / 2, footer_y, self.business.get('name', ''), size=8, align='center', color=GREY)
+        return fragment
+
+    def build_table_header(self):
+        fragment = pdf.Fragment()
+        y = self.table_top
+        fragment.rect(self.margin, y - 5, self.right - self.margin, self.row_height + 2, fill=ROW_FILL)
+        for header, offset, width, align in self.columns:
+            x = self.margin + offset + (width if align == 'right' else 0)
+            label = f'{header} ({self.currency})' if header == 'Amount' else header
+            fragment.text(x, y, label, 'Helvetica-Bold', 9, align)
+        return fragment
+
+
+def money(amount):
+    return f'{amount:,.2f}'
+
+
+def filename(document, extension):
+    name = unicodedata.normalize('NFKD', document['customer']['name']).encode('ascii', 'ignore').decode()
+    name = re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-')[:40] or 'customer'
+    return f"{document['number']}-{name}.{extension}"
+
+
+def render_pdf(document, layout):
+    output = pdf.Document(f"{TITLES[document['kind']].title()} {document['number']}")
+
+    def new_page():
+        page = output.add_page()
+        page.draw(layout.letterhead)
+        top = layout.height - layout.margin
+        page.text(layout.right, top - 20, TITLES[document['kind']], 'Helvetica-Bold', 20, 'right')
+        page.text(layout.right, top - 38, f"No. {document['number']}", size=9, align='right')
+        page.text(layout.right, top - 50, f"Date: {document['issued']}", size=9, align='right')
+        page.draw(layout.table_header)
+        return page
+
+    page = new_page()
+    customer = document['customer']
+    y = layout.height - layout.margin - 110
+    page.text(layout.margin, y, 'Bill to', 'Helvetica-Bold', 10, color=GREY)
+    for value in (customer['name'], customer['email'], customer['phone']):
+        if value:
+            y -= 14
+            page.text(layout.margin, y, value, size=10)
+
+    y = layout.table_top - layout.row_height - 2
+    for date, task_id, service, title, amount in document['lines']:
+        if y < layout.bottom:
+            page = new_page()
+            y = layout.table_top - layout.row_height - 2
+        values = (date, f'#{task_id}', service, title, money(amount))
+        for value, (_, offset, width, align) in zip(values, layout.columns):
+            x = layout.margin + offset + (width if align == 'right' else 0)
+            page.text(x, y, pdf.fit_text(str(value), width - 6, size=9), size=9, align=align)
+        y -= layout.row_height
+
+    if y < layout.bottom:
+        page = new_page()
+        y = layout.table_top - layout.row_height - 2
+    page.line(layout.margin, y + layout.row_height - 4, layout.right, y + layout.row_height - 4)
+    page.text(layout.right - 90, y - 4, 'Total', 'Helvetica-Bold', 11, 'right')
+    page.text(layout.right, y - 4, f"{layout.currency} {money(document['total'])}", 'Helvetica-Bold', 11, 'right')
+    page.text(layout.margin, y - 34, NOTES[document['kind']], size=9, color=GREY)
+    return output.to_bytes()
+
+
+def render_xlsx(document, layout):
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'in_memory': True, 'strings_to_formulas': False})
+    formats = {name: workbook.add_format(spec) for name, spec in layout.xlsx_formats.items()}
+    sheet = workbook.add_worksheet(TITLES[document['kind']].title())
+    for index, width in enumerate(layout.xlsx_widths):
+        sheet.set_column(index, index, width)
+
+    sheet.write(0, 0, layout.business.get('name', ''), formats['title'])
+    row = 1
+    for key in ('address', 'phone', 'email'):
+        if layout.business.get(key):
+            sheet.write(row, 0, layout.business[key], formats['muted'])
+            row += 1
+    row += 1
+    sheet.write(row, 0, f"{TITLES[document['kind']]} {document['number']}", formats['heading'])
+    sheet.write(row + 1, 0, f"Date: {document['issued']}")
+    row += 3
+    customer = document['customer']
+    sheet.write(row, 0, 'Bill to', formats['muted'])
+    for value in (customer['name'], customer['email'], customer['phone']):
+        if value:
+            row += 1
+            sheet.write(row, 0, value)
+    row += 2
+
+    sheet.write_row(row, 0, [
+        f'{header} ({layout.currency})' if header == 'Amount' else header for header, *_ in layout.columns
+    ], formats['header'])
+    first = row + 1
+    for date, task_id, service, title, amount in document['lines']:
+        row += 1
+        sheet.write_row(row, 0, [date, task_id, service, title])
+        sheet.write_number(row, 4, amount, formats['money'])
+    row += 1
+    sheet.write(row, 3, 'Total', formats['total_label'])
+    sheet.write_formula(row, 4, f'=SUM(E{first + 1}:E{row})', formats['total'], document['total'])
+    sheet.write(row + 2, 0, NOTES[document['kind']], formats['muted'])
+    workbook.close()
+    return buffer.getvalue()
+
+
+RENDERERS = {'pdf': render_pdf, 'xlsx': render_xlsx}
+
+_layout = None
+
+
+def init_worker(layout):
+    """Pool initializer: keep the shared layout for every document this process renders"""
+    global _layout
+    _layout = layout
+
+
+def render(document, formats, layout=None):
+    """[(filename, bytes)] for document in each of formats"""
+    layout = layout or _layout
+    return [(filename(document, extension), RENDERERS[extension](document, layout)) for extension in formats]
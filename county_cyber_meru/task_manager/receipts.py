@@ -0,0 +1,137 @@
+"""
+Batch receipts and invoices for completed tasks.
+
+Completed tasks are grouped by customer (case-insensitive email) into
+one document each, rendered to PDF and/or XLSX by receipt_rendering,
+and either streamed back as a ZIP or saved to media under receipts/.
+
+A ZIP download renders each file only when the archive reaches it, in
+the request's own process, so one file is in memory at a time and no
+worker processes are started inside a web request. Month-end batches
+belong in the generate_receipts command: it renders on a process pool,
+whose workers receive the precomputed Layout once, at start-up, and
+writes each file out as soon as it arrives.
+"""
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import DecimalField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.zipstream import ZipStream, streaming_response
+from .models import Task
+from .receipt_rendering import RENDERERS, Layout, filename, init_worker, render
+
+KINDS = ('receipt', 'invoice')
+FORMATS = ('pdf', 'xlsx')
+PREFIXES = {'receipt': 'RCT', 'invoice': 'INV'}
+# Below this many documents, starting worker processes costs more than it saves
+POOL_THRESHOLD = 20
+
+
+def completed_tasks(task_ids=None, start=None, end=None):
+    """Completed tasks by id and/or completed on dates start..end (inclusive)"""
+    tasks = Task.objects.filter(status='completed')
+    if task_ids is not None:
+        tasks = tasks.filter(pk__in=task_ids)
+    if start:
+        tasks = tasks.filter(completed_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        tasks = tasks.filter(completed_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return tasks
+
+
+def build_documents(tasks, kind='receipt', issued=None):
+    """One document dict per customer in tasks, ready for rendering"""
+    issued = issued or timezone.localdate()
+    rows = tasks.annotate(
+        amount=Coalesce('price', 'category__price', Value(Decimal('0')), output_field=DecimalField()),
+    ).order_by('customer_email', 'completed_at', 'id').values_list(
+        'id', 'customer_name', 'customer_email', 'customer_phone',
+        'completed_at', 'category__name', 'title', 'amount',
+    )
+    customers = {}
+    for task_id, name, email, phone, completed_at, service, title, amount in rows.iterator(chunk_size=2000):
+        document = customers.get(email.casefold())
+        if document is None:
+            document = customers[email.casefold()] = {
+                'kind': kind,
+                'number': f'{PREFIXES[kind]}-{issued:%Y%m%d}-{task_id:06d}',
+                'issued': f'{issued:%d %b %Y}',
+                'customer': {'name': name, 'email': email, 'phone': phone},
+                'lines': [],
+                'total': Decimal('0'),
+            }
+        date = timezone.localtime(completed_at) if completed_at else None
+        document['lines'].append((f'{date:%d %b %Y}' if date else '', task_id, service, title, amount))
+        document['total'] += amount
+    return list(customers.values())
+
+
+def layout():
+    return Layout(settings.BUSINESS_DETAILS, settings.RECEIPT_CURRENCY)
+
+
+def render_documents(documents, formats=FORMATS, workers=None):
+    """Yield (filename, bytes) for every document in every format"""
+    shared = layout()
+    workers = workers or settings.RECEIPT_WORKERS or os.cpu_count() or 1
+    if workers == 1 or len(documents) < POOL_THRESHOLD:
+        for document in documents:
+            yield from render(document, formats, shared)
+        return
+
+    workers = min(workers, len(documents))
+    # spawn, not fork: forking a process holding database connections and threads isn't safe
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker, initargs=(shared,),
+    ) as pool:
+        chunksize = max(1, len(documents) // (workers * 4))
+        for files in pool.map(render, documents, [formats] * len(documents), chunksize=chunksize):
+            yield from files
+
+
+def receipts_archive(documents, formats=FORMATS):
+    """ZipStream of every document in every format, each rendered as it is streamed"""
+    shared = layout()
+    archive = ZipStream()
+    for document in documents:
+        for extension in formats:
+            archive.add(
+                filename(document, extension), None,
+                lambda document=document, extension=extension: io.BytesIO(RENDERERS[extension](document, shared)),
+            )
+    return archive
+
+
+def receipts_zip_response(documents, formats=FORMATS, filename='receipts.zip'):
+    return streaming_response(receipts_archive(documents, formats), filename)
+
+
+def write_receipts_zip(documents, path, formats=FORMATS, workers=None):
+    """Write every rendered file into a ZIP at path as it arrives; returns how many"""
+    count = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in render_documents(documents, formats, workers):
+            archive.writestr(name, data)
+            count += 1
+    return count
+
+
+def save_receipts(documents, formats=FORMATS, folder=None, workers=None):
+    """Save every rendered file under receipts/<folder>/ in default storage; returns their names"""
+    folder = folder or timezone.localtime().strftime('%Y%m%d-%H%M%S')
+    return [
+        default_storage.save(f'receipts/{folder}/{name}', ContentFile(data))
+        for name, data in render_documents(documents, formats, workers)
+    ]
@@ -0,0 +1,278 @@
+"""
+Automatic assignment of pending tasks to staff.
+
+The scheduler loads the staff pool once (one query for staff, one grouped
+query for open-task counts, one for skills) and then keeps per-staff load
+counters in memory, so each assignment decision is a pure Python lookup.
+The choice of staff member is delegated to an AssignmentStrategy, which can
+be swapped through the TASK_ASSIGNMENT_STRATEGY setting.
+"""
+import itertools
+from collections import Counter
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, When
+from django.utils.module_loading import import_string
+
+from dashboard import stats
+from .models import Task, TaskCategory, TaskUpdate
+
+User = get_user_model()
+
+OPEN_STATUSES = ['pending', 'in_progress']
+
+# Higher ranks take a smaller share of routine work
+RANK_WEIGHTS = {
+    'STAFF': 1.0,
+    'MANAGER': 0.5,
+    'ADMIN': 0.25,
+}
+
+
+class StaffSlot:
+    """In-memory view of a staff member used while assigning"""
+    __slots__ = ('id', 'name', 'rank', 'department', 'skills', 'load', 'weight')
+
+    def __init__(self, id, name, rank, department, skills=(), load=0):
+        self.id = id
+        self.name = name
+        self.rank = rank
+        self.department = (department or '').strip().lower()
+        self.skills = frozenset(skills)
+        self.load = load
+        self.weight = RANK_WEIGHTS.get(rank, 1.0)
+
+    @property
+    def weighted_load(self):
+        return self.load / self.weight
+
+    def __repr__(self):
+        return f"<StaffSlot {self.name} load={self.load}>"
+
+
+class TaskTicket:
+    """Minimal description of a task waiting for assignment"""
+    __slots__ = ('id', 'category_id', 'department')
+
+    def __init__(self, id, category_id, department=''):
+        self.id = id
+        self.category_id = category_id
+        self.department = department
+
+
+class AssignmentStrategy:
+    """Base class for assignment policies"""
+    name = None
+
+    def choose(self, ticket, candidates):
+        """Return one StaffSlot from candidates (never empty) for ticket"""
+        raise NotImplementedError
+
+
+class LeastLoadedStrategy(AssignmentStrategy):
+    """Pick the candidate with the lowest rank-weighted open-task count"""
+    name = 'least_loaded'
+
+    def choose(self, ticket, candidates):
+        return min(candidates, key=lambda slot: (slot.weighted_load, slot.id))
+
+
+class RoundRobinStrategy(AssignmentStrategy):
+    """Rotate through candidates regardless of their load"""
+    name = 'round_robin'
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, ticket, candidates):
+        return candidates[next(self._counter) % len(candidates)]
+
+
+STRATEGIES = {
+    LeastLoadedStrategy.name: LeastLoadedStrategy,
+    RoundRobinStrategy.name: RoundRobinStrategy,
+}
+
+
+def get_strategy(name=None):
+    """Instantiate a strategy by short name or dotted path"""
+    name = name or getattr(settings, 'TASK_ASSIGNMENT_STRATEGY', LeastLoadedStrategy.name)
+    if name in STRATEGIES:
+        return STRATEGIES[name]()
+    return import_string(name)()
+
+
+class TaskScheduler:
+    """Balance pending tasks across the staff pool"""
+
+    def __init__(self, strategy=None, staff=None, category_departments=None):
+        self.strategy = strategy or get_strategy()
+        self.loaded_at = None
+        if staff is None:
+            self.refresh()
+        else:
+            self._set_pool(staff, category_departments or {})
+
+    def refresh(self):
+        """Reload the staff pool and load counters from the database"""
+        loads = dict(
+            Task.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+            .values_list('assigned_to')
+            .annotate(count=Count('id'))
+        )
+        skills = {}
+        for category_id, staff_id in TaskCategory.skilled_staff.through.objects.values_list(
+            'taskcategory_id', 'staffprofile_id'
+        ):
+            skills.setdefault(staff_id, []).append(category_id)
+
+        staff = [
+            StaffSlot(
+                id=user.id,
+                name=user.get_full_name() or user.username,
+                rank=user.rank,
+                department=user.department,
+                skills=skills.get(user.id, ()),
+                load=loads.get(user.id, 0),
+            )
+            for user in User.objects.filter(is_staff=True, is_active=True).only(
+                'id', 'username', 'first_name', 'last_name', 'rank', 'department'
+            )
+        ]
+        departments = {
+            category_id: (department or '').strip().lower()
+            for category_id, department in TaskCategory.objects.values_list(
+                'id', 'service_category__department'
+            )
+        }
+        self._set_pool(staff, departments)
+
+    def _set_pool(self, staff, category_departments):
+        self.staff = {slot.id: slot for slot in staff}
+        self.category_departments = category_departments
+        self._all = list(self.staff.values())
+        self._by_skill = {}
+        self._by_department = {}
+        for slot in self._all:
+            for category_id in slot.skills:
+                self._by_skill.setdefault(category_id, []).append(slot)
+            if slot.department:
+                self._by_department.setdefault(slot.department, []).append(slot)
+        self.loaded_at = time.monotonic()
+
+    def candidates(self, ticket):
+        """Skilled staff first, then the handling department, then everyone"""
+        department = ticket.department or self.category_departments.get(ticket.category_id, '')
+        return (
+            self._by_skill.get(ticket.category_id)
+            or self._by_department.get(department)
+            or self._all
+        )
+
+    def pick(self, ticket):
+        """Choose a staff member for ticket and count the task against them"""
+        candidates = self.candidates(ticket)
+        if not candidates:
+            return None
+        slot = self.strategy.choose(ticket, candidates)
+        slot.load += 1
+        return slot
+
+    def pending_tickets(self, limit=None):
+        """Unassigned pending tasks, most urgent first"""
+        priority_rank = Case(
+            When(priority='urgent', then=0),
+            When(priority='high', then=1),
+            When(priority='medium', then=2),
+            default=3,
+            output_field=IntegerField(),
+        )
+        queryset = (
+            Task.objects.filter(status='pending', assigned_to__isnull=True)
+            .annotate(priority_rank=priority_rank)
+            .order_by('priority_rank', 'due_date', 'created_at')
+            .values_list('id', 'category_id')
+        )
+        if limit:
+            queryset = queryset[:limit]
+        return [TaskTicket(task_id, category_id) for task_id, category_id in queryset]
+
+    def assign_pending(self, limit=None):
+        """Assign every unassigned pending task. Returns {staff_id: [task ids]}"""
+        plan = {}
+        for ticket in self.pending_tickets(limit):
+            slot = self.pick(ticket)
+            if slot is None:
+                break
+            plan.setdefault(slot.id, []).append(ticket.id)
+        self.apply(plan)
+        return plan
+
+    def assign_task(self, task):
+        """Assign a single freshly submitted task"""
+        slot = self.pick(TaskTicket(task.id, task.category_id))
+        if slot is None:
+            return None
+        self.apply({slot.id: [task.id]})
+        task.assigned_to_id = slot.id
+        return slot
+
+    def apply(self, plan):
+        """Write an assignment plan with one UPDATE per staff member"""
+        if not plan:
+            return
+        updates = []
+        deltas = Counter()
+        with transaction.atomic():
+            for staff_id, task_ids in plan.items():
+                # Only claim tasks nobody picked up in the meantime
+                claimed = list(
+                    Task.objects.filter(
+                        pk__in=task_ids, status='pending', assigned_to__isnull=True
+                    ).values_list('id', flat=True)
+                )
+                Task.objects.filter(pk__in=claimed).update(assigned_to_id=staff_id)
+                deltas[(stats.OPEN_TASKS, staff_id)] += len(claimed)
+                slot = self.staff[staff_id]
+                slot.load -= len(task_ids) - len(claimed)
+                label = f"{slot.name} ({slot.rank.title()})"
+                updates.extend(
+                    TaskUpdate(
+                        task_id=task_id,
+                        user_id=staff_id,
+                        message=f"Task automatically assigned to {label}"
+                    )
+                    for task_id in claimed
+                )
+            TaskUpdate.objects.bulk_create(updates)
+            # queryset.update() bypasses the dashboard signal handlers
+            stats.apply_deltas(deltas)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler(max_age=None):
+    """Process-wide scheduler used on submission, refreshed every max_age seconds"""
+    global _shared
+    max_age = max_age if max_age is not None else getattr(settings, 'TASK_ASSIGNMENT_REFRESH', 60)
+    with _shared_lock:
+        if _shared is None:
+            _shared = TaskScheduler()
+        elif time.monotonic() - _shared.loaded_at > max_age:
+            _shared.refresh()
+        return _shared
+
+
+def auto_assign(task):
+    """Assign a new task on submission when TASK_AUTO_ASSIGN is enabled"""
+    if not getattr(settings, 'TASK_AUTO_ASSIGN', False):
+        return None
+    scheduler = shared_scheduler()
+    with _shared_lock:
+        return scheduler.assign_task(task)
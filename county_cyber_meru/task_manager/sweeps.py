@@ -0,0 +1,115 @@
+"""
+Periodic maintenance of open tasks.
+
+Priorities set at submission go stale as deadlines approach, and the
+is_overdue flag is only refreshed when a task is saved. sweep_open_tasks()
+brings both up to date with set-based UPDATE statements and records the
+changes as TaskUpdate entries in a single bulk_create.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from dashboard import stats
+from .models import (
+    DEFAULT_DEADLINE_PRIORITY, PRIORITY_THRESHOLDS, Task, TaskUpdate,
+)
+
+User = get_user_model()
+
+PRIORITY_RANKS = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+def deadline_priority_expression(now):
+    """SQL equivalent of priority_for_deadline() for tasks with a due date"""
+    return Case(
+        *[
+            When(due_date__lte=now + timedelta(hours=hours), then=Value(priority))
+            for hours, priority in PRIORITY_THRESHOLDS
+        ],
+        default=Value(DEFAULT_DEADLINE_PRIORITY),
+    )
+
+
+def priority_rank_expression(expression):
+    """Map a priority expression to its rank (0 = most urgent)"""
+    return Case(
+        *[When(Q(**{expression: name}), then=Value(rank)) for name, rank in PRIORITY_RANKS.items()],
+        default=Value(PRIORITY_RANKS[DEFAULT_DEADLINE_PRIORITY]),
+        output_field=IntegerField(),
+    )
+
+
+def default_actor():
+    """User recorded on sweep updates for tasks nobody is assigned to"""
+    return User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+
+
+def sweep_open_tasks(now=None, actor=None):
+    """
+    Escalate priorities of open tasks whose deadline is getting closer and
+    refresh the is_overdue flag. Priorities are only ever raised, so a
+    priority bumped manually by staff is left alone.
+    Returns a dict with the number of tasks escalated, flagged and cleared.
+    """
+    now = now or timezone.now()
+    actor = actor or default_actor()
+    target = deadline_priority_expression(now)
+
+    with transaction.atomic():
+        stale = (
+            Task.objects.filter(status__in=Task.OPEN_STATUSES, due_date__isnull=False)
+            .annotate(
+                target_priority=target,
+                target_rank=priority_rank_expression('target_priority'),
+                current_rank=priority_rank_expression('priority'),
+            )
+            .filter(target_rank__lt=F('current_rank'))
+        )
+        escalated = list(stale.values_list('id', 'assigned_to_id', 'priority', 'target_priority'))
+        if escalated:
+            Task.objects.filter(pk__in=stale.values('pk')).update(priority=target)
+
+        newly_overdue = Task.objects.filter(
+            status__in=Task.OPEN_STATUSES, due_date__lt=now, is_overdue=False
+        )
+        flagged = list(newly_overdue.values_list('id', 'assigned_to_id'))
+        if flagged:
+            newly_overdue.update(is_overdue=True)
+
+        cleared = Task.objects.filter(is_overdue=True).exclude(
+            status__in=Task.OPEN_STATUSES, due_date__lt=now
+        ).update(is_overdue=False)
+
+        updates = []
+        for task_id, assigned_to_id, old, new in escalated:
+            user_id = assigned_to_id or (actor and actor.pk)
+            if user_id:
+                updates.append(TaskUpdate(
+                    task_id=task_id,
+                    user_id=user_id,
+                    message=f"Priority raised from {old} to {new} as the deadline approaches"
+                ))
+        for task_id, assigned_to_id in flagged:
+            user_id = assigned_to_id or (actor and actor.pk)
+            if user_id:
+                updates.append(TaskUpdate(task_id=task_id, user_id=user_id, message="Task is now overdue"))
+        TaskUpdate.objects.bulk_create(updates)
+
+        # queryset.update() bypasses the dashboard signal handlers
+        deltas = Counter()
+        for _, _, old, new in escalated:
+            deltas[(stats.task_priority_counter(old), None)] -= 1
+            deltas[(stats.task_priority_counter(new), None)] += 1
+        deltas[(stats.TASKS_OVERDUE, None)] += len(flagged) - cleared
+        stats.apply_deltas(deltas)
+
+    return {
+        'escalated': len(escalated),
+        'flagged': len(flagged),
+        'cleared': cleared,
+    }
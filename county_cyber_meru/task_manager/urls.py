@@ -10,6 +10,7 @@ urlpatterns = [
     
     # Staff-only URLs
     path('', views.task_list, name='task-list'),
+    path('export/', views.task_export, name='task-export'),
     path('dashboard/', views.task_dashboard, name='task-dashboard'),
     path('<int:pk>/', views.task_detail, name='task-detail'),
     
@@ -19,7 +20,9 @@ urlpatterns = [
 
     
     path('create/', views.task_submission, name='task-create'),
+    path('import/', views.task_import, name='task-import'),
     path('<int:pk>/assign-to-me/', views.task_assign_to_me, name='task-assign-to-me'),
     path('<int:pk>/mark-completed/', views.task_mark_completed, name='task-mark-completed'),
     path('<int:pk>/cancel/', views.task_cancel, name='task-cancel'),
+    path('<int:pk>/attachments.zip', views.task_attachments_zip, name='task-attachments-zip'),
 ]
\ No newline at end of file
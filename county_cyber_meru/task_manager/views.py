@@ -1,12 +1,26 @@
+import os
+from functools import wraps
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import get_user_model
 from django.contrib import messages
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponseForbidden
 from django.db.models import Q, Count
 from django.utils import timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from .models import Task, TaskCategory, TaskUpdate, TaskAttachment, ServiceCategory
-from .forms import TaskSubmissionForm, TaskStaffForm, TaskUpdateForm, TaskAttachmentForm
+from .forms import TaskSubmissionForm, TaskStaffForm, TaskUpdateForm, TaskAttachmentForm, TaskImportForm
+from .bulk_import import SheetError, import_tasks
+from .exports import TASK_COLUMNS
+from .filters import filter_tasks
+from .scheduling import auto_assign
+from . import catalog
+from dashboard import stats
+from core import exports, zipstream
+from core.ratelimit import SlidingWindowLimiter, client_ip
+from core.uploads import inspect_uploads, report_rejections
 from django.db.models import Count, Q
 from django.db.models import Case, When, IntegerField
 
@@ -18,69 +32,35 @@ def is_staff_user(user):
     return user.is_staff
 
 
-# Public views (no authentication required)
-def task_submission(request):
-    """Allow anyone to submit a task"""
-    # Get category from query parameter
-    category_id = request.GET.get('category')
-    initial_data = {}
-    
-    if category_id:
-        try:
-            category = TaskCategory.objects.get(id=category_id, is_active=True)
-            initial_data['category'] = category
-        except TaskCategory.DoesNotExist:
-            pass
-    
-    if request.method == 'POST':
-        form = TaskSubmissionForm(request.POST, request.FILES)
-        if form.is_valid():
-            task = form.save()
-            messages.success(
-                request, 
-                f'Task submitted successfully! Your reference is #{task.id}. '
-                f'We will contact you at {task.customer_email} soon.'
-            )
-            return redirect('task_manager:task-submission-success')
-    else:
-        form = TaskSubmissionForm(initial=initial_data)
-    
-    context = {
-        'form': form,
-        'categories': TaskCategory.objects.filter(is_active=True),
-        'title': 'Submit a Task'
-    }
-    return render(request, 'task_manager/task_submission.html', context)
-
-
-
-def task_submission_success(request):
-    """Success page after task submission"""
-    return render(request, 'task_manager/task_submission_success.html', {'title': 'Task Submitted Successfully'})
-
 # Staff-only views
 @user_passes_test(is_staff_user)
 @login_required
 def task_list(request):
     """Staff view of tasks"""
     tasks = Task.objects.all().select_related('category', 'category__service_category', 'assigned_to')
-    
-    # Filtering
-    status_filter = request.GET.get('status')
-    if status_filter:
-        tasks = tasks.filter(status=status_filter)
-    
-    category_filter = request.GET.get('category')
-    if category_filter:
-        tasks = tasks.filter(category_id=category_filter)
+    tasks = filter_tasks(tasks, request.GET, request.user)
     
     context = {
         'tasks': tasks,
         'status_choices': Task.STATUS_CHOICES,
+        'priority_choices': Task.PRIORITY_CHOICES,
     }
     return render(request, 'task_manager/task_list.html', context)
 
 
+@user_passes_test(is_staff_user)
+@login_required
+def task_export(request):
+    """Download the task list, with the list's filters applied, as CSV or Excel"""
+    tasks = filter_tasks(Task.objects.order_by('-created_at'), request.GET, request.user)
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        raise Http404('Unknown export format')
+    return exports.export_response(
+        tasks, TASK_COLUMNS, f'tasks-{timezone.localdate():%Y-%m-%d}', file_format, 'Tasks'
+    )
+
+
 
 
 
@@ -95,42 +75,49 @@ def task_detail(request, pk):
     return render(request, 'task_manager/task_detail.html', context)
 
 
+@user_passes_test(is_staff_user)
+@login_required
+def task_attachments_zip(request, pk):
+    """Download the task's attachment and all additional attachments as one ZIP"""
+    task = get_object_or_404(Task, pk=pk)
+    archive = zipstream.ZipStream()
+    if task.attachment:
+        archive.add_file(os.path.basename(task.attachment.name), task.attachment, task.created_at)
+    for attachment in task.attachments.only('file', 'uploaded_at'):
+        archive.add_file(os.path.basename(attachment.file.name), attachment.file, attachment.uploaded_at)
+    return zipstream.streaming_response(archive, f'task-{task.pk}-attachments.zip')
+
+
 @user_passes_test(is_staff_user)
 @login_required
 
 
 def task_dashboard(request):
     """Staff dashboard with task statistics"""
-    # Get all counts in single queries using conditional aggregation
-    
-    # Get status counts in one query
-    status_counts = Task.objects.aggregate(
-        total=Count('id'),
-        pending=Count('id', filter=Q(status='pending')),
-        in_progress=Count('id', filter=Q(status='in_progress')),
-        completed=Count('id', filter=Q(status='completed')),
-        cancelled=Count('id', filter=Q(status='cancelled'))
-    )
-    
-    # Get overdue count
-    overdue_count = Task.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).count()
-    
-    # Get counts by priority
-    tasks_by_priority = Task.objects.values('priority').annotate(count=Count('id'))
+    # Status, priority and overdue counts come from the materialized counters
+    counters, _ = stats.read()
+    status_counts = {
+        'total': counters[stats.TASKS_TOTAL],
+        **{status: counters[stats.task_status_counter(status)] for status, _ in Task.STATUS_CHOICES},
+    }
+    overdue_count = counters[stats.TASKS_OVERDUE]
+    tasks_by_priority = [
+        {'priority': priority, 'count': counters[stats.task_priority_counter(priority)]}
+        for priority, _ in Task.PRIORITY_CHOICES
+    ]
     
-    # Get counts by category
-    tasks_by_category = Task.objects.values('category__name').annotate(count=Count('id'))
+    # Get counts by category, from the denormalized TaskCategory counts
+    tasks_by_category = [
+        {'category__name': name, 'count': count}
+        for name, count in TaskCategory.objects.filter(task_count__gt=0).values_list('name', 'task_count')
+    ]
     
     # Recent tasks
     recent_tasks = Task.objects.all().select_related('category', 'assigned_to').order_by('-created_at')[:10]
     
     # Overdue tasks
     overdue_tasks = Task.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
+        is_overdue=True
     ).select_related('category', 'assigned_to')[:10]
     
     # My assigned tasks
@@ -227,38 +214,95 @@ def task_cancel(request, pk):
     })
 
 
+@user_passes_test(is_staff_user)
+@login_required
+@inspect_uploads(allowed_types=['csv', 'xlsx'])
+def task_import(request):
+    """Create tasks in bulk from a CSV/XLSX sheet"""
+    result = None
+    if request.method == 'POST':
+        form = TaskImportForm(request.POST, request.FILES)
+        report_rejections(request, form)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_tasks(
+                    upload, upload.name,
+                    skip_invalid=form.cleaned_data['skip_invalid'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except SheetError as error:
+                form.add_error('file', str(error))
+            else:
+                if result.created:
+                    messages.success(request, f'Imported {result.created} of {result.rows} tasks.')
+                elif result.error_count:
+                    messages.error(request, f'{result.error_count} of {result.rows} rows have errors; nothing was imported.')
+                else:
+                    messages.info(request, f'All {result.valid} rows are valid.')
+    else:
+        form = TaskImportForm()
+
+    return render(request, 'task_manager/task_import.html', {
+        'form': form,
+        'result': result,
+        'title': 'Import Tasks',
+    })
+
+
 
 
 def services_view(request):
     """Display all service categories and their subcategories"""
-    try:
-        # Get all active service categories with their active subcategories
-        service_categories = ServiceCategory.objects.filter(
-            is_active=True
-        ).prefetch_related(
-            'subcategories'
-        ).order_by('order', 'name')
-        
-        # Debug info
-        print(f"Found {service_categories.count()} service categories")
-        for category in service_categories:
-            print(f"Category: {category.name}, Subcategories: {category.subcategories.filter(is_active=True).count()}")
-        
-        context = {
-            'service_categories': service_categories,
-        }
-        return render(request, 'public/services.html', context)
-        
-    except Exception as e:
-        print(f"Error in services_view: {e}")
-        context = {
-            'service_categories': [],
-            'error': str(e)
-        }
-        return render(request, 'public/services.html', context)
+    context = {
+        'service_categories': catalog.get_catalog().categories,
+    }
+    return render(request, 'public/services.html', context)
 
+submission_limiters = {
+    key: SlidingWindowLimiter(limit, window)
+    for key, (limit, window) in settings.TASK_SUBMISSION_RATE_LIMITS.items()
+}
+
+def submission_refused(key, value):
+    """Seconds to wait if the per-key rate limit for public task submissions refuses this one, else None"""
+    limiter = submission_limiters.get(key)
+    if limiter is None or limiter.allow(value):
+        return None
+    return limiter.retry_after(value)
+
+def rate_limited_submission(request, form, retry_after):
+    messages.error(request, "Too many submissions. Please wait a while before trying again.")
+    response = render(request, 'task_manager/task_submission_form.html', {
+        'form': form,
+        'selected_category': catalog.get_catalog().service(form.initial.get('category')),
+    }, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+def limit_submissions_by_ip(view):
+    """Refuse POSTs over the per-IP limit before the upload in their body is received"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # Nothing here may touch request.POST: CSRF checking and the upload
+        # handlers further in are what read the body
+        retry_after = submission_refused('ip', client_ip(request)) if request.method == 'POST' else None
+        if retry_after is not None:
+            return rate_limited_submission(request, TaskSubmissionForm(initial=request.GET.dict()), retry_after)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+@limit_submissions_by_ip
+@inspect_uploads(max_size=settings.TASK_ATTACHMENT_MAX_SIZE)
 def task_submission(request):
     """Handle task submission with category pre-selection"""
+    email = request.POST.get('customer_email', '').strip().casefold() if request.method == 'POST' else ''
+    retry_after = submission_refused('email', email) if email else None
+    if retry_after is not None:
+        # Unbound, so no errors show, but with everything the customer typed
+        # (and the same submission token, so a later retry stays idempotent)
+        return rate_limited_submission(request, TaskSubmissionForm(initial=request.POST.dict()), retry_after)
+
     category_id = request.GET.get('category') or request.POST.get('category')
     service_category_id = request.GET.get('service_category') or request.POST.get('service_category')
     
@@ -267,27 +311,40 @@ def task_submission(request):
     
     # Get the selected category if provided
     if category_id:
-        try:
-            selected_category = get_object_or_404(TaskCategory, id=category_id, is_active=True)
-            initial_data['category'] = selected_category
-        except:
+        selected_category = catalog.get_catalog().service(category_id)
+        if selected_category:
+            initial_data['category'] = selected_category.id
+        else:
             messages.error(request, "Invalid service category selected.")
     
     if request.method == 'POST':
         form = TaskSubmissionForm(request.POST, request.FILES)
+        report_rejections(request, form)
+        if form.is_valid() and form.find_duplicate():
+            # A retry or double-click of a submission we already have
+            messages.info(request, "We already received this request; there is no need to submit it again.")
+            return redirect('task_manager:task-submission-success')
         if form.is_valid():
             try:
                 task = form.save(commit=False)
                 
                 # Set category based on what was selected
                 if selected_category:
-                    task.category = selected_category
+                    task.category_id = selected_category.id
                 
                 # Set price from category if available
                 if not task.price and task.category and task.category.price:
                     task.price = task.category.price
                 
-                task.save()
+                try:
+                    with transaction.atomic():
+                        task.save()
+                except IntegrityError:
+                    # The same token won a race with this request
+                    if form.find_duplicate():
+                        return redirect('task_manager:task-submission-success')
+                    raise
+                auto_assign(task)
                 messages.success(request, f"Your task '{task.title}' has been submitted successfully! We'll contact you soon.")
                 return redirect('task_manager:task-submission-success')
                 
@@ -316,25 +373,24 @@ def task_submission_success(request):
 
 
 def service_categories(request):
-    categories = ServiceCategory.objects.filter(is_active=True)
-    # .prefetch_related('active_subcategories')
     context = {
-        'service_categories': categories,
+        'service_categories': catalog.get_catalog().categories,
     }
     return render(request, 'public/service_categories.html', context)
 
 
 
 def services(request, category_id):
-    category = get_object_or_404(ServiceCategory, id=category_id, is_active=True)
-    services = category.active_subcategories.all()
+    category = catalog.get_catalog().category(category_id)
+    if category is None:
+        raise Http404("No active service category with this id")
     
     # Get popular services from this category (you might need to adjust this logic)
     # popular_services = services.filter(is_popular=True)[:4]
     
     context = {
         'category': category,
-        'services': services,
+        'services': category.services,
         # 'popular_services': popular_services,
     }
     return render(request, 'public/services.html', context)
@@ -4,6 +4,16 @@ from django.contrib.auth.models import User
 from django.utils.text import slugify
 from .models import Category, TemplateDocument, TemplateDownload, TemplateRating
 from django.utils.html import format_html
+from django.db import transaction
+from django.utils import timezone
+from django.template.response import TemplateResponse
+from django.urls import path
+from core import background
+from core.admin_tools import HighVolumeAdminMixin, recent_date_filter
+from dashboard import stats
+from .duplicates import DISTANCE, duplicate_clusters
+from .utils import generate_missing_previews, templates_zip_response
+from .exports import export_downloads_csv, export_downloads_xlsx, export_ratings_csv, export_ratings_xlsx
 
 
 admin.site.register(User, UserAdmin)
@@ -11,17 +21,15 @@ admin.site.register(User, UserAdmin)
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'description', 'is_active', 'has_template_link', 'created_at']
+    list_display = [
+        'name', 'slug', 'description', 'is_active', 'template_count',
+        'verified_template_count', 'has_template_link', 'created_at'
+    ]
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
     list_editable = ['is_active']
     prepopulated_fields = {'slug': ('name',)}  # Now this will work
 
-    def task_count(self, obj):
-        return obj.tasks.count()
-    task_count.short_description = 'Tasks'
-
-    
     def has_template_link(self, obj):
         return bool(obj.template_link)
 
@@ -57,6 +65,8 @@ class TemplateDocumentAdmin(admin.ModelAdmin):
     search_fields = ['title', 'description', 'tags']
     readonly_fields = ['uploaded_at', 'verified_at', 'updated_at', 'download_count']
     date_hierarchy = 'uploaded_at'
+    actions = ['verify_templates', 'download_zip']
+    change_list_template = 'admin/template_manager/templatedocument/change_list.html'
     
     fieldsets = (
         ('Basic Information', {
@@ -83,16 +93,66 @@ class TemplateDocumentAdmin(admin.ModelAdmin):
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
 
+    def verify_templates(self, request, queryset):
+        now = timezone.now()
+        with transaction.atomic():
+            pending = list(queryset.filter(is_verified=False).values_list('id', 'category_id', 'is_active'))
+            ids = [template_id for template_id, _, _ in pending]
+            TemplateDocument.objects.filter(pk__in=ids).update(
+                is_verified=True, verified_by=request.user, verified_at=now, updated_at=now
+            )
+            # queryset.update() bypasses the count signal handlers
+            stats.apply_deltas({
+                (stats.TEMPLATES_PENDING, None): -sum(1 for _, _, is_active in pending if is_active)
+            })
+            Category.refresh_counts({category_id for _, category_id, _ in pending})
+            background.defer(generate_missing_previews, ids)
+        self.message_user(request, f'{len(ids)} templates verified.')
+    verify_templates.short_description = "Verify selected templates"
+
+    def download_zip(self, request, queryset):
+        templates = queryset.select_related('category').only('file', 'updated_at', 'category__name')
+        return templates_zip_response(templates.iterator(), 'templates.zip', folders=True)
+    download_zip.short_description = "Download selected templates as ZIP"
+
+    def get_urls(self):
+        return [
+            path('duplicates/', self.admin_site.admin_view(self.duplicates_view),
+                 name='template_manager_templatedocument_duplicates'),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        """Groups of active templates whose previews look alike"""
+        distance = request.GET.get('distance', '')
+        distance = min(int(distance), 16) if distance.isdigit() else DISTANCE
+        clusters = duplicate_clusters(distance)
+        templates = TemplateDocument.objects.filter(
+            pk__in=[pk for cluster in clusters for pk in cluster]
+        ).select_related('category', 'uploaded_by').in_bulk()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Near-duplicate templates',
+            'distance': distance,
+            'clusters': [[templates[pk] for pk in cluster if pk in templates] for cluster in clusters],
+            'unhashed': TemplateDocument.objects.filter(is_active=True, preview_hash='').count(),
+        }
+        return TemplateResponse(request, 'admin/template_manager/templatedocument/duplicates.html', context)
+
 
 @admin.register(TemplateDownload)
-class TemplateDownloadAdmin(admin.ModelAdmin):
+class TemplateDownloadAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
     list_display = ['template', 'downloaded_by', 'downloaded_at']
-    list_filter = ['downloaded_at']
+    list_filter = [recent_date_filter('downloaded_at')]
+    list_select_related = ['template', 'downloaded_by']
+    raw_id_fields = ['template', 'downloaded_by']
     readonly_fields = ['downloaded_at']
+    actions = [export_downloads_csv, export_downloads_xlsx]
 
 
 @admin.register(TemplateRating)
 class TemplateRatingAdmin(admin.ModelAdmin):
     list_display = ['template', 'user', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
+    actions = [export_ratings_csv, export_ratings_xlsx]
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Near-duplicate templates, found by perceptual hash.
+
+Each template's preview rendition is reduced to a 64-bit difference
+hash (dHash): the image is shrunk to 9x8 grey pixels and every bit says
+whether a pixel is brighter than its right-hand neighbour. Re-saved,
+resized, recoloured or lightly edited copies of a design land within a
+few bits of each other, so near-duplicates are templates whose hashes
+differ in at most a handful of bits (Hamming distance).
+
+Lookups go through a multi-index hash table of every active template's
+hash (see MultiIndex), which only compares against hashes sharing a
+band with the query instead of the whole library. It is built once per
+process and rebuilt when its version changes: the count and highest id
+of the hashed active templates, read from the database, so every worker
+sees new uploads, plus a key that update_hashes() bumps in the shared
+Django cache (see CACHES), for hashes that change in place.
+near_duplicates() re-checks its matches against the database, so a
+template deactivated since the build is never offered.
+duplicate_clusters() groups the library by adding
+templates to a fresh index one at a time, each joining the clusters of
+the matches already in it.
+"""
+import importlib.util
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from PIL import Image, UnidentifiedImageError
+
+HASH_SIZE = 8
+# Hashes at most this many bits apart (of 64) count as near-duplicates
+DISTANCE = 6
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp')
+VERSION_KEY = 'template_manager:preview_hashes:version'
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    image.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+    if image.mode in ('RGBA', 'LA', 'PA', 'P'):
+        # Transparent areas count as white paper
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image)
+    pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + column
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class MultiIndex:
+    """
+    Hashes split into max_distance + 1 bands, with a table per band.
+    Two hashes at most max_distance bits apart must agree exactly on at
+    least one band (they can't differ in all of them), so a search only
+    checks the hashes that share a band with the query.
+    """
+
+    def __init__(self, max_distance=DISTANCE):
+        self.max_distance = max_distance
+        count = max_distance + 1
+        self.bands, shift = [], 0
+        for band in range(count):
+            width = 64 // count + (band < 64 % count)
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [{} for _ in self.bands]
+
+    def add(self, value, item):
+        for (shift, mask), table in zip(self.bands, self.tables):
+            table.setdefault((value >> shift) & mask, []).append((value, item))
+
+    def search(self, value, max_distance=None):
+        """(distance, item) for every item within max_distance (at most the index's) of value"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        distances = {}
+        for (shift, mask), table in zip(self.bands, self.tables):
+            for other, item in table.get((value >> shift) & mask, ()):
+                if item not in distances:
+                    distances[item] = hamming(value, other)
+        return [(distance, item) for item, distance in distances.items() if distance <= max_distance]
+
+
+def hash_source(template):
+    """
+    The rendition a template's hash is taken from: image files themselves,
+    else the uploaded thumbnail, else the page 1 preview of a PDF.
+    None when there is only a generated placeholder, which would make
+    unrelated templates look alike.
+    """
+    extension = template.get_file_extension()
+    if extension in IMAGE_EXTENSIONS:
+        return template.file
+    if template.thumbnail:
+        return template.thumbnail
+    if extension == 'pdf' and template.preview_image and importlib.util.find_spec('pdf2image'):
+        return template.preview_image
+    return None
+
+
+def compute_hash(template):
+    """Hex preview hash of template, or '' if it has no usable rendition"""
+    source = hash_source(template)
+    if not source:
+        return ''
+    try:
+        with source.open('rb') as f, Image.open(f) as image:
+            return f'{dhash(image):016x}'
+    except (OSError, UnidentifiedImageError, ValueError):
+        return ''
+
+
+def update_hashes(template_ids):
+    """(Re)hash the given templates; returns {id: hash}"""
+    from .models import TemplateDocument
+
+    hashes = {}
+    for template in TemplateDocument.objects.filter(pk__in=template_ids).only(
+        'file', 'thumbnail', 'preview_image', 'preview_hash',
+    ):
+        hashes[template.pk] = compute_hash(template)
+        if hashes[template.pk] != template.preview_hash:
+            # update() rather than save(): only the hash changes
+            TemplateDocument.objects.filter(pk=template.pk).update(preview_hash=hashes[template.pk])
+    invalidate()
+    return hashes
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate():
+    """Make every process rebuild its hash index on next use, once the current transaction commits"""
+    transaction.on_commit(bump_version)
+
+
+class LibraryIndex:
+    """MultiIndex of the active templates' hashes, reloaded when the version changes"""
+
+    def __init__(self):
+        self.version = None
+        self.index = None
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        from .models import TemplateDocument
+
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # add() so concurrent first requests agree on one version
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        hashed = TemplateDocument.objects.filter(is_active=True).exclude(preview_hash='').aggregate(
+            count=Count('id'), last=Max('id'),
+        )
+        return version, hashed['count'], hashed['last']
+
+    def get(self):
+        version = self.current_version()
+        if self.index is not None and self.version == version:
+            return self.index
+        with self._lock:
+            if self.index is None or self.version != version:
+                self.index = build_index(active_hashes())
+                self.version = version
+            return self.index
+
+
+_library = LibraryIndex()
+
+
+def active_hashes():
+    """(id, hash) of every active template with a hash"""
+    from .models import TemplateDocument
+
+    rows = TemplateDocument.objects.filter(is_active=True).exclude(preview_hash='').values_list('id', 'preview_hash')
+    return ((pk, int(value, 16)) for pk, value in rows.order_by('id').iterator())
+
+
+def build_index(hashes, max_distance=DISTANCE):
+    index = MultiIndex(max_distance)
+    for pk, value in hashes:
+        index.add(value, pk)
+    return index
+
+
+def near_duplicates(template, distance=DISTANCE):
+    """Other active templates within distance of template's hash, closest first, as (distance, template)"""
+    from .models import TemplateDocument
+
+    if not template.preview_hash:
+        return []
+    # The shared index answers up to DISTANCE; wider searches need their own
+    index = _library.get() if distance <= DISTANCE else build_index(active_hashes(), distance)
+    matches = {
+        pk: bits for bits, pk in index.search(int(template.preview_hash, 16), distance)
+        if pk != template.pk
+    }
+    # The index may be a little stale; the database has the final word
+    templates = TemplateDocument.objects.filter(pk__in=matches, is_active=True).select_related('category')
+    return sorted(((matches[t.pk], t) for t in templates), key=lambda match: (match[0], match[1].pk))
+
+
+def duplicate_clusters(distance=DISTANCE):
+    """Lists of ids of active templates that are near-duplicates of each other, largest first"""
+    parent = {}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    index = MultiIndex(distance)
+    for pk, value in active_hashes():
+        parent[pk] = pk
+        for _, other in index.search(value):
+            root, other_root = find(pk), find(other)
+            if root != other_root:
+                parent[max(root, other_root)] = min(root, other_root)
+        index.add(value, pk)
+
+    clusters = {}
+    for pk in parent:
+        clusters.setdefault(find(pk), []).append(pk)
+    return sorted((ids for ids in clusters.values() if len(ids) > 1), key=lambda ids: (-len(ids), ids[0]))
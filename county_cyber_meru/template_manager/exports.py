@@ -0,0 +1,85 @@
+"""
+Download log and rating exports (see core.exports), with the filters
+their export views accept.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.exports import Column, export_action
+
+DOWNLOAD_COLUMNS = [
+    Column('Downloaded', 'downloaded_at', width=17),
+    Column('Template ID', 'template_id'),
+    Column('Template', 'template__title', width=30),
+    Column('Category', 'template__category__name', width=20),
+    Column('User', 'downloaded_by__username', width=15),
+    Column('IP Address', 'ip_address', width=15),
+    Column('User Agent', 'user_agent', width=40),
+]
+
+RATING_COLUMNS = [
+    Column('Rated', 'created_at', width=17),
+    Column('Template ID', 'template_id'),
+    Column('Template', 'template__title', width=30),
+    Column('Category', 'template__category__name', width=20),
+    Column('User', 'user__username', width=15),
+    Column('Rating', 'rating'),
+    Column('Comment', 'comment', width=40),
+]
+
+export_downloads_csv = export_action(DOWNLOAD_COLUMNS, 'downloads', 'csv', 'Downloads')
+export_downloads_xlsx = export_action(DOWNLOAD_COLUMNS, 'downloads', 'xlsx', 'Downloads')
+export_ratings_csv = export_action(RATING_COLUMNS, 'ratings', 'csv', 'Ratings')
+export_ratings_xlsx = export_action(RATING_COLUMNS, 'ratings', 'xlsx', 'Ratings')
+
+
+def day_start(value):
+    """Start of the YYYY-MM-DD day value, or None if it isn't a real date"""
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        # Well formed but impossible, like 2024-02-30
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+
+
+def filter_activity(queryset, params, date_field, user_field):
+    """
+    Apply the export parameters: template, category and user ids, days
+    (the last n days) or since/until (YYYY-MM-DD, inclusive).
+    """
+    for param, lookup in (('template', 'template_id'), ('category', 'template__category_id'), ('user', user_field)):
+        value = params.get(param, '')
+        if value.isdigit():
+            queryset = queryset.filter(**{lookup: value})
+    # Out of range values (more days than datetime can count back, a
+    # ?until= on the last representable day) are ignored
+    days = params.get('days', '')
+    if days.isdigit():
+        try:
+            queryset = queryset.filter(**{f'{date_field}__gte': timezone.now() - timedelta(days=int(days))})
+        except OverflowError:
+            pass
+    since = day_start(params.get('since'))
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    until = day_start(params.get('until'))
+    if until:
+        try:
+            queryset = queryset.filter(**{f'{date_field}__lt': until + timedelta(days=1)})
+        except OverflowError:
+            pass
+    return queryset
+
+
+def filter_downloads(downloads, params):
+    return filter_activity(downloads, params, 'downloaded_at', 'downloaded_by_id')
+
+
+def filter_ratings(ratings, params):
+    rating = params.get('rating', '')
+    if rating.isdigit():
+        ratings = ratings.filter(rating=rating)
+    return filter_activity(ratings, params, 'created_at', 'user_id')
@@ -1,5 +1,7 @@
 from django import forms
+from categories.forms import CachedModelChoiceField
 from .models import TemplateDocument,Category
+from .imposition import BLEED, SHEET_SIZES
 
 class TemplateUploadForm(forms.ModelForm):
     class Meta:
@@ -43,6 +45,12 @@ class TemplateUploadForm(forms.ModelForm):
 
 
 class TemplateUploadForm(forms.ModelForm):
+    category = CachedModelChoiceField(
+        'template_categories',
+        queryset=Category.objects.filter(is_active=True),
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
     class Meta:
         model = TemplateDocument
         fields = [
@@ -87,7 +95,6 @@ class TemplateUploadForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['file'].widget.attrs.update({'class': 'form-control'})
         self.fields['thumbnail'].widget.attrs.update({'class': 'form-control'})
-        self.fields['category'].queryset = Category.objects.filter(is_active=True)
         
         # Make thumbnail optional
         self.fields['thumbnail'].required = False
@@ -130,4 +137,47 @@ class CategoryForm(forms.ModelForm):
         else:
             if Category.objects.filter(name=name).exists():
                 raise forms.ValidationError('A category with this name already exists.')
-        return name
\ No newline at end of file
+        return name
+
+
+class TemplateMergeForm(forms.Form):
+    """CSV of records to merge into a PowerPoint/Word template"""
+    records = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+        help_text="CSV with a header row naming the template's fields; one document is made per row"
+    )
+    name_field = forms.ChoiceField(
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text="Field used to name each document (defaults to the CSV's first column)"
+    )
+
+    def __init__(self, *args, fields=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['name_field'].choices = [('', 'First column')] + [(field, field) for field in fields]
+
+
+class ImpositionForm(forms.Form):
+    """Sheet layout for printing a template many-up"""
+    sheet = forms.ChoiceField(widget=forms.Select(attrs={'class': 'form-control'}))
+    width = forms.FloatField(
+        min_value=5, label='Item width (mm)', widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5'})
+    )
+    height = forms.FloatField(
+        min_value=5, label='Item height (mm)', widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5'})
+    )
+    bleed = forms.FloatField(
+        min_value=0, max_value=10, initial=BLEED, label='Bleed (mm)',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5'})
+    )
+    copies = forms.IntegerField(
+        min_value=1, max_value=5000, required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'One full sheet'}),
+        help_text="Leave empty for one full sheet"
+    )
+    crop_marks = forms.BooleanField(required=False, initial=True, label="Crop marks")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        labels = dict(TemplateDocument.PAPER_SIZES)
+        self.fields['sheet'].choices = [(size, labels[size]) for size in SHEET_SIZES]
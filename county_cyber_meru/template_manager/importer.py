@@ -0,0 +1,221 @@
+"""
+Reading template libraries for `manage.py import_templates`.
+
+A library is a directory or a ZIP archive. The first folder of each
+file's path names its Category; files at the top level go to the
+category given on the command line. Metadata for files can be given in
+sidecars next to them:
+
+- metadata.csv or metadata.json in a folder, with one entry per file
+  (a `file` column/key naming the file relative to that folder)
+- <file>.json beside a single file
+
+Recognised keys are title, description, tags, price, paper_size and
+template_category; anything missing falls back to defaults derived
+from the file name.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.files import File
+
+from core.uploads import HEAD_BYTES, file_extension, matches_signature
+
+READ_SIZE = 64 * 1024
+FOLDER_SIDECARS = ('metadata.csv', 'metadata.json')
+METADATA_KEYS = ('title', 'description', 'tags', 'price', 'paper_size', 'template_category')
+
+DOCUMENT_TYPES = {
+    'pub': 'PUB',
+    'pdf': 'PDF',
+    'xls': 'XLS',
+    'xlsx': 'XLS',
+    'doc': 'DOC',
+    'docx': 'DOC',
+    'ppt': 'PPT',
+    'pptx': 'PPT',
+    'jpg': 'JPG',
+    'jpeg': 'JPG',
+    'png': 'PNG',
+    'psd': 'PSD',
+    'ai': 'AI',
+}
+
+
+def document_type(extension):
+    return DOCUMENT_TYPES.get(extension, 'OTHER')
+
+
+class DirectorySource:
+    """Files below a directory, named by their path relative to it"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def names(self):
+        for directory, subdirectories, files in os.walk(self.root):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.startswith('.'))
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def open(self, name):
+        return open(os.path.join(self.root, *name.split('/')), 'rb')
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    """Members of a ZIP archive; each thread reads through its own handle"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def archive(self):
+        handle = getattr(self._local, 'archive', None)
+        if handle is None:
+            handle = self._local.archive = zipfile.ZipFile(self.path)
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def names(self):
+        for info in sorted(self.archive().infolist(), key=lambda info: info.filename):
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/'):
+                continue
+            if any(part.startswith('.') for part in name.split('/')):
+                continue
+            yield name
+
+    def open(self, name):
+        return self.archive().open(name)
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles.clear()
+
+
+def open_source(path):
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    raise ValueError(f'{path} is neither a directory nor a ZIP archive')
+
+
+def read_sidecar(source, name):
+    """{file name relative to the sidecar's folder: metadata} from a metadata.csv/json"""
+    with source.open(name) as f:
+        text = io.TextIOWrapper(f, encoding='utf-8-sig').read()
+    if name.lower().endswith('.csv'):
+        rows = csv.DictReader(io.StringIO(text))
+    else:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            rows = [{'file': key, **value} for key, value in data.items()]
+        else:
+            rows = data
+    entries = {}
+    for row in rows:
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        filename = row.get('file') or row.get('filename')
+        if filename:
+            entries[filename.strip()] = {key: row[key] for key in METADATA_KEYS if row.get(key) not in (None, '')}
+    return entries
+
+
+def collect(source):
+    """(file names to import, {file name: sidecar metadata})"""
+    files, folder_sidecars, file_sidecars = [], [], set()
+    for name in source.names():
+        basename = os.path.basename(name).lower()
+        if basename in FOLDER_SIDECARS:
+            folder_sidecars.append(name)
+        elif basename.endswith('.json'):
+            file_sidecars.add(name)
+        else:
+            files.append(name)
+
+    metadata = {}
+    for sidecar in folder_sidecars:
+        folder = os.path.dirname(sidecar)
+        for filename, values in read_sidecar(source, sidecar).items():
+            name = f'{folder}/{filename}' if folder else filename
+            metadata.setdefault(name, {}).update(values)
+    for name in files:
+        if f'{name}.json' in file_sidecars:
+            with source.open(f'{name}.json') as f:
+                values = json.load(io.TextIOWrapper(f, encoding='utf-8-sig'))
+            metadata.setdefault(name, {}).update(
+                {key: values[key] for key in METADATA_KEYS if values.get(key) not in (None, '')}
+            )
+    return files, metadata
+
+
+def parse_tags(value):
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(tag) for tag in value)
+    return ', '.join(tag.strip() for tag in str(value or '').split(',') if tag.strip())[:200]
+
+
+def parse_price(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value).replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def default_title(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return ' '.join(stem.replace('_', ' ').replace('-', ' ').split())[:200] or stem[:200]
+
+
+def inspect(source, name):
+    """
+    Hash and check one file, reading it once. Returns (sha256, size,
+    problem); problem is None for files that can be imported.
+    """
+    extension = file_extension(name)
+    if extension not in settings.ALLOWED_FILE_TYPES:
+        return '', 0, f'.{extension or "?"} files are not accepted'
+    limit = settings.UPLOAD_SIZE_LIMITS.get(extension, settings.UPLOAD_SIZE_LIMITS.get('default'))
+    digest = hashlib.sha256()
+    head = b''
+    size = 0
+    with source.open(name) as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b''):
+            if len(head) < HEAD_BYTES:
+                head += chunk[:HEAD_BYTES - len(head)]
+            digest.update(chunk)
+            size += len(chunk)
+    if not size:
+        return '', 0, 'file is empty'
+    if limit and size > limit:
+        return '', size, 'file is larger than the upload limit'
+    if not matches_signature(extension, head):
+        return '', size, f'not a valid .{extension} file'
+    return digest.hexdigest(), size, None
+
+
+def store(source, template, name):
+    """Copy the library file into storage as template.file (not saved to the database)"""
+    with source.open(name) as f:
+        template.file.save(os.path.basename(name), File(f), save=False)
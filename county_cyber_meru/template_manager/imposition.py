@@ -0,0 +1,169 @@
+"""
+N-up imposition: business cards, stickers and labels laid out many to
+a sheet for the shop printer.
+
+Grid works out how many items of a finished size, each with its bleed,
+fit on a sheet (trying it portrait and landscape) and centres them.
+impose() then builds a PDF with as many sheets as the copies need. Each
+source image is embedded once and every cell places that same image,
+scaled to cover the cell's bleed box, so a sheet of 40 labels costs one
+image plus 40 short drawing instructions. Crop marks are the same on
+every sheet and are built once.
+
+Sizes are in millimetres.
+"""
+import io
+import math
+
+from PIL import Image, UnidentifiedImageError
+
+from core import pdf
+
+MM = 72 / 25.4
+# Portrait sheet sizes of the paper_size choices the shop prints on
+SHEET_SIZES = {
+    'A3': (297, 420),
+    'A4': (210, 297),
+    'A5': (148, 210),
+    'LETTER': (215.9, 279.4),
+    'LEGAL': (215.9, 355.6),
+}
+# Finished size of one item for a template's paper_size
+ITEM_SIZES = {'BUSINESS': (85, 55), **SHEET_SIZES}
+BLEED = 3
+MARGIN = 10
+MARK_LENGTH = 5
+MARK_OFFSET = 2  # from the outer bleed edge to the start of a crop mark
+MARK_WIDTH = 0.25
+
+
+class ImpositionError(ValueError):
+    pass
+
+
+class Grid:
+    """Positions of items on a sheet, in points from the bottom left"""
+
+    def __init__(self, sheet, item, bleed=BLEED, margin=MARGIN, gap=0):
+        if sheet not in SHEET_SIZES:
+            raise ImpositionError(f'Unknown sheet size {sheet}')
+        self.sheet, self.item, self.bleed, self.gap = sheet, item, bleed, gap
+        cell_width, cell_height = item[0] + 2 * bleed, item[1] + 2 * bleed
+
+        def fit(width, height):
+            columns = math.floor((width - 2 * margin + gap) / (cell_width + gap))
+            rows = math.floor((height - 2 * margin + gap) / (cell_height + gap))
+            return max(columns, 0), max(rows, 0)
+
+        portrait = SHEET_SIZES[sheet]
+        landscape = portrait[::-1]
+        # Portrait unless landscape fits more
+        (self.columns, self.rows), (width, height) = max(
+            (fit(*portrait), portrait), (fit(*landscape), landscape),
+            key=lambda option: option[0][0] * option[0][1],
+        )
+        if not self.columns * self.rows:
+            raise ImpositionError(
+                f'A {item[0]:g} x {item[1]:g} mm item with {bleed:g} mm bleed does not fit on {sheet}'
+            )
+        self.width, self.height = width * MM, height * MM
+        self.pitch = ((cell_width + gap) * MM, (cell_height + gap) * MM)
+        grid_width = self.columns * cell_width + (self.columns - 1) * gap
+        grid_height = self.rows * cell_height + (self.rows - 1) * gap
+        # Bottom left of the grid's outer bleed edge
+        self.left = (width - grid_width) / 2 * MM
+        self.bottom = (height - grid_height) / 2 * MM
+        self.top = self.bottom + grid_height * MM
+        self.right = self.left + grid_width * MM
+
+    @property
+    def per_sheet(self):
+        return self.columns * self.rows
+
+    def trim_boxes(self):
+        """(x, y, width, height) of each item's finished area, row by row from the top left"""
+        bleed = self.bleed * MM
+        width, height = self.item[0] * MM, self.item[1] * MM
+        for row in range(self.rows):
+            y = self.top - (row + 1) * self.pitch[1] + self.gap * MM + bleed
+            for column in range(self.columns):
+                yield self.left + column * self.pitch[0] + bleed, y, width, height
+
+    def crop_marks(self):
+        """Fragment with marks outside the grid in line with every trim edge"""
+        fragment = pdf.Fragment()
+        start, end = MARK_OFFSET * MM, (MARK_OFFSET + MARK_LENGTH) * MM
+        xs, ys = set(), set()
+        for x, y, width, height in self.trim_boxes():
+            xs.update((x, x + width))
+            ys.update((y, y + height))
+        for x in sorted(xs):
+            fragment.line(x, self.top + start, x, self.top + end, MARK_WIDTH)
+            fragment.line(x, self.bottom - start, x, self.bottom - end, MARK_WIDTH)
+        for y in sorted(ys):
+            fragment.line(self.left - start, y, self.left - end, y, MARK_WIDTH)
+            fragment.line(self.right + start, y, self.right + end, y, MARK_WIDTH)
+        return fragment
+
+    def describe(self):
+        return (
+            f'{self.per_sheet}-up on {self.sheet}, {self.item[0]:g} x {self.item[1]:g} mm, '
+            f'{self.bleed:g} mm bleed'
+        )
+
+
+def image_size(data):
+    """(width, height) in pixels of image file data"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError):
+        raise ImpositionError('The source is not an image')
+
+
+def orient(item, size):
+    """item (width, height) turned to match the orientation of an image of size"""
+    width, height = item
+    if (width > height) != (size[0] > size[1]) and width != height:
+        return height, width
+    return item
+
+
+def impose(sources, grid, copies=None, crop_marks=True, title=''):
+    """
+    PDF of sheets carrying copies of each source image (file data) in
+    turn; by default enough copies to fill one sheet.
+    """
+    document = pdf.Document(title)
+    try:
+        images = [document.add_image(data) for data in sources]
+    except (UnidentifiedImageError, OSError):
+        raise ImpositionError('The source is not an image')
+    if not images:
+        raise ImpositionError('Nothing to impose')
+    if copies is None:
+        copies = math.ceil(grid.per_sheet / len(images))
+    items = [image for image in images for _ in range(copies)]
+    boxes = list(grid.trim_boxes())
+    marks = grid.crop_marks() if crop_marks else None
+    bleed = grid.bleed * MM
+    sheets = math.ceil(len(items) / grid.per_sheet)
+
+    for sheet in range(sheets):
+        page = document.add_page((grid.width, grid.height))
+        if marks:
+            page.draw(marks)
+        for (x, y, width, height), image in zip(boxes, items[sheet * grid.per_sheet:]):
+            box = (x - bleed, y - bleed, width + 2 * bleed, height + 2 * bleed)
+            # Cover the bleed box, keeping the image's proportions; the overflow is clipped
+            scale = max(box[2] / image.width, box[3] / image.height)
+            placed_width, placed_height = image.width * scale, image.height * scale
+            page.image(
+                image, box[0] + (box[2] - placed_width) / 2, box[1] + (box[3] - placed_height) / 2,
+                placed_width, placed_height, clip=box,
+            )
+        page.text(
+            grid.width / 2, 4 * MM, f'{title}  |  {grid.describe()}  |  sheet {sheet + 1} of {sheets}'.strip(' |'),
+            size=6, align='center', color='#808080',
+        )
+    return document.to_bytes()
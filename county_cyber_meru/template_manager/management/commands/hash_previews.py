@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from template_manager.duplicates import DISTANCE, duplicate_clusters, update_hashes
+from template_manager.models import TemplateDocument
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Compute the perceptual hashes used to spot near-duplicate templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rehash every template, not only those without a hash')
+        parser.add_argument('--report', action='store_true', help='List the near-duplicate clusters afterwards')
+        parser.add_argument('--distance', type=int, default=DISTANCE, help='Maximum differing bits (of 64) for --report')
+
+    def handle(self, *args, **options):
+        templates = TemplateDocument.objects.order_by('pk')
+        if not options['all']:
+            templates = templates.filter(preview_hash='')
+        ids = list(templates.values_list('pk', flat=True))
+        hashed = 0
+        for start in range(0, len(ids), BATCH_SIZE):
+            hashes = update_hashes(ids[start:start + BATCH_SIZE])
+            hashed += sum(1 for value in hashes.values() if value)
+        self.stdout.write(self.style.SUCCESS(
+            f'Hashed {hashed} of {len(ids)} templates ({len(ids) - hashed} have no image to hash)'
+        ))
+
+        if options['report']:
+            clusters = duplicate_clusters(options['distance'])
+            titles = dict(TemplateDocument.objects.filter(
+                pk__in=[pk for cluster in clusters for pk in cluster]
+            ).values_list('pk', 'title'))
+            for cluster in clusters:
+                self.stdout.write(' ~ '.join(f'#{pk} {titles[pk]}' for pk in cluster))
+            self.stdout.write(f'{len(clusters)} groups of near-duplicates')
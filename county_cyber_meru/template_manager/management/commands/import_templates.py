@@ -0,0 +1,201 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.uploads import file_extension
+from dashboard import stats
+from template_manager import importer
+from template_manager.duplicates import update_hashes
+from template_manager.models import Category, TemplateDocument
+from template_manager.utils import generate_template_preview
+
+
+class Checkpoint:
+    """
+    Append-only record of the files already handled, one JSON line each.
+    Lines are written after their batch commits, so a rerun skips them.
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = set()
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)['file'])
+                    except (ValueError, KeyError):
+                        # A line cut short by an interruption
+                        continue
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, entries):
+        for name, status, template_id in entries:
+            self.file.write(json.dumps({'file': name, 'status': status, 'id': template_id}) + '\n')
+            self.done.add(name)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class Command(BaseCommand):
+    help = 'Import a library of template files from a directory or ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or ZIP archive; top-level folders become categories')
+        parser.add_argument('--user', help='Username recorded as uploader (default: first superuser)')
+        parser.add_argument('--category', help='Category for files at the top level of the source')
+        parser.add_argument('--paper-size', default='A4', help='Paper size for files without one in their metadata')
+        parser.add_argument('--verified', action='store_true', help='Mark imported templates as verified')
+        parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1))
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--checkpoint', help='Progress file (default: <source>.import-checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+
+    def handle(self, *args, **options):
+        self.user = self.get_user(options['user'])
+        self.options = options
+        self.paper_sizes = dict(TemplateDocument.PAPER_SIZES)
+        self.template_categories = dict(TemplateDocument.TEMPLATE_CATEGORIES)
+        if options['paper_size'] not in self.paper_sizes:
+            raise CommandError(f"Unknown paper size {options['paper_size']}")
+        self.categories = {}
+        self.now = timezone.now()
+
+        try:
+            source = importer.open_source(options['source'])
+        except ValueError as error:
+            raise CommandError(error)
+        checkpoint_path = options['checkpoint'] or options['source'].rstrip('/\\') + '.import-checkpoint'
+        checkpoint = Checkpoint(checkpoint_path, options['restart'])
+        self.totals = {'created': 0, 'duplicate': 0, 'skipped': 0}
+
+        try:
+            files, self.metadata = importer.collect(source)
+            pending = [name for name in files if name not in checkpoint.done]
+            if len(pending) < len(files):
+                self.stdout.write(f'Resuming: {len(files) - len(pending)} of {len(files)} files already done')
+            with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+                for start in range(0, len(pending), options['batch_size']):
+                    batch = pending[start:start + options['batch_size']]
+                    checkpoint.record(self.import_batch(source, pool, batch))
+                    self.stdout.write(f'{start + len(batch)}/{len(pending)} files processed')
+        finally:
+            checkpoint.close()
+            source.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {created} templates ({duplicate} duplicates, {skipped} skipped)'.format(**self.totals)
+        ))
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {username}')
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No superuser exists; pass --user')
+        return user
+
+    def get_category(self, name):
+        folder = name.split('/')[0] if '/' in name else self.options['category']
+        if not folder:
+            return None
+        if folder not in self.categories:
+            self.categories[folder], _ = Category.objects.get_or_create(name=folder[:100])
+        return self.categories[folder]
+
+    def skip(self, name, reason):
+        self.stderr.write(f'Skipped {name}: {reason}')
+        self.totals['skipped'] += 1
+        return (name, 'skipped', None)
+
+    def build(self, name, sha256, category):
+        values = self.metadata.get(name, {})
+        paper_size = str(values.get('paper_size', '')).upper()
+        template_category = str(values.get('template_category', '')).upper()
+        return TemplateDocument(
+            title=str(values.get('title') or importer.default_title(name))[:200],
+            description=str(values.get('description', '')),
+            category=category,
+            document_type=importer.document_type(file_extension(name)),
+            paper_size=paper_size if paper_size in self.paper_sizes else self.options['paper_size'],
+            template_category=template_category if template_category in self.template_categories else 'OTHER',
+            file_sha256=sha256,
+            uploaded_by=self.user,
+            tags=importer.parse_tags(values.get('tags')),
+            price=importer.parse_price(values.get('price')),
+            is_verified=self.options['verified'],
+            verified_by=self.user if self.options['verified'] else None,
+            verified_at=self.now if self.options['verified'] else None,
+        )
+
+    def import_batch(self, source, pool, batch):
+        """Import one batch of files; returns its checkpoint entries"""
+        entries = []
+        inspected = list(pool.map(lambda name: importer.inspect(source, name), batch))
+
+        # De-duplicate against the database and within the batch by digest
+        digests = {sha256 for sha256, _, problem in inspected if not problem}
+        existing = dict(
+            TemplateDocument.objects.filter(file_sha256__in=digests).values_list('file_sha256', 'pk')
+        )
+        new = []
+        for name, (sha256, size, problem) in zip(batch, inspected):
+            if problem:
+                entries.append(self.skip(name, problem))
+            elif sha256 in existing:
+                self.totals['duplicate'] += 1
+                entries.append((name, 'duplicate', existing[sha256]))
+            else:
+                category = self.get_category(name)
+                if category is None:
+                    entries.append(self.skip(name, 'not in a category folder (see --category)'))
+                    continue
+                existing[sha256] = None
+                new.append((name, self.build(name, sha256, category)))
+        if not new:
+            return entries
+
+        # Workers only read files and write storage; the database stays on this thread
+        list(pool.map(lambda item: importer.store(source, item[1], item[0]), new))
+        templates = [template for _, template in new]
+        try:
+            with transaction.atomic():
+                TemplateDocument.objects.bulk_create(templates)
+                # bulk_create bypasses the signal handlers keeping the counters
+                deltas = Counter()
+                for template in templates:
+                    deltas.update(stats.template_contribution({
+                        'is_active': True, 'is_verified': template.is_verified,
+                        'uploaded_by_id': template.uploaded_by_id,
+                    }))
+                stats.apply_deltas(deltas)
+                Category.refresh_counts({t.category_id for t in templates})
+        except Exception:
+            for template in templates:
+                template.file.storage.delete(template.file.name)
+            raise
+
+        previews = list(pool.map(generate_template_preview, templates))
+        for template, preview_path in zip(templates, previews):
+            template.preview_image = preview_path or ''
+        TemplateDocument.objects.bulk_update([t for t in templates if t.preview_image], ['preview_image'])
+        update_hashes([t.pk for t in templates])
+
+        self.totals['created'] += len(templates)
+        entries.extend((name, 'created', template.pk) for name, template in new)
+        return entries
@@ -0,0 +1,68 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from template_manager.imposition import (
+    BLEED, ITEM_SIZES, MARGIN, SHEET_SIZES, Grid, ImpositionError, image_size, impose, orient,
+)
+from template_manager.models import TemplateDocument
+from template_manager.utils import imposition_source
+
+
+class Command(BaseCommand):
+    help = 'Lay a card, sticker or label template out many-up on print-ready PDF sheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sources', nargs='+',
+            help='A template id, or image files (several are placed one after another, e.g. rendered merge outputs)'
+        )
+        parser.add_argument('--sheet', choices=list(SHEET_SIZES), default='A4')
+        parser.add_argument('--size', help="Item size in mm as WIDTHxHEIGHT (default from the template's paper size)")
+        parser.add_argument('--bleed', type=float, default=BLEED, help='Bleed in mm')
+        parser.add_argument('--margin', type=float, default=MARGIN, help='Unprintable sheet margin in mm')
+        parser.add_argument('--gap', type=float, default=0, help='Extra space between items in mm')
+        parser.add_argument('--copies', type=int, help='Copies of each source (default one full sheet)')
+        parser.add_argument('--no-crop-marks', action='store_true')
+        parser.add_argument('-o', '--output', help='PDF file to write')
+
+    def handle(self, *args, **options):
+        sources, title, paper_size = self.load(options['sources'])
+        try:
+            if options['size']:
+                match = re.fullmatch(r'\s*([\d.]+)\s*[xX]\s*([\d.]+)\s*', options['size'])
+                if not match:
+                    raise ImpositionError(f"Invalid size {options['size']}; use e.g. 85x55")
+                item = (float(match.group(1)), float(match.group(2)))
+            else:
+                item = orient(ITEM_SIZES.get(paper_size, ITEM_SIZES['BUSINESS']), image_size(sources[0]))
+            grid = Grid(options['sheet'], item, options['bleed'], options['margin'], options['gap'])
+            data = impose(sources, grid, options['copies'], not options['no_crop_marks'], title)
+        except ImpositionError as error:
+            raise CommandError(error)
+
+        output = options['output'] or f'{slugify(title) or "sheets"}-{grid.per_sheet}up-{grid.sheet.lower()}.pdf'
+        with open(output, 'wb') as f:
+            f.write(data)
+        self.stdout.write(self.style.SUCCESS(f'{grid.describe()}: wrote {output}'))
+
+    def load(self, references):
+        """(image data list, title, paper size)"""
+        if len(references) == 1 and references[0].isdigit():
+            template = TemplateDocument.objects.filter(pk=references[0]).first()
+            if template is None:
+                raise CommandError(f'No template with id {references[0]}')
+            source = imposition_source(template)
+            if source is None:
+                raise CommandError('This template has no image or rendered page to impose')
+            return [source], template.title, template.paper_size
+        sources = []
+        for path in references:
+            try:
+                with open(path, 'rb') as f:
+                    sources.append(f.read())
+            except OSError as error:
+                raise CommandError(error)
+        return sources, os.path.splitext(os.path.basename(references[0]))[0], None
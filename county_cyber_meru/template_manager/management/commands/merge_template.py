@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from template_manager.merge import MergeError, MergeTemplate, merge, read_records, write_bundle
+from template_manager.models import TemplateDocument
+from template_manager.utils import load_merge_template, merge_workers
+
+
+class Command(BaseCommand):
+    help = 'Mail merge a PowerPoint/Word template with a CSV of records into a ZIP of documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('template', help='Template id, or path to a .pptx/.docx file')
+        parser.add_argument('records', nargs='?', help='CSV file with a header row naming the fields')
+        parser.add_argument('-o', '--output', help='ZIP file to write (default <template>-merged.zip)')
+        parser.add_argument('--name-field', help='Field used to name each document (default first column)')
+        parser.add_argument('--workers', type=int, help='Rendering processes (default MERGE_WORKERS)')
+        parser.add_argument(
+            '--benchmark', type=int, metavar='N',
+            help='Time merging N synthetic records, serially and on the pool, without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            merge_template, stem = self.load(options['template'])
+        except MergeError as error:
+            raise CommandError(error)
+        parsed = time.perf_counter() - started
+        self.stdout.write(f"Fields: {', '.join(merge_template.fields)}")
+        workers = options['workers'] or merge_workers()
+
+        if options['benchmark']:
+            self.benchmark(merge_template, options['benchmark'], workers, parsed)
+            return
+
+        if not options['records']:
+            raise CommandError('Give a CSV file of records, or --benchmark N')
+        try:
+            with open(options['records'], 'rb') as f:
+                records = read_records(f, merge_template.fields)
+        except (OSError, MergeError) as error:
+            raise CommandError(error)
+
+        output = options['output'] or f'{stem}-merged.zip'
+        started = time.perf_counter()
+        with open(output, 'wb') as f:
+            count = write_bundle(merge_template, records, f, options['name_field'], workers)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {count} documents into {output} in {elapsed:.1f}s ({count / elapsed:,.0f} records/s)'
+        ))
+
+    def load(self, reference):
+        if reference.isdigit():
+            template = TemplateDocument.objects.filter(pk=reference).first()
+            if template is None:
+                raise MergeError(f'No template with id {reference}')
+            return load_merge_template(template), slugify(template.title) or 'template'
+        try:
+            with open(reference, 'rb') as f:
+                data = f.read()
+        except OSError as error:
+            raise MergeError(error)
+        return MergeTemplate(data), os.path.splitext(os.path.basename(reference))[0]
+
+    def benchmark(self, merge_template, count, workers, parsed):
+        records = [
+            {field: f'{field.title()} {index}' for field in merge_template.fields}
+            for index in range(count)
+        ]
+        self.stdout.write(f'Parsed the template in {parsed * 1000:.1f} ms')
+        for label, pool_size in (('Serial', 1), (f'{workers} workers', workers)):
+            started = time.perf_counter()
+            size = sum(len(document) for document in merge(merge_template, records, pool_size))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label}: {count} records in {elapsed:.2f}s, {count / elapsed:,.0f} records/s '
+                f'({size / count / 1024:.0f} KB each)'
+            )
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from template_manager.sprites import FOLDER
+
+
+class Command(BaseCommand):
+    help = 'Delete grid page sprite sheets older than --days; any still in use are rebuilt on request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        try:
+            _, names = default_storage.listdir(FOLDER)
+        except FileNotFoundError:
+            names = []
+        count = 0
+        for name in names:
+            path = f'{FOLDER}/{name}'
+            if default_storage.get_modified_time(path) < cutoff:
+                default_storage.delete(path)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} sprite sheets'))
@@ -0,0 +1,273 @@
+"""
+Mail merge of PowerPoint (.pptx) and Word (.docx) templates.
+
+A template marks the personalised text with placeholders such as
+{{ Name }} or {{guest_name}}, and a CSV file supplies one record per
+output document, its header naming the fields. Field names match
+ignoring case, spaces and underscores.
+
+The template is parsed once. Every slide, document body, header and
+footer that holds a placeholder is loaded with lxml, placeholders that
+PowerPoint or Word split across several runs are joined into one, and
+the part is serialised back and cut into literal byte segments around
+the fields. The untouched parts are compressed once, up front.
+Producing a document for a record is then a matter of joining the
+segments with the record's escaped values, compressing those few parts
+and packing them with the precompressed rest.
+The merge_template command spreads large batches over a process pool;
+each worker receives the parsed template once, when it starts. The web
+download renders serially while it streams (utils.merge_zip_response).
+
+Django-free, so the pool's worker processes only import this module.
+"""
+import csv
+import io
+import multiprocessing
+import re
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from core.zipstream import STORED_EXTENSIONS
+
+PLACEHOLDER = re.compile(r'\{\{\s*([^{}<>]+?)\s*\}\}')
+PLACEHOLDER_BYTES = re.compile(PLACEHOLDER.pattern.encode())
+# Parts whose text can hold placeholders
+MERGE_PARTS = re.compile(
+    r'^(ppt/(slides|notesSlides)/[^/]+\.xml'
+    r'|word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml)$'
+)
+DRAWING = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+WORD = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+PARAGRAPHS = {f'{{{DRAWING}}}p', f'{{{WORD}}}p'}
+TEXTS = {f'{{{DRAWING}}}t', f'{{{WORD}}}t'}
+PRESERVE_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+XML_ESCAPES = {'"': '&quot;'}
+STORED, DEFLATED = 0, 8
+UTF8_NAMES = 0x0800
+# Below this many records, starting worker processes costs more than it saves
+POOL_THRESHOLD = 500
+
+
+class MergeError(ValueError):
+    pass
+
+
+def field_key(name):
+    """Normalised field name: 'Guest_Name ' and 'guest name' are the same field"""
+    return ' '.join(name.replace('_', ' ').split()).casefold()
+
+
+def join_split_placeholders(root):
+    """
+    Move each placeholder that spans several text runs of a paragraph into
+    its first run, so it appears whole in the serialised XML.
+    """
+    for paragraph in root.iter(*PARAGRAPHS):
+        nodes = [node for node in paragraph.iter(*TEXTS) if node.text]
+        text = ''.join(node.text for node in nodes)
+        if '{{' not in text:
+            continue
+        starts, offset = [], 0
+        for node in nodes:
+            starts.append(offset)
+            offset += len(node.text)
+
+        def node_at(position):
+            index = len(starts) - 1
+            while starts[index] > position:
+                index -= 1
+            return index
+
+        # Backwards, so the offsets of earlier runs stay valid
+        for match in reversed(list(PLACEHOLDER.finditer(text))):
+            first, last = node_at(match.start()), node_at(match.end() - 1)
+            if first == last:
+                continue
+            head = nodes[first].text[:match.start() - starts[first]]
+            nodes[first].text = head + match.group(0)
+            for node in nodes[first + 1:last]:
+                node.text = ''
+            nodes[last].text = nodes[last].text[match.end() - starts[last]:]
+            for node in (nodes[first], nodes[last]):
+                if node.tag == f'{{{WORD}}}t':
+                    node.set(PRESERVE_SPACE, 'preserve')
+
+
+def compile_part(data):
+    """
+    Segments of a part as [literal, field, literal, field, ..., literal],
+    or None if the part has no placeholders.
+    """
+    if b'{{' not in data:
+        return None
+    # Uploaded templates are untrusted: no entity expansion or network access
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+    root = etree.fromstring(data, parser)
+    join_split_placeholders(root)
+    serialised = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    segments = PLACEHOLDER_BYTES.split(serialised)
+    if len(segments) == 1:
+        return None
+    for index in range(1, len(segments), 2):
+        segments[index] = field_key(segments[index].decode('utf-8'))
+    return segments
+
+
+def deflate(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+
+
+class Part:
+    """One file of the template package, compressed once if it never changes"""
+
+    def __init__(self, name, date_time, content, segments=None):
+        self.name = name.encode('utf-8')
+        self.dos_time, self.dos_date = dos_datetime(date_time)
+        self.method = STORED if name.rsplit('.', 1)[-1].lower() in STORED_EXTENSIONS else DEFLATED
+        self.segments = segments
+        if segments is None:
+            self.entry = self.compress(content)
+
+    def compress(self, content):
+        """(crc, size, payload) of content as stored in the archive"""
+        payload = deflate(content) if self.method == DEFLATED else content
+        return zlib.crc32(content), len(content), payload
+
+    def fill(self, values):
+        filled = self.segments[:]
+        for index in range(1, len(filled), 2):
+            filled[index] = values[filled[index]]
+        return self.compress(b''.join(filled))
+
+
+def pack(entries):
+    """A ZIP archive of (part, (crc, size, payload)) entries"""
+    chunks, directory, offset = [], [], 0
+    for part, (crc, size, payload) in entries:
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 20, UTF8_NAMES, part.method, part.dos_time, part.dos_date,
+            crc, len(payload), size, len(part.name), 0,
+        ) + part.name
+        directory.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, UTF8_NAMES, part.method, part.dos_time, part.dos_date,
+            crc, len(payload), size, len(part.name), 0, 0, 0, 0, 0, offset,
+        ) + part.name)
+        chunks += (header, payload)
+        offset += len(header) + len(payload)
+    central = b''.join(directory)
+    end = struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(directory), len(directory), len(central), offset, 0)
+    return b''.join(chunks) + central + end
+
+
+class MergeTemplate:
+    """A parsed template, ready to be filled in for any number of records"""
+
+    def __init__(self, data):
+        try:
+            source = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            raise MergeError('The template is not a PowerPoint or Word document')
+        names = source.namelist()
+        if 'ppt/presentation.xml' in names:
+            self.extension = 'pptx'
+        elif 'word/document.xml' in names:
+            self.extension = 'docx'
+        else:
+            raise MergeError('The template is not a PowerPoint or Word document')
+
+        self.parts = []
+        fields = {}
+        for info in source.infolist():
+            content = source.read(info)
+            segments = compile_part(content) if MERGE_PARTS.match(info.filename) else None
+            if segments:
+                fields.update(dict.fromkeys(segments[1::2]))
+            self.parts.append(Part(info.filename, info.date_time, content, segments))
+        # Field keys in order of first appearance
+        self.fields = list(fields)
+        if not self.fields:
+            raise MergeError('The template has no {{ placeholders }} to fill in')
+
+    def render(self, record):
+        """The document for record, a dict of field keys to values"""
+        values = {
+            key: escape(str(record.get(key) or ''), XML_ESCAPES).encode('utf-8') for key in self.fields
+        }
+        # Only the parts with placeholders are rebuilt; the rest are copied as compressed at parse time
+        return pack((part, part.fill(values) if part.segments else part.entry) for part in self.parts)
+
+
+def read_records(file, fields):
+    """Records of a CSV file (binary) as dicts keyed by field_key, checked to cover fields"""
+    try:
+        rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        header = next(rows, None)
+        if not header:
+            raise MergeError('The CSV file is empty')
+        keys = [field_key(name) for name in header]
+        missing = [field for field in fields if field not in keys]
+        if missing:
+            raise MergeError(f"The CSV file has no column for: {', '.join(missing)}")
+        records = [dict(zip(keys, row)) for row in rows if any(cell.strip() for cell in row)]
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise MergeError(f'Could not read the CSV file: {error}')
+    if not records:
+        raise MergeError('The CSV file has no records')
+    return records
+
+
+def output_name(record, number, extension, name_field=None):
+    """'0001-Jane Doe.pptx': the record number, then its name_field (or first) value"""
+    value = record.get(field_key(name_field)) if name_field else next(iter(record.values()), '')
+    value = re.sub(r'[^\w\- .]+', '', value or '').strip(' .')[:60]
+    return f'{number:04d}-{value}.{extension}' if value else f'{number:04d}.{extension}'
+
+
+_template = None
+
+
+def init_worker(template):
+    """Pool initializer: keep the parsed template for every record this process renders"""
+    global _template
+    _template = template
+
+
+def render_record(record):
+    return _template.render(record)
+
+
+def merge(template, records, workers=1):
+    """Yield the merged document for each record, in order"""
+    if workers <= 1 or len(records) < POOL_THRESHOLD:
+        for record in records:
+            yield template.render(record)
+        return
+
+    workers = min(workers, len(records))
+    # spawn, not fork: forking a process holding database connections and threads isn't safe
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker, initargs=(template,),
+    ) as pool:
+        yield from pool.map(render_record, records, chunksize=max(1, len(records) // (workers * 4)))
+
+
+def write_bundle(template, records, file, name_field=None, workers=1):
+    """Write a ZIP of every record's document to file; returns the number written"""
+    count = 0
+    # The documents are zips already
+    with zipfile.ZipFile(file, 'w', zipfile.ZIP_STORED, allowZip64=True) as bundle:
+        for count, (record, document) in enumerate(zip(records, merge(template, records, workers)), start=1):
+            bundle.writestr(output_name(record, count, template.extension, name_field), document)
+    return count
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:20
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_templates(apps, schema_editor):
+    Category = apps.get_model('template_manager', 'Category')
+    TemplateDocument = apps.get_model('template_manager', 'TemplateDocument')
+
+    def active_templates(**filters):
+        return Coalesce(Subquery(
+            TemplateDocument.objects.filter(category=OuterRef('pk'), is_active=True, **filters)
+            .order_by().values('category').annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ), 0)
+
+    Category.objects.update(
+        template_count=active_templates(),
+        verified_template_count=active_templates(is_verified=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('template_manager', '0003_category_template_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='template_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Templates'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='verified_template_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Verified'),
+        ),
+        migrations.RunPython(count_templates, migrations.RunPython.noop),
+    ]
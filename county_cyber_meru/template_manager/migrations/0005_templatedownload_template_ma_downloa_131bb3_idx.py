@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('template_manager', '0004_category_template_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='templatedownload',
+            index=models.Index(fields=['downloaded_at'], name='template_ma_downloa_131bb3_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('template_manager', '0005_templatedownload_template_ma_downloa_131bb3_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templatedocument',
+            name='file_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
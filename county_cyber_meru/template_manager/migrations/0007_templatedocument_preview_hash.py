@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('template_manager', '0006_templatedocument_file_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templatedocument',
+            name='preview_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import DEFERRED
 from django.utils.text import slugify
 from django.utils import timezone
 from django.conf import settings
@@ -6,9 +7,12 @@ from django.urls import reverse
 from .utils import generate_template_preview, delete_template_preview
 import os
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
+from core import counters
+
+class Category(counters.CountColumnsMixin, models.Model):
+    count_fields = ('template_count', 'verified_template_count')
 
-class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
@@ -20,6 +24,10 @@ class Category(models.Model):
         help_text="Optional: Link to template (Canvas, Google Docs, etc.)"
     )
 
+    # Denormalized counts of active templates, maintained by the signal handlers below
+    template_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Templates')
+    verified_template_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Verified')
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
@@ -35,6 +43,18 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('category-detail', kwargs={'slug': self.slug})
 
+    @classmethod
+    def refresh_counts(cls, pks=None):
+        """Recompute the denormalized counts, for all rows or only pks"""
+        queryset = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return counters.refresh(
+            queryset,
+            template_count=counters.count_of(TemplateDocument, 'category', is_active=True),
+            verified_template_count=counters.count_of(
+                TemplateDocument, 'category', is_active=True, is_verified=True
+            ),
+        )
+
 def template_upload_path(instance, filename):
     """Generate upload path for template files"""
     ext = filename.split('.')[-1]
@@ -88,8 +108,11 @@ class TemplateDocument(models.Model):
     template_category = models.CharField(max_length=20, choices=TEMPLATE_CATEGORIES)
     
     file = models.FileField(upload_to=template_upload_path)
+    file_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
     preview_image = models.ImageField(upload_to='previews/', blank=True, null=True)
+    # 64-bit difference hash of the preview, hex; see duplicates.py
+    preview_hash = models.CharField(max_length=16, blank=True, editable=False)
     
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploaded_templates')
     verified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, 
@@ -123,6 +146,15 @@ class TemplateDocument(models.Model):
     def get_absolute_url(self):
         return reverse('template_manager:template-detail', kwargs={'pk': self.pk})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so signal handlers can tell what changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
     def get_file_extension(self):
         """Get file extension without the dot"""
         if self.file:
@@ -201,6 +233,10 @@ class TemplateDocument(models.Model):
         if self.is_verified and not self.verified_at:
             self.verified_at = timezone.now()
         
+        # Uploads inspected by core.uploads arrive already hashed
+        if self.file and not self.file._committed:
+            self.file_sha256 = getattr(self.file.file, 'sha256', '')
+        
         # Call super save first to get an ID
         is_new = self.pk is None
         super().save(*args, **kwargs)
@@ -234,6 +270,9 @@ class TemplateDownload(models.Model):
 
     class Meta:
         ordering = ['-downloaded_at']
+        indexes = [
+            models.Index(fields=['downloaded_at']),
+        ]
 
     def __str__(self):
         return f"{self.template.title} - {self.downloaded_by.username}"
@@ -286,3 +325,51 @@ def generate_template_preview_on_save(sender, instance, created, **kwargs):
 
 
 
+
+
+def category_template_counts(values):
+    """Counts a TemplateDocument row with these values adds to its Category"""
+    if not values or not values['is_active']:
+        return {}
+    return {'template_count': 1, 'verified_template_count': int(values['is_verified'])}
+
+def template_count_values(instance):
+    return {
+        'category_id': instance.category_id,
+        'is_active': instance.is_active,
+        'is_verified': instance.is_verified,
+    }
+
+@receiver(pre_save, sender=TemplateDocument)
+def remember_category_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counts_previous = counters.previous_values(
+            instance, ('category_id', 'is_active', 'is_verified')
+        )
+
+@receiver(post_save, sender=TemplateDocument)
+def update_category_counts(sender, instance, created, raw=False, **kwargs):
+    """Keep Category.template_count and verified_template_count in step"""
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counts_previous', None)
+    new = template_count_values(instance)
+    if old and old['category_id'] != new['category_id']:
+        counters.increment(
+            Category.objects.filter(pk=old['category_id']),
+            counters.contribution_delta(category_template_counts(old), {})
+        )
+        old = None
+    counters.increment(
+        Category.objects.filter(pk=new['category_id']),
+        counters.contribution_delta(category_template_counts(old), category_template_counts(new))
+    )
+    # The saved state is the baseline for the next save of this instance
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **new}
+
+@receiver(post_delete, sender=TemplateDocument)
+def remove_category_counts(sender, instance, **kwargs):
+    counters.increment(
+        Category.objects.filter(pk=instance.category_id),
+        counters.contribution_delta(category_template_counts(template_count_values(instance)), {})
+    )
@@ -0,0 +1,246 @@
+"""
+On-demand previews of any page of a template.
+
+The stored preview only covers page 1. render_page() renders page N of
+a PDF (with pdf2image, when it and poppler are installed) or frame N of
+a multi-page image such as a TIFF, at one of WIDTHS; a requested width
+is rounded up to the next of them so a handful of sizes serve every
+screen.
+
+Rendered pages live in a disk cache (PageCache) under
+PAGE_PREVIEW_DIR, kept under PAGE_PREVIEW_CACHE_BYTES by evicting the
+least recently used files. A hit bumps the file's modification time, so
+eviction can order files by it, and each process keeps a running total
+of what it has added so it only rescans the directory when the budget
+may have been crossed. Cache names carry the template file's hash, so a
+replaced file never serves stale pages.
+
+Requests for the same page at the same time are coalesced
+(SingleFlight): the first renders, the rest wait for its result.
+page_preview() hands back an open file, opened while the cache still
+had it (an open file survives eviction), or the freshly rendered bytes,
+so a concurrent put() evicting the page can't fail the request.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+WIDTHS = (200, 400, 800, 1200, 1600)
+QUALITY = 85
+# Evicting down to this share of the budget leaves room for the next few pages
+EVICT_TO = 0.9
+
+
+class PagePreviewError(Exception):
+    pass
+
+
+class PageNotFound(PagePreviewError):
+    pass
+
+
+class PreviewUnavailable(PagePreviewError):
+    """The file type can't be rendered page by page here"""
+
+
+def snap_width(width):
+    """The smallest of WIDTHS at least width, or the largest"""
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def fit_width(image, width):
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image).convert('RGB')
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+    return image
+
+
+def render_pdf_page(path, page, width):
+    try:
+        from pdf2image import convert_from_path
+        from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError, PDFInfoNotInstalledError
+    except ImportError:
+        raise PreviewUnavailable('PDF page previews need pdf2image and poppler')
+    try:
+        images = convert_from_path(path, first_page=page, last_page=page, size=(width, None))
+    except PDFInfoNotInstalledError:
+        raise PreviewUnavailable('PDF page previews need poppler')
+    except (PDFPageCountError, PDFSyntaxError) as error:
+        raise PageNotFound(error)
+    if not images:
+        raise PageNotFound(f'The document has no page {page}')
+    return images[0]
+
+
+def render_image_page(path, page, width):
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', (width, width * 4))
+            try:
+                image.seek(page - 1)
+            except EOFError:
+                raise PageNotFound(f'The image has no page {page}')
+            # Detached from the file, which closes on the way out
+            return image.copy()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        raise PageNotFound(error)
+
+
+def render_page(path, extension, page, width):
+    """JPEG bytes of page (from 1) of the file at path, width pixels wide at most"""
+    if extension == 'pdf':
+        image = render_pdf_page(path, page, width)
+    elif extension in ('jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'tif', 'tiff'):
+        image = render_image_page(path, page, width)
+    else:
+        raise PreviewUnavailable(f'No page previews for .{extension} files')
+    output = io.BytesIO()
+    fit_width(image, width).save(output, 'JPEG', quality=QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class PageCache:
+    """Files in directory, least recently used first out once over budget bytes"""
+
+    def __init__(self, directory, budget):
+        self.directory = directory
+        self.budget = budget
+        self._lock = threading.Lock()
+        # Bytes on disk as of the last scan, plus what this process added since
+        self._estimate = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self, name):
+        """A cached file opened for reading, marked as just used; None on a miss"""
+        try:
+            f = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return None
+        os.utime(f.fileno())
+        return f
+
+    def put(self, name, data):
+        """Store data atomically under name and evict as needed; returns its path"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        path = self.path(name)
+        os.replace(temporary, path)
+        with self._lock:
+            if self._estimate is None:
+                self._estimate = self.scan_size()
+            else:
+                self._estimate += len(data)
+            if self._estimate > self.budget:
+                self._estimate = self.evict(keep=path)
+        return path
+
+    def entries(self):
+        """(mtime, size, path) of every cached file"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def scan_size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete the least recently used files until under EVICT_TO of the budget; returns the bytes left"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.budget * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function())
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def page_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache(settings.PAGE_PREVIEW_DIR, settings.PAGE_PREVIEW_CACHE_BYTES)
+        return _cache
+
+
+def cache_name(template, page, width):
+    # Older uploads have no hash; a replaced file gets a new name too
+    version = template.file_sha256[:16] or hashlib.sha1(template.file.name.encode('utf-8')).hexdigest()[:16]
+    return f'{template.pk}-{version}-p{page}-w{width}.jpg'
+
+
+def page_preview(template, page, width):
+    """Binary file of the JPEG of page of template, from the cache or rendered now"""
+    cache = page_cache()
+    name = cache_name(template, page, snap_width(width))
+    cached = cache.open(name)
+    if cached:
+        return cached
+
+    def render():
+        # Another request may have finished it while this one waited its turn
+        cached = cache.open(name)
+        if cached:
+            with cached:
+                return cached.read()
+        data = render_page(template.file.path, template.get_file_extension(), page, snap_width(width))
+        cache.put(name, data)
+        return data
+
+    return io.BytesIO(_flights.do(name, render))
@@ -0,0 +1,154 @@
+"""
+Sprite sheets of the previews on template grid pages.
+
+Instead of one image request per card, a page's previews are packed into
+atlases of up to SHEET_SIZE cells, each preview fitted into a CELL sized
+cell, and the cards show their cell through CSS background offsets.
+
+A sheet is named after a digest of its members' versions (id, preview
+and thumbnail names, last save and preview hash), in page order, so it
+never goes stale: when any member's preview changes, the page asks for
+a sheet under a new name. Offsets follow from a member's position alone,
+so a page can be rendered before its sheet exists. Until it does, the
+page links to a URL carrying the sheet's name and member ids, signed so
+they can't be tampered with; the first request for it, in whichever
+process, builds the sheet from the database and saves it under sprites/
+in default storage. After that pages link to the stored file directly. The prune_sprites command deletes old
+sheets; one that is still in use is rebuilt on its next request.
+"""
+import hashlib
+import io
+import math
+import re
+import threading
+
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, UnidentifiedImageError
+
+CELL = (160, 200)
+SHEET_SIZE = 48
+FOLDER = 'sprites'
+QUALITY = 80
+
+_signer = signing.Signer(salt='template_manager.sprites')
+_build_lock = threading.Lock()
+
+
+def sprite_source(template):
+    """The smallest rendition of a template: the preview, bounded to 800x1000, else the thumbnail"""
+    return template.preview_image or template.thumbnail or None
+
+
+def member_version(template):
+    return ':'.join((
+        str(template.pk), template.preview_image.name or '', template.thumbnail.name or '',
+        f'{template.updated_at.timestamp():.6f}' if template.updated_at else '', template.preview_hash,
+    ))
+
+
+def sheet_name(key):
+    return f'{FOLDER}/{key}.jpg'
+
+
+def sheet_token(key, members):
+    """Signed '<key>.<id>.<id>...' naming a sheet and its members, in cell order"""
+    return _signer.sign('.'.join([key, *map(str, members)]))
+
+
+def read_token(token):
+    """(key, member ids) of a sheet_token(), or None if it is forged or malformed"""
+    try:
+        key, *members = _signer.unsign(token).split('.')
+    except signing.BadSignature:
+        return None
+    if not re.fullmatch(r'[0-9a-f]{40}', key) or not members or not all(pk.isdigit() for pk in members):
+        return None
+    return key, [int(pk) for pk in members]
+
+
+class SpriteSheet:
+    """One atlas: its members' ids in cell order and where each cell is"""
+
+    def __init__(self, templates):
+        self.members = [template.pk for template in templates]
+        self.columns = math.ceil(math.sqrt(len(self.members)))
+        digest = hashlib.sha1('\n'.join(member_version(t) for t in templates).encode('utf-8'))
+        self.key = digest.hexdigest()
+
+    def offsets(self):
+        """{id: (x, y)} of each member's cell, in pixels"""
+        return {
+            pk: (index % self.columns * CELL[0], index // self.columns * CELL[1])
+            for index, pk in enumerate(self.members)
+        }
+
+    def url(self):
+        name = sheet_name(self.key)
+        if default_storage.exists(name):
+            return default_storage.url(name)
+        # Not built yet: the URL tells the view what to build
+        return reverse('template_manager:template-sprite', args=[sheet_token(self.key, self.members)])
+
+
+def page_sprites(templates):
+    """
+    {id: (sheet url, x, y)} for each template on a page that has a preview;
+    templates without one are left out and keep their icon.
+    """
+    members = [template for template in templates if sprite_source(template)]
+    positions = {}
+    for start in range(0, len(members), SHEET_SIZE):
+        sheet = SpriteSheet(members[start:start + SHEET_SIZE])
+        url = sheet.url()
+        for pk, (x, y) in sheet.offsets().items():
+            positions[pk] = (url, x, y)
+    return positions
+
+
+def render_sheet(templates, columns, rows):
+    """JPEG of templates' previews, each fitted and centred in its cell on white; None leaves a cell blank"""
+    atlas = Image.new('RGB', (columns * CELL[0], rows * CELL[1]), 'white')
+    for index, template in enumerate(templates):
+        source = sprite_source(template) if template else None
+        if not source:
+            continue
+        try:
+            with source.open('rb') as f, Image.open(f) as image:
+                # Let JPEG decode at a reduced scale; the cell is far smaller than the preview
+                image.draft('RGB', (CELL[0] * 2, CELL[1] * 2))
+                if image.mode in ('RGBA', 'LA', 'PA', 'P'):
+                    image = image.convert('RGBA')
+                image.thumbnail(CELL, Image.Resampling.LANCZOS)
+                x = index % columns * CELL[0] + (CELL[0] - image.width) // 2
+                y = index // columns * CELL[1] + (CELL[1] - image.height) // 2
+                atlas.paste(image, (x, y), image if image.mode == 'RGBA' else None)
+        except (OSError, UnidentifiedImageError, ValueError):
+            # A broken preview leaves its cell blank rather than failing the page
+            continue
+    output = io.BytesIO()
+    atlas.save(output, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def build_sheet(token):
+    """The stored sheet's bytes, built first if needed; None if the token isn't valid"""
+    from .models import TemplateDocument
+
+    sheet = read_token(token)
+    if sheet is None:
+        return None
+    key, members = sheet
+    name = sheet_name(key)
+    with _build_lock:
+        if default_storage.exists(name):
+            with default_storage.open(name, 'rb') as f:
+                return f.read()
+        templates = TemplateDocument.objects.in_bulk(members)
+        columns = math.ceil(math.sqrt(len(members)))
+        # Deleted members keep their (blank) cells so the page's offsets still line up
+        data = render_sheet([templates.get(pk) for pk in members], columns, math.ceil(len(members) / columns))
+        default_storage.save(name, ContentFile(data))
+    return data
@@ -17,6 +17,10 @@ urlpatterns = [
     path('template/<int:pk>/view-debug/', views.template_view_debug, name='template-view-debug'),
     path('template/<int:pk>/system-view/', views.template_system_view, name='template-system-view'),
     path('template/<int:pk>/open-system/', views.template_open_system, name='template-open-system'),
+    path('template/<int:pk>/merge/', views.template_merge, name='template-merge'),
+    path('template/<int:pk>/impose/', views.template_impose, name='template-impose'),
+    path('template/<int:pk>/page/<int:page>/', views.template_page_preview, name='template-page-preview'),
+    path('sprites/<str:token>.jpg', views.template_sprite, name='template-sprite'),
     
     # Category management
     path('categories/', views.category_list, name='category-list'),
@@ -26,6 +30,11 @@ urlpatterns = [
     path('category/<slug:slug>/edit/', views.category_edit, name='category-edit'),
     path('category/<slug:slug>/delete/', views.category_delete, name='category-delete'),
     path('category/<slug:slug>/toggle/', views.category_toggle, name='category-toggle'),
+    path('category/<slug:slug>/download/', views.category_download_zip, name='category-download-zip'),
+    
+    # Reports
+    path('reports/downloads/', views.downloads_export, name='downloads-export'),
+    path('reports/ratings/', views.ratings_export, name='ratings-export'),
     
     # Search
     path('search/', views.template_search, name='template-search'),
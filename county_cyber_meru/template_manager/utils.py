@@ -1,9 +1,13 @@
+import io
 import os
-import tempfile
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import models
 from PIL import Image, ImageDraw, ImageFont
 import subprocess
+from core import zipstream
+from .duplicates import IMAGE_EXTENSIONS, update_hashes
+from .merge import MergeError, MergeTemplate, output_name
 
 def generate_template_preview(template):
     """
@@ -144,4 +148,92 @@ def delete_template_preview(template):
         if os.path.exists(preview_path):
             os.remove(preview_path)
     except Exception as e:
-        print(f"Error deleting preview for template {template.id}: {e}")
\ No newline at end of file
+        print(f"Error deleting preview for template {template.id}: {e}")
+
+
+def generate_missing_previews(template_ids):
+    """Generate previews for the given templates that don't have one yet and hash them (run in the background)"""
+    from .models import TemplateDocument
+
+    templates = TemplateDocument.objects.filter(pk__in=template_ids, is_active=True).filter(
+        models.Q(preview_image='') | models.Q(preview_image__isnull=True)
+    ).select_related('category')
+    for template in templates:
+        if not template.file:
+            continue
+        preview_path = generate_template_preview(template)
+        if preview_path:
+            # update() rather than save(): only the preview column changes
+            TemplateDocument.objects.filter(pk=template.pk).update(preview_image=preview_path)
+    update_hashes(template_ids)
+
+
+def templates_zip_response(templates, filename, folders=False):
+    """Stream the files of templates as one ZIP download, optionally in per-category folders"""
+    archive = zipstream.ZipStream()
+    for template in templates:
+        if not template.file:
+            continue
+        name = os.path.basename(template.file.name)
+        if folders:
+            name = f"{template.category.name}/{name}"
+        archive.add_file(name, template.file, template.updated_at)
+    return zipstream.streaming_response(archive, filename)
+
+
+def load_merge_template(template):
+    """Parse a PowerPoint/Word template for mail merge; raises MergeError"""
+    if template.get_file_extension() not in ('pptx', 'docx'):
+        raise MergeError('Mail merge works with PowerPoint (.pptx) and Word (.docx) templates')
+    try:
+        with template.file.open('rb') as f:
+            return MergeTemplate(f.read())
+    except OSError:
+        raise MergeError('The template file is missing')
+
+
+def merge_workers():
+    return settings.MERGE_WORKERS or os.cpu_count() or 1
+
+
+def merge_archive(merge_template, records, name_field=None):
+    """ZipStream of one merged document per record, each rendered as it is streamed"""
+    archive = zipstream.ZipStream()
+    for number, record in enumerate(records, start=1):
+        archive.add(
+            output_name(record, number, merge_template.extension, name_field), None,
+            lambda record=record: io.BytesIO(merge_template.render(record)),
+        )
+    return archive
+
+
+def merge_zip_response(merge_template, records, filename, name_field=None):
+    """
+    ZIP download of one merged document per record, rendered serially in
+    this process as it is sent; the merge_template command renders large
+    batches on a process pool.
+    """
+    return zipstream.streaming_response(merge_archive(merge_template, records, name_field), filename)
+
+
+def imposition_source(template):
+    """
+    Image data of a template's printed page: the file itself if it is an
+    image, else the rendered preview of a PDF, else the thumbnail. None
+    if there is nothing to impose.
+    """
+    candidates = []
+    if template.get_file_extension() in IMAGE_EXTENSIONS:
+        candidates.append(template.file)
+    if template.get_file_extension() == 'pdf':
+        candidates.append(template.preview_image)
+    candidates.append(template.thumbnail)
+    for field_file in candidates:
+        if not field_file:
+            continue
+        try:
+            with field_file.open('rb') as f:
+                return f.read()
+        except OSError:
+            continue
+    return None
@@ -4,9 +4,19 @@ from django.shortcuts import render
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.conf import settings
 from django.db.models import Q
-from .models import TemplateDocument, Category
-from .forms import TemplateUploadForm, CategoryForm
+from .models import TemplateDocument, Category, TemplateDownload, TemplateRating
+from .forms import TemplateUploadForm, CategoryForm, TemplateMergeForm, ImpositionForm
+from .imposition import ITEM_SIZES, Grid, ImpositionError, image_size, impose, orient
+from .duplicates import near_duplicates, update_hashes
+from .merge import MergeError, read_records
+from .page_previews import WIDTHS, PageNotFound, PreviewUnavailable, page_preview
+from .sprites import build_sheet, page_sprites
+from .utils import imposition_source, load_merge_template, merge_zip_response, templates_zip_response
+from .exports import DOWNLOAD_COLUMNS, RATING_COLUMNS, filter_downloads, filter_ratings
+from core import exports
+from core.uploads import files_with_chunked_upload, inspect_uploads, report_rejections
 from django.http import FileResponse, Http404
 import os
 from django.utils import timezone
@@ -14,7 +24,9 @@ from django.http import HttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
+from django.utils.text import slugify
 import platform
+import re
 import subprocess
 import tempfile
 import os
@@ -22,6 +34,22 @@ import os
 
 
 
+def grid_sprites(templates):
+    """Sprite positions for a grid page's cards, or {} to give each card its own image"""
+    return page_sprites(templates) if settings.TEMPLATE_SPRITES else {}
+
+
+def template_sprite(request, token):
+    """A grid page's sprite sheet, built on its first request"""
+    data = build_sheet(token)
+    if data is None:
+        raise Http404('Sprite sheet not found')
+    response = HttpResponse(data, content_type='image/jpeg')
+    # The name changes whenever a member's preview does
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 def template_list(request):
     """List all verified templates"""
     templates = TemplateDocument.objects.filter(is_verified=True, is_active=True)
@@ -41,6 +69,7 @@ def template_list(request):
     
     context = {
         'templates': templates,
+        'sprites': grid_sprites(templates),
         'categories': Category.objects.filter(is_active=True),
         'document_types': TemplateDocument.DOCUMENT_TYPES,
         'paper_sizes': TemplateDocument.PAPER_SIZES,
@@ -70,24 +99,67 @@ def template_detail(request, pk):
     return render(request, 'template_manager/template_detail.html', context)
 
 
+def template_page_preview(request, pk, page):
+    """JPEG of one page of a template, ?width= pixels wide, rendered on demand"""
+    template = get_object_or_404(TemplateDocument, pk=pk, is_active=True)
+    # A page preview shows as much as the file itself
+    if not template.is_verified and not (request.user.is_staff or request.user == template.uploaded_by):
+        raise Http404('Template not found')
+    try:
+        width = int(request.GET.get('width', WIDTHS[2]))
+    except ValueError:
+        width = WIDTHS[2]
+    if page < 1 or not template.file:
+        raise Http404('Page not found')
+    try:
+        preview = page_preview(template, page, width)
+    except PageNotFound:
+        raise Http404('Page not found')
+    except PreviewUnavailable as error:
+        return HttpResponse(str(error), status=501, content_type='text/plain')
+    response = FileResponse(preview, content_type='image/jpeg')
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
 @login_required
+@inspect_uploads
 def template_upload(request):
     """Upload new template"""
     if request.method == 'POST':
-        form = TemplateUploadForm(request.POST, request.FILES)
+        files, chunked_upload = files_with_chunked_upload(request, 'file')
+        form = TemplateUploadForm(request.POST, files)
+        report_rejections(request, form)
         if form.is_valid():
             template = form.save(commit=False)
             template.uploaded_by = request.user
             template.save()
+            if chunked_upload:
+                # Its file now lives in storage
+                chunked_upload.delete()
             messages.success(request, 'Template uploaded successfully! It will be available after verification.')
+            warn_about_duplicates(request, template)
             return redirect('template_manager:template-detail', pk=template.pk)
     else:
         form = TemplateUploadForm()
     
-    context = {'form': form}
+    context = {
+        'form': form,
+        'chunked_upload_threshold': settings.CHUNKED_UPLOAD_THRESHOLD,
+    }
     return render(request, 'template_manager/template_upload.html', context)
 
+def warn_about_duplicates(request, template):
+    """Hash a new or changed template and warn if it looks like ones already in the library"""
+    template.preview_hash = update_hashes([template.pk]).get(template.pk, '')
+    matches = near_duplicates(template)
+    if matches:
+        titles = ', '.join(f'"{match.title}" (#{match.pk})' for _, match in matches[:5])
+        more = f' and {len(matches) - 5} more' if len(matches) > 5 else ''
+        messages.warning(request, f'This looks very similar to {titles}{more}. Please check it isn\'t a duplicate.')
+
 @login_required
+@inspect_uploads
 def template_edit(request, pk):
     """Edit template - only allowed for uploader or staff"""
     template = get_object_or_404(TemplateDocument, pk=pk)
@@ -99,9 +171,12 @@ def template_edit(request, pk):
     
     if request.method == 'POST':
         form = TemplateUploadForm(request.POST, request.FILES, instance=template)
+        report_rejections(request, form)
         if form.is_valid():
             form.save()
             messages.success(request, 'Template updated successfully!')
+            if {'file', 'thumbnail'} & set(form.changed_data):
+                warn_about_duplicates(request, template)
             return redirect('template_manager:template-detail', pk=template.pk)
     else:
         form = TemplateUploadForm(instance=template)
@@ -219,6 +294,7 @@ def category_detail(request, slug):
         'verified_count': verified_count,
         'pending_count': pending_count,
         'total_templates': total_templates,
+        'sprites': grid_sprites(templates),
         'document_types': document_types,
         'paper_sizes': paper_sizes,
         'title': f'{category.name} Templates',
@@ -284,7 +360,7 @@ def category_toggle(request, slug):
     
     if category.is_active:
         # Check if category has templates before deactivating
-        template_count = category.templates.filter(is_active=True).count()
+        template_count = category.template_count
         if template_count > 0:
             messages.warning(
                 request, 
@@ -310,7 +386,7 @@ def category_delete(request, slug):
     category = get_object_or_404(Category, slug=slug)
     
     # Check if category has templates
-    template_count = category.templates.filter(is_active=True).count()
+    template_count = category.template_count
     if template_count > 0:
         messages.error(
             request, 
@@ -369,6 +445,115 @@ def template_verify(request, pk):
     messages.success(request, f'Template "{template.title}" has been verified.')
     return redirect('admin:template_manager_templatedocument_changelist')
 
+@user_passes_test(is_staff_user)
+@login_required
+def category_download_zip(request, slug):
+    """Download every active template in a category as one ZIP (staff only)"""
+    category = get_object_or_404(Category, slug=slug)
+    templates = category.templates.filter(is_active=True).only('file', 'updated_at', 'category_id')
+    return templates_zip_response(templates.iterator(), f'{category.slug}.zip')
+
+@user_passes_test(is_staff_user)
+@login_required
+@inspect_uploads(allowed_types=['csv'])
+def template_merge(request, pk):
+    """Mail merge a PowerPoint/Word template with a CSV of records (staff only)"""
+    template = get_object_or_404(TemplateDocument, pk=pk)
+    try:
+        merge_template = load_merge_template(template)
+    except MergeError as error:
+        messages.error(request, str(error))
+        return redirect('template_manager:template-detail', pk=pk)
+
+    if request.method == 'POST':
+        form = TemplateMergeForm(request.POST, request.FILES, fields=merge_template.fields)
+        report_rejections(request, form)
+        if form.is_valid():
+            try:
+                records = read_records(form.cleaned_data['records'], merge_template.fields)
+            except MergeError as error:
+                form.add_error('records', str(error))
+            else:
+                return merge_zip_response(
+                    merge_template, records, f'{slugify(template.title) or "template"}-merged.zip',
+                    form.cleaned_data['name_field'] or None,
+                )
+    else:
+        form = TemplateMergeForm(fields=merge_template.fields)
+
+    return render(request, 'template_manager/template_merge.html', {
+        'template': template,
+        'form': form,
+        'fields': merge_template.fields,
+    })
+
+@user_passes_test(is_staff_user)
+@login_required
+def template_impose(request, pk):
+    """Print-ready PDF of a card, sticker or label template laid out many-up (staff only)"""
+    template = get_object_or_404(TemplateDocument, pk=pk)
+    source = imposition_source(template)
+    try:
+        if source is None:
+            raise ImpositionError('This template has no image or rendered page to impose')
+        item = orient(ITEM_SIZES.get(template.paper_size, ITEM_SIZES['BUSINESS']), image_size(source))
+    except ImpositionError as error:
+        messages.error(request, str(error))
+        return redirect('template_manager:template-detail', pk=pk)
+
+    if 'sheet' in request.GET:
+        form = ImpositionForm(request.GET)
+        if form.is_valid():
+            data = form.cleaned_data
+            try:
+                grid = Grid(data['sheet'], (data['width'], data['height']), data['bleed'])
+            except ImpositionError as error:
+                form.add_error(None, str(error))
+            else:
+                response = HttpResponse(
+                    impose([source], grid, data['copies'], data['crop_marks'], template.title),
+                    content_type='application/pdf',
+                )
+                filename = f'{slugify(template.title) or "template"}-{grid.per_sheet}up-{grid.sheet.lower()}.pdf'
+                response['Content-Disposition'] = f'attachment; filename="{filename}"'
+                return response
+    else:
+        sheet = 'A4'
+        try:
+            Grid(sheet, item)
+        except ImpositionError:
+            sheet = 'A3'
+        form = ImpositionForm(initial={'sheet': sheet, 'width': item[0], 'height': item[1]})
+
+    return render(request, 'template_manager/template_impose.html', {
+        'template': template,
+        'form': form,
+    })
+
+@user_passes_test(is_staff_user)
+@login_required
+def downloads_export(request):
+    """Download log as CSV or Excel, filtered by the query parameters (staff only)"""
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        raise Http404('Unknown export format')
+    downloads = filter_downloads(TemplateDownload.objects.order_by('-downloaded_at'), request.GET)
+    return exports.export_response(
+        downloads, DOWNLOAD_COLUMNS, f'downloads-{timezone.localdate():%Y-%m-%d}', file_format, 'Downloads'
+    )
+
+@user_passes_test(is_staff_user)
+@login_required
+def ratings_export(request):
+    """Template ratings as CSV or Excel, filtered by the query parameters (staff only)"""
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        raise Http404('Unknown export format')
+    ratings = filter_ratings(TemplateRating.objects.order_by('-created_at'), request.GET)
+    return exports.export_response(
+        ratings, RATING_COLUMNS, f'ratings-{timezone.localdate():%Y-%m-%d}', file_format, 'Ratings'
+    )
+
 
 @login_required
 def template_view(request, pk):